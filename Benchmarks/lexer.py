@@ -0,0 +1,97 @@
+"""
+Compare the Pd record lexer with the line splitter used before it.
+
+    python Benchmarks/lexer.py [--objects 20000] [--points 200000] [--repeat 5]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Sources"))
+
+from pd4web.Lexer import Records, Tokens
+
+
+def makePatch(objects: int, points: int) -> list:
+    rnd = random.Random(0)
+    lines = ["#N canvas 0 0 450 300 12;\n"]
+    for i in range(objects):
+        kind = rnd.random()
+        if kind < 0.5:
+            lines.append(f"#X obj {i} 10 else/knob 50 0 127 0 0 empty empty #dcdcdc #7c7c7c black 0 1, f 8;\n")
+        elif kind < 0.7:
+            lines.append(f"#X msg {i} 10 \\; pd dsp 1;\n")
+        elif kind < 0.9:
+            lines.append(f"#X connect {i} 0 {i + 1} 0;\n")
+        else:
+            lines.append(f"#X text {i} 10 a comment, with a comma;\n")
+    lines.append(f"#X array table {points} float 2;\n")
+    for start in range(0, points, 1000):
+        values = " ".join(str(round(rnd.random(), 6)) for _ in range(min(1000, points - start)))
+        lines.append(f"#A {start} {values};\n")
+    return lines
+
+
+def lineSplitter(lines):
+    """The tokenizer of Patch.processPatch before the lexer."""
+    count = 0
+    for line in lines:
+        tokens = line.replace("\n", "").replace(";", "").replace(",", "").split(" ")
+        count += len(tokens)
+    return count
+
+
+def lineSplitterObjects(lines):
+    """The same, only tokenizing the objects and declares."""
+    count = 0
+    for line in lines:
+        fields = line.split(" ", 2)
+        if len(fields) < 2 or fields[1].replace("\n", "").replace(";", "").replace(",", "") not in ("obj", "declare"):
+            continue
+        tokens = line.replace("\n", "").replace(";", "").replace(",", "").split(" ")
+        count += len(tokens)
+    return count
+
+
+def lexer(lines):
+    count = 0
+    for record in Records(lines):
+        count += len(Tokens(record))
+    return count
+
+
+def lexerObjects(lines):
+    """What Patch.processPatch does now."""
+    count = 0
+    for record in Records(lines):
+        fields = record.split(None, 2)
+        if len(fields) < 2 or fields[1].rstrip(";,") not in ("obj", "declare"):
+            continue
+        count += len(Tokens(record))
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the Pd record lexer")
+    parser.add_argument("--objects", type=int, default=20000)
+    parser.add_argument("--points", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    lines = makePatch(args.objects, args.points)
+    size = sum(len(line) for line in lines) / 1e6
+    print(f"{len(lines)} lines, {size:.1f}MB, best of {args.repeat}")
+    for function in [lineSplitter, lexer, lineSplitterObjects, lexerObjects]:
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            function(lines)
+            times.append(time.perf_counter() - start)
+        print(f"  {function.__name__:<22} {min(times) * 1000:8.1f}ms  {size / min(times):6.1f}MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Time of Patch (parse and resolution of the objects) by the number of objects of the patch.
+
+The libraries are indexed in memory, nothing is fetched or compiled.
+
+    python Benchmarks/parse.py [--objects 1000 5000 20000] [--repeat 3]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Sources"))
+
+from pd4web.Pd4Web import Pd4Web
+from pd4web.Patch import Patch
+
+VANILLA = ["osc~", "*~", "dac~", "metro", "f", "t", "print", "loadbang", "line~", "+"]
+
+
+def makePatch(projectRoot: str, objects: int) -> str:
+    """
+    Patch with `objects` objects, a quarter of them are different objects of else.
+    """
+    rnd = random.Random(0)
+    externals = max(1, objects // 4)
+    lines = ["#N canvas 0 0 450 300 12;\n"]
+    for i in range(objects):
+        if rnd.random() < 0.25:
+            lines.append(f"#X obj {i} 10 else/obj{rnd.randrange(externals)} 1 2;\n")
+        else:
+            lines.append(f"#X obj {i} 10 {rnd.choice(VANILLA)} 1;\n")
+        if i > 0:
+            lines.append(f"#X connect {i - 1} 0 {i} 0;\n")
+    patchFile = os.path.join(projectRoot, "main.pd")
+    with open(patchFile, "w") as file:
+        file.writelines(lines)
+    return patchFile
+
+
+def newProject(root: str, objects: int) -> Pd4Web:
+    projectRoot = os.path.join(root, f"project-{objects}")
+    os.makedirs(os.path.join(projectRoot, "Pd4Web", "Externals", "else"), exist_ok=True)
+    pd4web = Pd4Web(Patch=makePatch(projectRoot, objects))
+    pd4web.SILENCE = True
+    pd4web.PROJECT_ROOT = projectRoot
+    pd4web.PD4WEB_ROOT = os.path.dirname(os.path.abspath(sys.modules["pd4web.Pd4Web"].__file__))
+    pd4web.PD4WEB_LIBRARIES = os.path.abspath(os.path.join(pd4web.PD4WEB_ROOT, "..", "Libraries"))
+    pd4web.APPDATA = os.path.join(root, "appdata")
+    os.makedirs(os.path.join(pd4web.APPDATA, "Externals"), exist_ok=True)
+    pd4web.InitVariables()
+
+    # the sources are already there, only the object index is used
+    pd4web.ObjectIndex.indexLibrary("pure-data", VANILLA + ["declare", "clone"], [], pd4web.PD_VERSION)
+    pd4web.ObjectIndex.indexLibrary("else", [f"obj{i}" for i in range(max(1, objects // 4))], [])
+    pd4web.Libraries.fetchedLibraries.add("else")
+    return pd4web
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the patch parser")
+    parser.add_argument("--objects", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="pd4web-bench-")
+    try:
+        print(f"{'objects':>8} {'externals':>10} {'time':>10} {'per object':>12}")
+        for objects in args.objects:
+            times = []
+            for _ in range(args.repeat):
+                pd4web = newProject(root, objects)
+                start = time.perf_counter()
+                Patch(pd4web)
+                times.append(time.perf_counter() - start)
+            best = min(times)
+            print(f"{objects:>8} {len(pd4web.usedObjects):>10} {best * 1000:>8.1f}ms {best / objects * 1e6:>10.1f}us")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Startup time of pd4web: `import pd4web` and `pd4web --version`, which the Pd external runs each time a patch
+with [pd4web] is opened. Each run is a new Python process, the PyPI version is taken from a fresh cache
+(in a temporary HOME), so nothing is fetched.
+
+    python Benchmarks/startup.py [--repeat 10] [--budget 150]
+
+Exits with an error when a heavy module is imported at startup or, with --budget, when `--version`
+takes more than `budget` milliseconds.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+SOURCES = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Sources"))
+HEAVY = ["requests", "pygit2", "certifi", "yaml", "cmake", "ninja"]
+
+IMPORT = f"""
+import sys, json
+sys.path.insert(0, {SOURCES!r})
+before = set(sys.modules)
+import pd4web.Pd4Web
+print(json.dumps([module for module in {HEAVY!r} if module in set(sys.modules) - before]))
+"""
+
+VERSION = f"""
+import sys
+sys.path.insert(0, {SOURCES!r})
+from pd4web.Pd4Web import Pd4Web
+Pd4Web().argParse(["--version"])
+"""
+
+
+def run(code: str, env: dict) -> tuple:
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return elapsed, result.stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the startup of pd4web")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--budget", type=float, default=0, help="maximum time of --version in ms")
+    args = parser.parse_args()
+
+    home = tempfile.mkdtemp(prefix="pd4web-bench-")
+    try:
+        env = dict(os.environ, HOME=home)
+        cacheFile = os.path.join(home, ".local", "share", "pd4web", "Cache", "pypi.json")
+        os.makedirs(os.path.dirname(cacheFile))
+        with open(cacheFile, "w") as file:
+            json.dump({"checked": time.time(), "latest": "0.0.0"}, file)
+
+        python = min(run("pass", env)[0] for _ in range(args.repeat))
+        imports = [run(IMPORT, env) for _ in range(args.repeat)]
+        version = min(run(VERSION, env)[0] for _ in range(args.repeat))
+        heavy = json.loads(imports[0][1])
+        importTime = min(elapsed for elapsed, _ in imports)
+
+        print(f"{'python':<20} {python * 1000:>8.1f}ms")
+        print(f"{'import pd4web':<20} {importTime * 1000:>8.1f}ms (+{(importTime - python) * 1000:.1f}ms)")
+        print(f"{'pd4web --version':<20} {version * 1000:>8.1f}ms (+{(version - python) * 1000:.1f}ms)")
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+    if len(heavy) > 0:
+        sys.exit(f"Modules imported at startup: {', '.join(heavy)}")
+    if args.budget > 0 and version * 1000 > args.budget:
+        sys.exit(f"pd4web --version took {version * 1000:.1f}ms, more than {args.budget:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
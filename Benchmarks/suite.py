@@ -0,0 +1,198 @@
+"""
+Time the stages of pd4web on a synthetic library and patch, without network and without emsdk.
+
+    python Benchmarks/suite.py [--objects 5000] [--depth 3] [--lib-objects 2000] [--lib-abstractions 200]
+                               [--repeat 3] [--history Benchmarks/results.jsonl]
+
+Stages:
+    GetLibraryObjects       scan of the library sources, without and with the SymbolCache
+    Patch                   parse of the patch and its abstractions and resolution of the objects
+    GetSetupFunctions       search of the setup functions in the library sources
+    getObjectsSourceCode    library sources of the project and setup function of each object
+    CMake                   externals.cpp and CMakeLists.txt, with the pruned <lib>.cmake
+
+The best time of each stage is appended to the history file (one JSON line per run, with the commit) and
+compared with the last run with the same parameters.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import datetime
+import subprocess
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS, "..", "Sources"))
+
+from pd4web.Pd4Web import Pd4Web
+from pd4web.Patch import Patch
+from pd4web.Cache import SymbolCache
+from pd4web.Builder import GetAndBuildExternals
+from pd4web.Compilers import ExternalsCompiler
+
+from synthetic import MakeLibrary, MakePatch, MakePdSources, CopyLibraries
+
+LIBRARY = "synthetic"
+
+
+def newProject(root: str, args) -> Pd4Web:
+    projectRoot = os.path.join(root, "project")
+    shutil.rmtree(projectRoot, ignore_errors=True)
+    patchFile = MakePatch(projectRoot, LIBRARY, args.library, args.objects, args.depth)
+
+    pd4web = Pd4Web(Patch=patchFile)
+    pd4web.SILENCE = True
+    pd4web.COMPILER_CACHE = "none"
+    pd4web.PROJECT_ROOT = projectRoot
+    pd4web.PD4WEB_ROOT = os.path.dirname(os.path.abspath(sys.modules["pd4web.Pd4Web"].__file__))
+    pd4web.PD4WEB_LIBRARIES = os.path.join(root, "Libraries")
+    pd4web.APPDATA = os.path.join(root, "appdata")
+    pd4web.InitVariables()
+
+    # the library is already in APPDATA, so it is not fetched
+    pd4web.Version["externals"][LIBRARY] = f"synthetic-{args.libObjects}-{args.libAbstractions}"
+    pd4web.Libraries.fetchedLibraries.add(LIBRARY)
+    pd4web.Compiler = ExternalsCompiler.__new__(ExternalsCompiler)
+    pd4web.Compiler.Pd4Web = pd4web
+    pd4web.Compiler.InitVariables()
+    return pd4web
+
+
+def clearSymbolCache(pd4web: Pd4Web):
+    SymbolCache.LOADED.clear()
+    shutil.rmtree(os.path.join(pd4web.APPDATA, "Cache", "Libraries"), ignore_errors=True)
+    pd4web.SymbolCache = SymbolCache(pd4web)
+
+
+def timed(times: dict, stage: str, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    times.setdefault(stage, []).append(time.perf_counter() - start)
+    return result
+
+
+def runOnce(root: str, args, times: dict):
+    pd4web = newProject(root, args)
+    libFolder = os.path.join(pd4web.APPDATA, "Externals", LIBRARY)
+
+    clearSymbolCache(pd4web)
+    pd4web.Objects.GetLibraryObjects(os.path.join(pd4web.APPDATA, "Pd", "src"), "pure-data")
+    timed(times, "GetLibraryObjects", pd4web.Objects.GetLibraryObjects, libFolder, LIBRARY)
+    SymbolCache.LOADED.clear()
+    pd4web.SymbolCache = SymbolCache(pd4web)
+    timed(times, "GetLibraryObjects (cached)", pd4web.Objects.GetLibraryObjects, libFolder, LIBRARY)
+
+    pd4web.ProcessedPatch = timed(times, "Patch", Patch, pd4web)
+
+    builder = GetAndBuildExternals.__new__(GetAndBuildExternals)
+    builder.Pd4Web = pd4web
+    builder.PROJECT_ROOT = pd4web.PROJECT_ROOT
+    builder.InitVariables()
+    builder.Patch = pd4web.ProcessedPatch
+    builder.Libraries = pd4web.Libraries
+    timed(times, "GetSetupFunctions", builder.GetSetupFunctions, LIBRARY)
+    builder.setupFunctions = {}
+    timed(times, "getObjectsSourceCode", builder.getObjectsSourceCode)
+
+    def cmake():
+        builder.CreateCppCallsExternalFile()
+        builder.buildExternalsObjects()
+        return builder.CreateCMakeLists()
+
+    timed(times, "CMake", cmake)
+    return pd4web
+
+
+def commit() -> str:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS, capture_output=True, text=True)
+    except OSError:
+        return ""
+    return result.stdout.strip()
+
+
+def lastRun(history: str, params: dict):
+    if not os.path.exists(history):
+        return None
+    last = None
+    with open(history, "r") as file:
+        for line in file:
+            try:
+                run = json.loads(line)
+            except ValueError:
+                continue
+            if run.get("params") == params:
+                last = run
+    return last
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite of pd4web on synthetic libraries and patches")
+    parser.add_argument("--objects", type=int, default=5000, help="objects of the patch and its abstractions")
+    parser.add_argument("--depth", type=int, default=3, help="levels of nested local abstractions")
+    parser.add_argument("--lib-objects", dest="libObjects", type=int, default=2000)
+    parser.add_argument("--lib-abstractions", dest="libAbstractions", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=50, help="lines of code of each C file of the library")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--history", type=str, default=os.path.join(BENCHMARKS, "results.jsonl"))
+    args = parser.parse_args()
+    params = {
+        "objects": args.objects,
+        "depth": args.depth,
+        "libObjects": args.libObjects,
+        "libAbstractions": args.libAbstractions,
+        "lines": args.lines,
+    }
+
+    root = tempfile.mkdtemp(prefix="pd4web-bench-")
+    try:
+        CopyLibraries(os.path.join(BENCHMARKS, "..", "Sources", "Libraries"), os.path.join(root, "Libraries"))
+        MakePdSources(os.path.join(root, "appdata"))
+        start = time.perf_counter()
+        args.library = MakeLibrary(
+            os.path.join(root, "appdata"),
+            os.path.join(root, "Libraries"),
+            LIBRARY,
+            args.libObjects,
+            args.libAbstractions,
+            args.lines,
+        )
+        print(f"Library with {args.libObjects} objects and {args.libAbstractions} abstractions created in", end=" ")
+        print(f"{time.perf_counter() - start:.1f}s")
+
+        times = {}
+        for _ in range(args.repeat):
+            pd4web = runOnce(root, args, times)
+        print(f"Patch with {args.objects} objects, depth {args.depth}, {len(pd4web.usedObjects)} externals used")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    results = {stage: round(min(values) * 1000, 2) for stage, values in times.items()}
+    previous = lastRun(args.history, params)
+    print(f"\n{'stage':<28} {'best':>10} {'previous':>10} {'change':>8}")
+    for stage, best in results.items():
+        line = f"{stage:<28} {best:>8.1f}ms"
+        if previous is not None and stage in previous["results"]:
+            before = previous["results"][stage]
+            change = f"{(best - before) / before * 100:+.0f}%" if before > 0 else ""
+            line += f" {before:>8.1f}ms {change:>8}"
+        print(line)
+
+    run = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit(),
+        "python": sys.version.split()[0],
+        "params": params,
+        "results": results,
+    }
+    with open(args.history, "a") as file:
+        file.write(json.dumps(run) + "\n")
+    print(f"\nSaved in {args.history}")
+
+
+if __name__ == "__main__":
+    main()
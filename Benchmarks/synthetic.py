@@ -0,0 +1,127 @@
+"""
+Synthetic libraries and patches for the benchmarks, nothing is fetched and emsdk is not needed.
+
+A library is a folder of C files (each one with a setup function, a class_new and sometimes a
+class_addcreator) and abstractions with their help files, registered in a copy of Libraries.yaml with
+its <lib>.cmake. A patch uses vanilla objects, objects and abstractions of the library, subpatches and
+local abstractions nested `depth` levels.
+"""
+
+import os
+import random
+import shutil
+
+VANILLA = ["osc~", "*~", "dac~", "metro", "f", "t", "print", "loadbang", "line~", "+", "inlet", "outlet"]
+# objects of Pd only used by the abstractions of the library
+VANILLA_ABSTRACTIONS = ["inlet~", "outlet~"]
+FILLER = "    x->x_value = x->x_value * 0.5f + {i}.0f; // {i}\n"
+
+
+def writeFile(path: str, content: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        file.write(content)
+
+
+def objectName(i: int) -> str:
+    # some names use the characters that setup functions must escape
+    return [f"obj{i}", f"obj{i}~", f"obj.{i}"][i % 3]
+
+
+def MakeLibrary(appdata: str, libraries: str, name: str, objects: int, abstractions: int, lines=50) -> dict:
+    """
+    Create the library `name` in appdata/Externals and register it in the `libraries` folder (a copy of
+    Sources/Libraries). Returns the names of its objects and abstractions.
+    """
+    libFolder = os.path.join(appdata, "Externals", name)
+    shutil.rmtree(libFolder, ignore_errors=True)
+    rnd = random.Random(objects)
+    names = [objectName(i) for i in range(objects)]
+    cmake = ["cmake_minimum_required(VERSION 3.25)", f"project({name})"]
+    cmake.append("set(LIB_DIR ${PD4WEB_EXTERNAL_DIR}/${PROJECT_NAME})")
+    for i, obj in enumerate(names):
+        function = obj.replace("~", "_tilde").replace(".", "0x2e")
+        group = f"Group{i // 100}"
+        source = [f'#include "m_pd.h"\n\nstatic t_class *{function}_class;\n\nstatic void *{function}_new(void)\n{{\n']
+        source += [FILLER.format(i=line) for line in range(lines)]
+        source.append(f"    return 0;\n}}\n\nvoid {function}_setup(void)\n{{\n")
+        source.append(f'    {function}_class = class_new(gensym("{obj}"), (t_newmethod){function}_new, 0, 0, 0, 0);\n')
+        if rnd.random() < 0.1:
+            source.append(f'    class_addcreator((t_newmethod){function}_new, gensym("{name}/alias{i}"), 0);\n')
+        source.append("}\n")
+        writeFile(os.path.join(libFolder, "Sources", group, f"{obj}.c"), "".join(source))
+        cmake.append(f'pd_add_external({obj} "${{LIB_DIR}}/Sources/{group}/{obj}.c")')
+
+    absNames = [f"abs{i}" for i in range(abstractions)]
+    for i, absName in enumerate(absNames):
+        body = ["#N canvas 0 0 450 300 12;\n", "#X obj 10 10 inlet~;\n"]
+        for j in range(5):
+            body.append(f"#X obj 10 {40 + j * 30} {name}/{names[rnd.randrange(objects)]};\n")
+        body.append("#X obj 10 200 outlet~;\n")
+        folder = os.path.join(libFolder, "Abstractions", f"Group{i // 50}")
+        writeFile(os.path.join(folder, f"{absName}.pd"), "".join(body))
+        helpPatch = f"#N canvas 0 0 450 300 12;\n#X obj 10 10 {absName};\n"
+        writeFile(os.path.join(folder, f"{absName}-help.pd"), helpPatch)
+
+    writeFile(os.path.join(libraries, f"{name}.cmake"), "\n".join(cmake) + "\n")
+    with open(os.path.join(libraries, "Libraries.yaml"), "a") as file:
+        file.write(f"\n  - Name: {name}\n    Source: GITHUB\n    Developer: pd4web\n    Repository: {name}\n")
+    return {"objects": names, "abstractions": absNames}
+
+
+def CopyLibraries(src: str, dst: str):
+    """
+    Copy Sources/Libraries, pd.cmake is a submodule that may not be checked out.
+    """
+    shutil.copytree(src, dst, ignore=shutil.ignore_patterns(".git"))
+    pdCmake = os.path.join(dst, "pd.cmake", "pd.cmake")
+    if not os.path.exists(pdCmake):
+        writeFile(pdCmake, "# pd.cmake is not used by the benchmarks\n")
+
+
+def MakePdSources(appdata: str):
+    """
+    Pd sources with the vanilla objects used by the patches.
+    """
+    objects = VANILLA + VANILLA_ABSTRACTIONS + ["declare", "clone"]
+    source = "".join(f'    c = class_new(gensym("{obj}"), 0, 0, 0, 0, 0);\n' for obj in objects)
+    writeFile(os.path.join(appdata, "Pd", "src", "x_vanilla.c"), f"void vanilla_setup(void)\n{{\n{source}}}\n")
+    for file in ["README.txt", "LICENSE.txt"]:
+        writeFile(os.path.join(appdata, "Pd", file), "")
+
+
+def MakePatch(projectRoot: str, name: str, library: dict, objects: int, depth: int) -> str:
+    """
+    Main patch with `objects` objects in total, spread over the main patch, one subpatch and one local
+    abstraction (Abs/level<n>.pd) per level of `depth`. A quarter of the objects are objects or
+    abstractions of the library.
+    """
+    rnd = random.Random(objects * 31 + depth)
+    levels = depth + 1
+    perPatch = max(1, objects // (2 * levels))
+
+    def objectLines(count: int) -> list:
+        lines = []
+        for i in range(count):
+            kind = rnd.random()
+            if kind < 0.2:
+                lines.append(f"#X obj {i} 10 {name}/{rnd.choice(library['objects'])};\n")
+            elif kind < 0.25:
+                lines.append(f"#X obj {i} 10 {name}/{rnd.choice(library['abstractions'])};\n")
+            else:
+                lines.append(f"#X obj {i} 10 {rnd.choice(VANILLA)} {i};\n")
+            if i > 0:
+                lines.append(f"#X connect {i - 1} 0 {i} 0;\n")
+        return lines
+
+    for level in range(levels):
+        lines = ["#N canvas 0 0 450 300 12;\n"]
+        lines += objectLines(perPatch)
+        lines.append("#N canvas 0 50 450 250 sub 0;\n")
+        lines += objectLines(perPatch)
+        lines.append("#X restore 10 10 pd sub;\n")
+        if level < depth:
+            lines.append(f"#X obj 10 10 Abs/level{level + 1};\n")
+        patchName = "main.pd" if level == 0 else os.path.join("Abs", f"level{level}.pd")
+        writeFile(os.path.join(projectRoot, patchName), "".join(lines))
+    return os.path.join(projectRoot, "main.pd")
@@ -1,8 +1,13 @@
 #include <algorithm>
 #include <array>
+#include <atomic>
+#include <cstdio>
+#include <cstdlib>
 #include <filesystem>
+#include <random>
 #include <string>
 #include <thread>
+#include <vector>
 
 #ifdef _WIN32
 #define WIN32_LEAN_AND_MEAN
@@ -19,6 +24,15 @@ static t_class *pd4web_class;
 
 static bool global_pd4web_check = false; // just need to check once
 #define PD4WEB_EXTERNAL_VERSION "2.3.0"
+#define PD4WEB_SERVE_PORT 8091 // same as Pd4Web.SERVE_PORT
+
+// `pd4web --serve` is started once by the Pd process and shared by its [pd4web] objects, the token of
+// the session is only known by this process. It is stopped when the last object is freed, only if this
+// process started it (when the port is already used, the launched server exits at once).
+static int pd4web_instances = 0;
+static std::atomic<bool> pd4web_serve_launched{false};
+static std::atomic<bool> pd4web_serve_running{false};
+static std::string pd4web_serve_token;
 
 // ─────────────────────────────────────
 class Pd4Web {
@@ -230,6 +244,125 @@ static bool pd4web_terminal(Pd4Web *x, std::string cmd, bool detached = false, b
     }
     return x->result;
 }
+// ─────────────────────────────────────
+static std::string pd4web_json_string(const std::string &str) {
+    std::string json = "\"";
+    for (char c : str) {
+        if (c == '"' || c == '\\') {
+            json += '\\';
+            json += c;
+        } else if (c == '\n') {
+            json += "\\n";
+        } else if ((unsigned char)c < 0x20) {
+            char buf[8];
+            snprintf(buf, sizeof(buf), "\\u%04x", c);
+            json += buf;
+        } else {
+            json += c;
+        }
+    }
+    return json + "\"";
+}
+
+// ─────────────────────────────────────
+static void pd4web_serve(Pd4Web *x) {
+    // `pd4web --serve` keeps the libraries index and the caches loaded between compilations, if the port
+    // is already used by another process it just exits
+    if (pd4web_serve_launched.exchange(true)) {
+        return;
+    }
+    std::random_device device;
+    char token[33];
+    for (int i = 0; i < 16; i++) {
+        snprintf(token + 2 * i, 3, "%02x", device() & 0xff);
+    }
+    pd4web_serve_token = token;
+#ifdef _WIN32
+    _putenv_s("PD4WEB_SERVE_TOKEN", token);
+#else
+    setenv("PD4WEB_SERVE_TOKEN", token, 1);
+#endif
+    std::string cmd = x->pd4web + " --serve --serve-port " + std::to_string(PD4WEB_SERVE_PORT);
+    std::thread([cmd]() {
+        pd4web_serve_running = true;
+        std::system(cmd.c_str());
+        pd4web_serve_running = false;
+    }).detach();
+}
+
+// ─────────────────────────────────────
+static bool pd4web_daemon(Pd4Web *x, std::vector<std::string> args) {
+    // send the job to `pd4web --serve`, returns false if it is not running so the caller runs the command
+    if (pd4web_serve_token == "") {
+        return false;
+    }
+    httplib::Headers headers = {{"X-Pd4Web-Token", pd4web_serve_token}};
+    httplib::Client client("127.0.0.1", PD4WEB_SERVE_PORT);
+    client.set_connection_timeout(0, 300000);
+    auto res = client.Get("/version", headers);
+    if (!res || res->status != 200) {
+        // not running, or a server of another Pd process
+        return false;
+    }
+
+    std::string body = "{\"args\": [";
+    for (size_t i = 0; i < args.size(); i++) {
+        if (i > 0) {
+            body += ", ";
+        }
+        body += pd4web_json_string(args[i]);
+    }
+    body += "]}";
+
+    x->running = true;
+    x->result = false;
+    std::thread([x, body]() {
+        httplib::Client client("127.0.0.1", PD4WEB_SERVE_PORT);
+        client.set_read_timeout(3600, 0);
+        std::string buffer;
+        int exitCode = -1;
+
+        httplib::Request req;
+        req.method = "POST";
+        req.path = "/compile";
+        req.body = body;
+        req.set_header("Content-Type", "application/json");
+        req.set_header("X-Pd4Web-Token", pd4web_serve_token);
+        req.content_receiver = [x, &buffer, &exitCode](const char *data, size_t len, uint64_t, uint64_t) {
+            if (x->cancel) {
+                return false;
+            }
+            buffer.append(data, len);
+            size_t pos;
+            while ((pos = buffer.find('\n')) != std::string::npos) {
+                std::string line = buffer.substr(0, pos);
+                buffer.erase(0, pos + 1);
+                line.erase(std::remove(line.begin(), line.end(), '\r'), line.end());
+                if (line.rfind("PD4WEB_EXIT ", 0) == 0) {
+                    exitCode = std::stoi(line.substr(12));
+                } else if (line.find("ERROR:") != std::string::npos) {
+                    pd_error(x, "[pd4web] %s", line.c_str());
+                } else if (line != "") {
+                    logpost(x, 2, "[pd4web] %s", line.c_str());
+                }
+            }
+            return true;
+        };
+        auto res = client.send(req);
+        if (x->cancel) {
+            x->cancel = false;
+            pd_error(x, "[pd4web] Compilation canceled");
+        } else if (!res || exitCode != 0) {
+            pd_error(x, "[pd4web] Command failed with exit code %d", exitCode);
+        } else {
+            logpost(x, 2, "[pd4web] Command executed successfully.");
+            x->result = true;
+        }
+        x->running = false;
+    }).detach();
+    return true;
+}
+
 // ─────────────────────────────────────
 static void pd4web_version(Pd4Web *x) {
     std::string cmd = x->pd4web + " --version";
@@ -563,33 +696,33 @@ static void pd4web_compile(Pd4Web *x) {
         pd_error(x, "[pd4web] pd4web is not ready");
         return;
     }
-    std::string cmd = x->pd4web + " --pd-external";
-    cmd += " --pd-external-version \"" + x->version + "\" ";
+    std::vector<std::string> args = {"--pd-external", "--pd-external-version", x->version};
     if (x->verbose) {
-        cmd += " --verbose ";
+        args.push_back("--verbose");
     }
     if (x->memory > 0) {
-        cmd += " -m " + std::to_string(x->memory) + " ";
+        args.push_back("-m");
+        args.push_back(std::to_string(x->memory));
     }
     if (!x->gui) {
-        cmd += " --nogui ";
+        args.push_back("--nogui");
     }
     if (x->zoom != 1) {
-        cmd += " --patch-zoom " + std::to_string(x->zoom) + " ";
+        args.push_back("--patch-zoom");
+        args.push_back(std::to_string(x->zoom));
     }
     if (x->clear) {
-        cmd += " --clear ";
+        args.push_back("--clear");
     }
     if (x->debug) {
-        cmd += " --debug ";
+        args.push_back("--debug");
     }
     if (x->patch_template != 0) {
-        cmd += " --template " + std::to_string(x->patch_template) + " ";
+        args.push_back("--template");
+        args.push_back(std::to_string(x->patch_template));
     }
 
-    if (x->patch != "") {
-        cmd += x->patch;
-    } else {
+    if (x->patch == "") {
         pd_error(x, "[pd4web] No patch selected");
         return;
     }
@@ -599,6 +732,18 @@ static void pd4web_compile(Pd4Web *x) {
         return;
     }
     logpost(x, 2, "[pd4web] Compiling patch on background, please wait...");
+
+    // x->patch is quoted for the command line
+    args.push_back(x->patch.substr(1, x->patch.size() - 2));
+    if (pd4web_daemon(x, args)) {
+        return;
+    }
+
+    std::string cmd = x->pd4web;
+    for (size_t i = 0; i + 1 < args.size(); i++) {
+        cmd += " " + args[i];
+    }
+    cmd += " " + x->patch;
     pd4web_terminal(x, cmd.c_str(), true, true, true, false);
     return;
 }
@@ -646,7 +791,13 @@ static void *pd4web_new() {
         return nullptr;
     }
 
-    std::thread([x]() { x->is_ready = pd4web_check(x); }).detach();
+    pd4web_instances++;
+    std::thread([x]() {
+        x->is_ready = pd4web_check(x);
+        if (x->is_ready) {
+            pd4web_serve(x);
+        }
+    }).detach();
 
     // pd4web config
     x->cancel = false;
@@ -673,6 +824,12 @@ static void *pd4web_new() {
 static void pd4web_free(Pd4Web *x) {
     httplib::Client client("http://localhost:8080");
     auto res = client.Get("/stop");
+    pd4web_instances--;
+    if (pd4web_instances == 0 && pd4web_serve_running) {
+        httplib::Client daemon("127.0.0.1", PD4WEB_SERVE_PORT);
+        daemon.Post("/stop", {{"X-Pd4Web-Token", pd4web_serve_token}}, "{}", "application/json");
+        pd4web_serve_launched = false;
+    }
     delete x->server;
     x->cancel = true;
     if (x->running) {
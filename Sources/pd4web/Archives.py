@@ -0,0 +1,169 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+
+from .Pd4Web import Pd4Web
+from .CMake import ParseCMakeCommands, ExternalTarget
+from .Helpers import FileHash, TmpPath
+
+
+class ArchiveCache:
+    """
+    Static archives of the externals already built, shared by all projects in APPDATA/Cache/Archives.
+
+    The archives of one library are kept by (library commit, EMSDK_VERSION, PD_VERSION, build type and
+    flags, <lib>.cmake and pd.cmake). When all the externals that a project uses are there, the project
+    links them as IMPORTED targets and <lib>.cmake is not included. Otherwise the library is built as
+    before and the archives of its used externals are saved after the build.
+
+    Only externals that are one pd_add_external() without link libraries are cached, the others need
+    targets of <lib>.cmake to link.
+    """
+
+    # projects of `pd4web build-many` harvest in parallel
+    LOCK = threading.Lock()
+
+    def __init__(self, Pd4Web: Pd4Web):
+        self.Pd4Web = Pd4Web
+        self.CACHE_ROOT = os.path.join(Pd4Web.APPDATA, "Cache", "Archives")
+        self.pending = {}
+
+    def __repr__(self) -> str:
+        return f"<ARCHIVE_CACHE | Pending: {len(self.pending)}>"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+    def Key(self, libName: str, cmakeFile: str) -> str:
+        """
+        Hash of everything that changes the archives of the library.
+        """
+        buildType = "Debug" if self.Pd4Web.DEBUG else "Release"
+        pdCmake = os.path.join(self.Pd4Web.PD4WEB_LIBRARIES, "pd.cmake", "pd.cmake")
+        key = {
+            "library": libName,
+            "commit": self.Pd4Web.Version["externals"].get(libName),
+            "emsdk": self.Pd4Web.EMSDK_VERSION,
+            "pd": self.Pd4Web.PD_VERSION,
+            "build": buildType,
+            "flags": self.Pd4Web.DEBUG_FLAGS if self.Pd4Web.DEBUG else self.Pd4Web.RELEASE_FLAGS,
+            "cmake": FileHash(cmakeFile),
+            "pd.cmake": FileHash(pdCmake) if os.path.exists(pdCmake) else None,
+        }
+        return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()[:16]
+
+    def cacheDir(self, libName: str, cmakeFile: str) -> str:
+        return os.path.join(self.CACHE_ROOT, libName, self.Key(libName, cmakeFile))
+
+    def CachedTargets(self, libName: str, cmakeFile: str, targets: list):
+        """
+        Return {target: archive} if all `targets` are in the cache, otherwise None.
+        """
+        if not self.Pd4Web.ARCHIVE_CACHE or self.Pd4Web.Version["externals"].get(libName) is None:
+            return None
+        manifestFile = os.path.join(self.cacheDir(libName, cmakeFile), "manifest.json")
+        if not os.path.exists(manifestFile):
+            return None
+        try:
+            with open(manifestFile, "r") as file:
+                manifest = json.load(file)
+        except ValueError:
+            return None
+
+        archives = {}
+        for target in targets:
+            archive = manifest.get(target)
+            if archive is None:
+                return None
+            archive = os.path.join(os.path.dirname(manifestFile), archive)
+            if not os.path.exists(archive):
+                return None
+            archives[target] = archive
+        return archives
+
+    def CanCache(self, cmakeFile: str, targets: list) -> bool:
+        """
+        True if every target is created by one pd_add_external() of `cmakeFile` and links nothing else.
+        """
+        with open(cmakeFile, "r") as file:
+            commands = ParseCMakeCommands(file.read())
+        simpleTargets = set()
+        linkedTargets = set()
+        for command in commands:
+            name = command.name.lower()
+            if name == "pd_add_external" and len(command.args) > 0:
+                target = ExternalTarget(command)
+                if "LINK_LIBRARIES" in command.args:
+                    linkedTargets.add(target)
+                else:
+                    simpleTargets.add(target)
+            elif name == "target_link_libraries" and len(command.args) > 0:
+                linkedTargets.add(command.args[0])
+        return all(target in simpleTargets and target not in linkedTargets for target in targets)
+
+    def ImportedTargets(self, archives: dict) -> list:
+        """
+        CMake lines that create the targets from the cached archives.
+        """
+        lines = []
+        for target, archive in archives.items():
+            archive = archive.replace("\\", "/")
+            lines.append(f"add_library({target} STATIC IMPORTED)")
+            lines.append(f'set_target_properties({target} PROPERTIES IMPORTED_LOCATION "{archive}")')
+        return lines
+
+    def ManifestTargets(self, libName: str, cmakeFile: str, targets: list) -> list:
+        """
+        CMake lines that write, at generation time, where each archive of the library is built.
+        The library is saved in the cache by Harvest after the build.
+        """
+        if not self.Pd4Web.ARCHIVE_CACHE or self.Pd4Web.Version["externals"].get(libName) is None:
+            return []
+        if not self.CanCache(cmakeFile, targets):
+            return []
+        self.pending[libName] = cmakeFile
+        content = "".join(f"{target}=$<TARGET_FILE:{target}>\\n" for target in targets)
+        return [f'file(GENERATE OUTPUT "${{CMAKE_BINARY_DIR}}/archives/{libName}.txt" CONTENT "{content}")']
+
+    def Harvest(self):
+        """
+        Copy the archives built for the pending libraries to the cache.
+        """
+        with ArchiveCache.LOCK:
+            for libName, cmakeFile in self.pending.items():
+                self.harvestLibrary(libName, cmakeFile)
+        self.pending = {}
+
+    def harvestLibrary(self, libName: str, cmakeFile: str):
+        generated = os.path.join(self.Pd4Web.PROJECT_ROOT, "build", "archives", f"{libName}.txt")
+        if not os.path.exists(generated):
+            return
+        cacheDir = self.cacheDir(libName, cmakeFile)
+        manifestFile = os.path.join(cacheDir, "manifest.json")
+        manifest = {}
+        if os.path.exists(manifestFile):
+            try:
+                with open(manifestFile, "r") as file:
+                    manifest = json.load(file)
+            except ValueError:
+                manifest = {}
+
+        os.makedirs(cacheDir, exist_ok=True)
+        with open(generated, "r") as file:
+            lines = file.read().splitlines()
+        for line in lines:
+            target, _, archive = line.partition("=")
+            if target in manifest or not os.path.isfile(archive):
+                continue
+            cachedArchive = os.path.join(cacheDir, os.path.basename(archive))
+            tmpFile = TmpPath(cachedArchive)
+            shutil.copy2(archive, tmpFile)
+            os.replace(tmpFile, cachedArchive)
+            manifest[target] = os.path.basename(archive)
+
+        tmpFile = TmpPath(manifestFile)
+        with open(tmpFile, "w") as file:
+            json.dump(manifest, file, indent=4)
+        os.replace(tmpFile, manifestFile)
@@ -0,0 +1,270 @@
+import os
+import glob
+import time
+import shutil
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from .Pd4Web import Pd4Web
+from .Lexer import Records, Tokens
+
+
+class BatchBuilder:
+    """
+    `pd4web build-many <dir|glob>...` compiles many patches in one process.
+
+    Pd, emsdk and the union of the libraries of all patches are fetched once, Libraries.yaml and the
+    symbol cache are parsed once. Then the projects are built in two waves: the first has the fewest
+    projects that use every library, so when the second wave runs the archives of the shared externals
+    are already in the archive cache. The builds of one wave run in parallel and share `--jobs` cores.
+    Patches in the same folder are the same project and are built one after the other, as each build
+    replaces WebPatch/, the output of each one is saved in WebPatch/<patch name>/ after it is built.
+    """
+
+    IGNORED_FOLDERS = ["Pd4Web", "WebPatch", "build", ".tmp"]
+
+    def __init__(self, Pd4Web: Pd4Web):
+        self.Pd4Web = Pd4Web
+        self.Results = {}
+
+    def __repr__(self) -> str:
+        return f"<BATCH_BUILDER | Patches: {len(self.Results)}>"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+    def argParse(self, argv: list):
+        parser = argparse.ArgumentParser(
+            description="Compile many Pure Data patches for the web.",
+            usage="pd4web build-many <dir|glob> [<dir|glob> ...]",
+        )
+        parser.add_argument("patches", type=str, nargs="+", help="Folders or glob patterns of the patches")
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            required=False,
+            default=os.cpu_count(),
+            type=int,
+            help="Compilation jobs shared by all the projects (default: number of cores)",
+        )
+        self.Pd4Web.options_flags(parser)
+        self.Pd4Web.dev_flags(parser)
+        parser = parser.parse_args(argv)
+
+        self.Pd4Web.getMainPaths()
+        self.Pd4Web.ApplyOptions(parser)
+        patches = self.FindPatches(parser.patches)
+        if len(patches) == 0:
+            self.Pd4Web.exception("No patch found")
+        failed = self.Build(patches, parser)
+        self.PrintResults()
+        if failed:
+            exit(1)
+
+    def FindPatches(self, paths: list) -> list:
+        """
+        Patches of files, folders (searched recursively) and glob patterns. In folders, a patch used as an
+        abstraction by a patch of the same or of a parent folder is not compiled by itself.
+        """
+        patches = []
+        for path in paths:
+            matches = [path] if os.path.exists(path) else sorted(glob.glob(path, recursive=True))
+            for match in matches:
+                if os.path.isdir(match):
+                    patches += self.folderPatches(match)
+                elif match.endswith(".pd"):
+                    patches.append(os.path.abspath(match))
+        return list(dict.fromkeys(patches))
+
+    def folderPatches(self, folder: str) -> list:
+        files = []
+        for root, dirs, names in os.walk(folder):
+            dirs[:] = sorted(d for d in dirs if d not in self.IGNORED_FOLDERS and not d.startswith("."))
+            files += [os.path.abspath(os.path.join(root, name)) for name in sorted(names) if name.endswith(".pd")]
+
+        usedNames = {}
+        for file in files:
+            with open(file, "r", errors="ignore") as f:
+                for record in Records(f):
+                    if not record.startswith("#X"):
+                        continue
+                    tokens = Tokens(record)
+                    if len(tokens) > 4 and tokens[0] == "#X" and tokens[1] == "obj":
+                        usedNames.setdefault(os.path.basename(tokens[4]), set()).add(file)
+
+        patches = []
+        for file in files:
+            name = os.path.splitext(os.path.basename(file))[0]
+            users = [user for user in usedNames.get(name, []) if user != file]
+            folder = os.path.dirname(file)
+            if any(os.path.commonpath([folder, os.path.dirname(user)]) == os.path.dirname(user) for user in users):
+                continue
+            patches.append(file)
+        return patches
+
+    def Build(self, patches: list, options) -> bool:
+        """
+        Build all patches, returns True if some of them failed.
+        """
+        try:
+            return self.buildPatches(patches, options)
+        finally:
+            self.Pd4Web.Tracer.Save()
+
+    def buildPatches(self, patches: list, options) -> bool:
+        projects = {}
+        for patch in patches:
+            project = Pd4Web(Patch=patch)
+            project.ApplyOptions(options)
+            project.getMainPaths()
+            project.InitVariables()
+            # with --trace, all projects are saved in the same trace
+            project.Tracer = self.Pd4Web.Tracer
+            projects.setdefault(project.PROJECT_ROOT, []).append(project)
+            self.Results[patch] = {"status": "waiting", "libraries": [], "time": 0.0, "error": "", "output": ""}
+
+        libraries = {}
+        for group in projects.values():
+            for project in group:
+                self.Results[project.Patch]["libraries"] = project.Libraries.FindPatchLibraries(project.Patch)
+                libraries.update(dict.fromkeys(self.Results[project.Patch]["libraries"]))
+        self.fetchShared(list(projects.values())[0][0], list(libraries), projects)
+
+        firstWave, secondWave = self.waves(projects)
+        for wave in [firstWave, secondWave]:
+            if len(wave) == 0:
+                continue
+            workers = min(len(wave), max(1, options.jobs // 2))
+            for root in wave:
+                for project in projects[root]:
+                    project.BUILD_JOBS = max(1, options.jobs // workers)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(lambda root: self.buildGroup(projects[root]), wave))
+
+        return any(result["status"] != "ok" for result in self.Results.values())
+
+    def fetchShared(self, leader: Pd4Web, libraries: list, projects: dict):
+        """
+        Fetch Pd, emsdk and all libraries once, the other projects reuse the commits found by `leader`.
+        """
+        from .Compilers import ExternalsCompiler
+
+        self.Pd4Web.print(
+            f"Fetching Pd, emsdk and {len(libraries)} libraries for {len(self.Results)} patches",
+            color="blue",
+            silence=self.Pd4Web.SILENCE,
+            pd4web=self.Pd4Web.PD_EXTERNAL,
+        )
+        with ThreadPoolExecutor(max_workers=max(1, min(3, self.Pd4Web.FETCH_JOBS))) as pool:
+            pdSource = pool.submit(leader.GetPdSourceCode)
+            compiler = pool.submit(ExternalsCompiler, leader)
+            externals = pool.submit(leader.Libraries.FetchLibraries, libraries)
+            pdSource.result()
+            compiler.result()
+            externals.result()
+        leader.Fetcher.PrintReport()
+
+        for group in projects.values():
+            for project in group:
+                project.Version["externals"].update(leader.Version["externals"])
+                project.Libraries.fetchedLibraries.update(leader.Libraries.fetchedLibraries)
+
+    def waves(self, projects: dict):
+        """
+        Split the project folders in the fewest ones that use all the libraries and the others.
+        """
+        usedLibraries = {}
+        for root, group in projects.items():
+            usedLibraries[root] = set()
+            for project in group:
+                usedLibraries[root].update(self.Results[project.Patch]["libraries"])
+
+        firstWave = []
+        covered = set()
+        while True:
+            candidates = [root for root in projects if root not in firstWave]
+            if len(candidates) == 0:
+                break
+            best = max(candidates, key=lambda root: len(usedLibraries[root] - covered))
+            if len(usedLibraries[best] - covered) == 0:
+                break
+            firstWave.append(best)
+            covered.update(usedLibraries[best])
+        if len(firstWave) == 0:
+            return list(projects), []
+        return firstWave, [root for root in projects if root not in firstWave]
+
+    def buildGroup(self, group: list):
+        for project in group:
+            result = self.Results[project.Patch]
+            result["status"] = "running"
+            start = time.perf_counter()
+            try:
+                with self.Pd4Web.Tracer.Span(os.path.relpath(project.Patch, self.Pd4Web.CWD), "project"):
+                    project.Run()
+                webPatch = os.path.join(project.PROJECT_ROOT, "WebPatch")
+                if len(group) > 1:
+                    names = [os.path.splitext(os.path.basename(other.Patch))[0] for other in group]
+                    webPatch = self.saveOutput(webPatch, names[group.index(project)], names)
+                result["output"] = webPatch
+                result["status"] = "ok"
+            except SystemExit:
+                result["status"] = "failed"
+            except Exception as e:
+                result["status"] = "failed"
+                result["error"] = str(e).strip().splitlines()[-1] if str(e).strip() != "" else type(e).__name__
+            result["time"] = time.perf_counter() - start
+
+    def saveOutput(self, webPatch: str, name: str, names: list) -> str:
+        """
+        Copy the output of the last build in `webPatch` to `webPatch`/`name`, without the outputs saved
+        there for the other patches (`names`) of the project.
+        """
+        if not os.path.isfile(os.path.join(webPatch, "index.pd")):
+            raise RuntimeError(f"{webPatch}/index.pd was not created")
+        output = os.path.join(webPatch, name)
+        shutil.rmtree(output, ignore_errors=True)
+        os.makedirs(output)
+        for entry in os.listdir(webPatch):
+            path = os.path.join(webPatch, entry)
+            if os.path.isfile(path):
+                shutil.copy2(path, output)
+            elif os.path.isdir(path) and entry not in names:
+                shutil.copytree(path, os.path.join(output, entry))
+        return output
+
+    def PrintResults(self):
+        rows = []
+        for patch, result in self.Results.items():
+            rows.append(
+                [
+                    os.path.relpath(patch, self.Pd4Web.CWD),
+                    result["status"],
+                    ", ".join(result["libraries"]) if len(result["libraries"]) > 0 else "-",
+                    f"{result['time']:.1f}s",
+                    os.path.relpath(result["output"], self.Pd4Web.CWD) if result["output"] != "" else "-",
+                    result["error"],
+                ]
+            )
+        header = ["Patch", "Status", "Libraries", "Time", "Output", "Error"]
+        widths = [max(len(row[i]) for row in rows + [header]) for i in range(len(header))]
+        print()
+        for row in [header] + rows:
+            print("    " + "  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
+        print()
+
+        failed = [patch for patch, result in self.Results.items() if result["status"] != "ok"]
+        if len(failed) > 0:
+            self.Pd4Web.print(
+                f"{len(failed)} of {len(self.Results)} patches failed",
+                color="red",
+                silence=self.Pd4Web.SILENCE,
+                pd4web=self.Pd4Web.PD_EXTERNAL,
+            )
+        else:
+            self.Pd4Web.print(
+                f"{len(self.Results)} patches compiled",
+                color="green",
+                silence=self.Pd4Web.SILENCE,
+                pd4web=self.Pd4Web.PD_EXTERNAL,
+            )
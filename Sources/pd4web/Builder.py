@@ -1,11 +1,18 @@
+import io
 import os
 import re
+import json
+import sys
 import shutil
-import subprocess
+import hashlib
 import importlib.metadata as importlib_metadata
 import yaml
 
 # from .Patch import PatchLine
+from .Helpers import WriteIfChanged, CopyIfChanged, FileHash
+from .CMake import PruneExternals
+from .Wasm import ExternalsSizeReport
+from .Ninja import NinjaProgress, NinjaLog
 from .Pd4Web import Pd4Web
 
 
@@ -14,13 +21,23 @@ class GetAndBuildExternals:
         self.Pd4Web = Pd4Web
 
         self.PROJECT_ROOT = Pd4Web.PROJECT_ROOT
+        with Pd4Web.Tracer.Span("Generate"):
+            self.Generate()
+        with Pd4Web.Tracer.Span("Build"):
+            self.Build()
+
+    def Generate(self):
+        """
+        Find the sources of the used objects and write externals.cpp, config.h and CMakeLists.txt.
+        """
         self.InitVariables()
 
-        self.Patch = Pd4Web.ProcessedPatch
-        self.Libraries = Pd4Web.Libraries
+        self.Patch = self.Pd4Web.ProcessedPatch
+        self.Libraries = self.Pd4Web.Libraries
 
         # I need to know what is the _setup function name
-        OK = self.getObjectsSourceCode()
+        with self.Pd4Web.Tracer.Span("getObjectsSourceCode"):
+            OK = self.getObjectsSourceCode()
         if not OK:
             self.Pd4Web.exception("Error: Could not get the externals source code")
 
@@ -32,17 +49,58 @@ class GetAndBuildExternals:
         # │   Here we have the source, now we    │
         # │  need to compile it using CMakeList  │
         # ╰──────────────────────────────────────╯
-        self.buildExternalsObjects()
+        with self.Pd4Web.Tracer.Span("buildExternalsObjects"):
+            self.buildExternalsObjects()
 
         # Create filysystem
         self.AddFilesToWebPatch()
 
         # Create CMakeList
-        self.CreateCMakeLists()
+        with self.Pd4Web.Tracer.Span("CreateCMakeLists") as span:
+            self.cmakeChanged = self.CreateCMakeLists()
+            span["changed"] = self.cmakeChanged
 
-        # Compile
-        self.ConfigureProject()
-        self.CompileProject()
+    def Build(self):
+        """
+        Package the patch files and link pd4web.wasm, each one only when its inputs changed.
+        """
+        # Compile, the patch files are packaged apart, so when only they changed the wasm is not linked again
+        saved = self.LoadFingerprint()
+        dataFingerprint = self.BuildFingerprint("data")
+        dataOutputs = ["pd4web.data", "pd4web.data.js.metadata"]
+        dataChanged = saved.get("data") != dataFingerprint or not self.hasOutputs(dataOutputs)
+        dataChanged = dataChanged or not os.path.exists(self.Pd4Web.PROJECT_ROOT + "/Pd4Web/pd4web.data.js")
+        if dataChanged:
+            self.PackageData()
+        linkFingerprint = self.BuildFingerprint("link")
+        linkChanged = saved.get("link") != linkFingerprint or not self.hasOutputs(["pd4web.js", "pd4web.wasm"])
+        # the build type and the tools are only given to cmake when the project is configured
+        configureFingerprint = saved.get("configure", "")
+        if linkChanged:
+            configureChanged = configureFingerprint != self.BuildFingerprint("configure")
+            configured = os.path.exists(self.Pd4Web.PROJECT_ROOT + "/build/build.ninja")
+            if self.cmakeChanged or configureChanged or not configured:
+                self.ConfigureProject(fresh=configureChanged and configureFingerprint != "")
+                configureFingerprint = self.BuildFingerprint("configure")
+            self.CompileProject()
+            ExternalsSizeReport(self.Pd4Web).Save()
+        elif dataChanged:
+            self.Pd4Web.print(
+                "Only the patch changed, pd4web.data was updated without linking pd4web.wasm",
+                color="green",
+                silence=self.Pd4Web.SILENCE,
+                pd4web=self.Pd4Web.PD_EXTERNAL,
+            )
+        else:
+            self.Pd4Web.print(
+                "Nothing changed since the last build",
+                color="green",
+                silence=self.Pd4Web.SILENCE,
+                pd4web=self.Pd4Web.PD_EXTERNAL,
+            )
+        self.SaveFingerprint({"link": linkFingerprint, "data": dataFingerprint, "configure": configureFingerprint})
+        self.cmakeChanged = False
+        self.Pd4Web.Archives.Harvest()
         self.CopyExtraJsFiles()
 
         # Save the project versions
@@ -50,6 +108,7 @@ class GetAndBuildExternals:
 
     def InitVariables(self):
         self.cmakeFile = []
+        self.setupFunctions = {}
         self.CopyCppFilesToProject()
         self.InitCMakeLists()
         pass
@@ -63,6 +122,14 @@ class GetAndBuildExternals:
         self.cmakeFile.append("cmake_minimum_required(VERSION 3.25)")
         self.cmakeFile.append(f'project("{self.ProjectName}")\n')
 
+        # Compiler cache, must be set before the targets are created
+        if self.Pd4Web.Compiler.COMPILER_CACHE != "":
+            compilerCache = self.Pd4Web.Compiler.COMPILER_CACHE.replace("\\", "/")
+            self.cmakeFile.append("# Compiler cache")
+            self.cmakeFile.append(f'set(CMAKE_C_COMPILER_LAUNCHER "{compilerCache}")')
+            self.cmakeFile.append(f'set(CMAKE_CXX_COMPILER_LAUNCHER "{compilerCache}")')
+            self.cmakeFile.append("")
+
         # Pd Sources
         self.cmakeFile.append("# Pd sources")
         self.cmakeFile.append('set(CMAKE_CXX_FLAGS "${CMAKE_CXX_FLAGS} -pthread -matomics -mbulk-memory")')
@@ -79,15 +146,11 @@ class GetAndBuildExternals:
         # Debug option
         self.cmakeFile.append('if(CMAKE_BUILD_TYPE STREQUAL "Debug")')
         self.cmakeFile.append('    message(WARNING "Building in Debug mode")')
-        self.cmakeFile.append('    set(CMAKE_CXX_FLAGS "${CMAKE_CXX_FLAGS} -g")')
-        self.cmakeFile.append('    set(CMAKE_C_FLAGS "${CMAKE_C_FLAGS} -g")')
+        self.cmakeFile.append(f'    set(CMAKE_CXX_FLAGS "${{CMAKE_CXX_FLAGS}} {self.Pd4Web.DEBUG_FLAGS}")')
+        self.cmakeFile.append(f'    set(CMAKE_C_FLAGS "${{CMAKE_C_FLAGS}} {self.Pd4Web.DEBUG_FLAGS}")')
         self.cmakeFile.append("else()")
-        self.cmakeFile.append(
-            '    set(CMAKE_CXX_FLAGS "${CMAKE_CXX_FLAGS}  -O3 -flto -pthread -matomics -mbulk-memory -msimd128")'
-        )
-        self.cmakeFile.append(
-            '    set(CMAKE_C_FLAGS "${CMAKE_C_FLAGS} -O3 -flto -pthread -matomics -mbulk-memory -msimd128")'
-        )
+        self.cmakeFile.append(f'    set(CMAKE_CXX_FLAGS "${{CMAKE_CXX_FLAGS}}  {self.Pd4Web.RELEASE_FLAGS}")')
+        self.cmakeFile.append(f'    set(CMAKE_C_FLAGS "${{CMAKE_C_FLAGS}} {self.Pd4Web.RELEASE_FLAGS}")')
         self.cmakeFile.append("endif()")
         self.cmakeFile.append("")
 
@@ -138,92 +201,93 @@ class GetAndBuildExternals:
         else:
             if not os.path.isdir(self.Pd4Web.PROJECT_ROOT + "/Pd4Web/Externals"):
                 self.Pd4Web.exception("Error: Pd4Web/Externals is not a folder")
-        shutil.copy(
+        CopyIfChanged(
             self.Pd4Web.PD4WEB_ROOT + "/../pd4web.cpp",
             self.Pd4Web.PROJECT_ROOT + "/Pd4Web/",
         )
-        shutil.copy(
+        CopyIfChanged(
             self.Pd4Web.PD4WEB_ROOT + "/../pd4web.hpp",
             self.Pd4Web.PROJECT_ROOT + "/Pd4Web/",
         )
-        shutil.copy(
+        CopyIfChanged(
             self.Pd4Web.PD4WEB_LIBRARIES + "/pd.cmake/pd.cmake",
             self.Pd4Web.PROJECT_ROOT + "/Pd4Web/Externals/pd.cmake",
         )
-        shutil.copy(
+        CopyIfChanged(
             self.Pd4Web.PD4WEB_LIBRARIES + "/libpd.cmake",
             self.Pd4Web.PROJECT_ROOT + "/Pd4Web/libpd.cmake",
         )
+        self.Pd4Web.Materializer.MaterializeReferenced(
+            "pure-data",
+            self.Pd4Web.APPDATA + "/Pd/src",
+            self.Pd4Web.PROJECT_ROOT + "/Pd4Web/pure-data/src",
+            self.Pd4Web.PROJECT_ROOT + "/Pd4Web/libpd.cmake",
+        )
 
     def UpdateSetupFunction(self):
         for usedObjects in self.Pd4Web.usedObjects:
-            if usedObjects["Lib"] != "pure-data":
-                for patchLine in self.Patch.patchLinesProcessed:
-                    sameLibrary = patchLine.library == usedObjects["Lib"]
-                    sameObject = patchLine.name == usedObjects["Obj"]
-                    if sameLibrary and sameObject:
-                        usedObjects["SetupFunction"] = patchLine.functionName
-
-    def regexSearch(self, obj: dict, functionName, file):
+            key = (usedObjects["Lib"], usedObjects["Obj"])
+            if usedObjects["Lib"] != "pure-data" and key in self.Patch.objectFunctions:
+                usedObjects["SetupFunction"] = self.Patch.objectFunctions[key]
+
+    def GetSetupFunctions(self, libName: str) -> dict:
         """
-        This search for the setup function using regex.
+        Map every `*_setup`/`setup_*` function of the library to the source file that defines it.
+        The library is read in one pass and the map is saved in the SymbolCache with the object index.
         """
-        with open(
-            file,
-            "r",
-            encoding="utf-8",
-            errors="ignore",
-        ) as c_file:
-            try:
-                file_contents = c_file.read()
-            except:
-                self.Pd4Web.exception(f"Could not read file: {file} using utf-8")
-
-            patterns = [r"void\s*{}\s*\(\s*void\s*\)", r"void\s+{}\s*\(\s*\)"]
-            for pattern in patterns:
-                pattern = pattern.format(re.escape(functionName))
-                matches = re.finditer(pattern, file_contents, re.DOTALL)
-                listMatches = list(matches)
-                if len(listMatches) > 0:
-                    obj["SetupFunction"] = functionName
-                    self.Pd4Web.print(
-                        f"Found setup function: {functionName}",
-                        color="green",
-                        silence=self.Pd4Web.SILENCE,
-                        pd4web=self.Pd4Web.PD_EXTERNAL,
-                    )
-
-    def searchCFunction(self, obj: dict, root, file):
+        if libName in self.setupFunctions:
+            return self.setupFunctions[libName]
+
+        libVersion = self.Pd4Web.Objects.GetLibraryVersion(libName)
+        setupFunctions = self.Pd4Web.SymbolCache.Get(libName, libVersion, "setup")
+        if setupFunctions is None:
+            setupFunctions = {}
+            libPath = self.Pd4Web.APPDATA + "/Externals/" + libName
+            pattern = re.compile(r"\bvoid\s+(\w+_setup|setup_\w+)\s*\(\s*(?:void\s*)?\)")
+            for root, _, files in os.walk(libPath):
+                for file in files:
+                    if not (file.endswith(".c") or file.endswith(".cpp") or file.endswith(".C")):
+                        continue
+                    filePath = os.path.join(root, file)
+                    with open(filePath, "r", encoding="utf-8", errors="ignore") as c_file:
+                        try:
+                            file_contents = c_file.read()
+                        except:
+                            self.Pd4Web.exception(f"Could not read file: {filePath} using utf-8")
+                    for match in pattern.finditer(file_contents):
+                        setupFunctions.setdefault(match.group(1), os.path.relpath(filePath, libPath))
+            self.Pd4Web.SymbolCache.Set(libName, libVersion, "setup", setupFunctions)
+
+        self.setupFunctions[libName] = setupFunctions
+        return setupFunctions
+
+    def setupFunctionNames(self, objName: str) -> list:
         """
-        This function search for the setup function in the C file using different
-        ways. Here you can add more ways to search for the setup function.
+        Possible names of the setup function of one object, in the order they are tried.
         """
-        functionName = obj["Obj"]
-        functionName = functionName.replace("~", "_tilde")
-        functionName += "_setup"
+        functionName = objName.replace("~", "_tilde")
         if "." in functionName:
             functionName = functionName.replace(".", "0x2e")  # else use . as 0x2e
-        self.regexSearch(obj, functionName, os.path.join(root, file))
-        if obj["SetupFunction"] == "":
-            functionName = obj["Obj"]
-            functionName = functionName.replace("~", "_tilde")
-            functionName = "setup_" + functionName
-            if "." in functionName:
-                functionName = functionName.replace(".", "0x2e")
-            self.regexSearch(obj, functionName, os.path.join(root, file))
+        return [functionName + "_setup", "setup_" + functionName]
 
     def getObjectsSourceCode(self):
         print()
         for obj in self.Pd4Web.usedObjects:
             libName = obj["Lib"]
             foundLibrary = self.Libraries.GetLibrarySourceCode(libName)
-            if foundLibrary:
-                for root, _, files in os.walk(self.Pd4Web.PROJECT_ROOT + "/Pd4Web/Externals/" + libName):
-                    for file in files:
-                        if file.endswith(".c") or file.endswith(".cpp") or file.endswith(".C"):
-                            self.searchCFunction(obj, root, file)
-            else:
-                self.Pd4Web.exception(f"Error: Could not find {obj.library} in the supported libraries")
+            if not foundLibrary:
+                self.Pd4Web.exception(f"Error: Could not find {libName} in the supported libraries")
+            setupFunctions = self.GetSetupFunctions(libName)
+            for functionName in self.setupFunctionNames(obj["Obj"]):
+                if functionName in setupFunctions:
+                    obj["SetupFunction"] = functionName
+                    self.Pd4Web.print(
+                        f"Found setup function: {functionName}",
+                        color="green",
+                        silence=self.Pd4Web.SILENCE,
+                        pd4web=self.Pd4Web.PD_EXTERNAL,
+                    )
+                    break
         return True
 
     def buildExternalsObjects(self):
@@ -239,12 +303,14 @@ class GetAndBuildExternals:
                 usedObjectsName[library].append(usedObjects["Obj"])
 
         externalsTargets = []
+        targetsLibrary = {}
         print()
         for library, objects in usedObjectsName.items():
             if library == "pure-data":
                 # TODO: Need to check for extra objects
                 continue
             libraryPath = self.Pd4Web.PROJECT_ROOT + "/Pd4Web/Externals/" + library
+            libraryTargets = []
             for pdobject in objects:
 
                 if pdobject not in self.Pd4Web.externalsLinkLibraries:
@@ -254,39 +320,111 @@ class GetAndBuildExternals:
                 target = pdobject.replace("~", "_tilde")
 
                 externalsTargets.append(target)
+                targetsLibrary[target] = library
+                if target not in libraryTargets:
+                    libraryTargets.append(target)
+
+            CMAKE_LIB_FILE = os.path.normpath(os.path.join(self.Pd4Web.PD4WEB_LIBRARIES, f"{library}.cmake"))
+            archives = self.Pd4Web.Archives.CachedTargets(library, CMAKE_LIB_FILE, libraryTargets)
+            if archives is not None:
+                self.Pd4Web.print(
+                    f"Linking the cached archives of {library}",
+                    color="green",
+                    silence=self.Pd4Web.SILENCE,
+                    pd4web=self.Pd4Web.PD_EXTERNAL,
+                )
+                self.cmakeFile.extend(self.Pd4Web.Archives.ImportedTargets(archives))
+                continue
 
-            CMAKE_LIB_FILE = os.path.normpath(
-                os.path.join(self.Pd4Web.PD4WEB_ROOT, "..", "Libraries", f"{library}.cmake")
+            self.pruneLibrary(library, CMAKE_LIB_FILE, libraryTargets)
+            self.Pd4Web.Materializer.MaterializeReferenced(
+                library,
+                self.Pd4Web.APPDATA + "/Externals/" + library,
+                libraryPath,
+                self.Pd4Web.PROJECT_ROOT + f"/Pd4Web/Externals/{library}.cmake",
             )
-            shutil.copy(CMAKE_LIB_FILE, self.Pd4Web.PROJECT_ROOT + "/Pd4Web/Externals/")
             self.cmakeFile.append(f"include(Pd4Web/Externals/{library}.cmake)")
+            self.cmakeFile.extend(self.Pd4Web.Archives.ManifestTargets(library, CMAKE_LIB_FILE, libraryTargets))
 
         if len(externalsTargets) == 0:
             return
         self.cmakeFile.append(f"\n# Project Externals Libraries")
         targetsString = " ".join(externalsTargets)
         self.cmakeFile.append(f"target_link_libraries(pd4web PRIVATE {targetsString})")
+        self.cmakeFile.extend(ExternalsSizeReport(self.Pd4Web).CMakeLines(targetsLibrary))
+
+    def pruneLibrary(self, library: str, cmakeFile: str, targets: list):
+        """
+        Copy <lib>.cmake to the project with only the externals used by the patch (and the ones they link).
+        """
+        with open(cmakeFile, "r") as file:
+            cmakeText = file.read()
+        cmakeText, kept, removed = PruneExternals(cmakeText, targets)
+        WriteIfChanged(self.Pd4Web.PROJECT_ROOT + f"/Pd4Web/Externals/{library}.cmake", cmakeText)
+        if len(removed) > 0:
+            self.Pd4Web.print(
+                f"Building {len(kept)} of {len(kept) + len(removed)} externals of {library}",
+                color="green",
+                silence=self.Pd4Web.SILENCE,
+                pd4web=self.Pd4Web.PD_EXTERNAL,
+            )
 
     def AddFilesToWebPatch(self):
+        """
+        The patch, the abstractions, Audios and Extras are packaged in pd4web.data by PackageData. The loader
+        is linked with --pre-js and reads the file list from pd4web.data.js.metadata, so changing the patch
+        does not change the wasm.
+        """
         self.cmakeFile.append("\n# FileSystem for the Patch")
-        # string = 'set_target_properties(pd4web PROPERTIES LINK_FLAGS "--preload-file \"${CMAKE_CURRENT_SOURCE_DIR}/WebPatch/index.pd@/index.pd\"")'
-        string = 'set_target_properties(pd4web PROPERTIES LINK_FLAGS "--preload-file \\"${CMAKE_CURRENT_SOURCE_DIR}/WebPatch/index.pd@/index.pd\\"")'
-        self.cmakeFile.append(string)
-        if os.path.exists(self.Pd4Web.PROJECT_ROOT + "/Audios"):
-            self.cmakeFile.append("get_target_property(EMCC_LINK_FLAGS pd4web LINK_FLAGS)")
-            self.cmakeFile.append(
-                'set_target_properties(pd4web PROPERTIES LINK_FLAGS "${EMCC_LINK_FLAGS} --preload-file \\"${CMAKE_CURRENT_SOURCE_DIR}/Audios@/Audios/\\"")'
-            )
-        if os.path.exists(self.Pd4Web.PROJECT_ROOT + "/.tmp"):
-            self.cmakeFile.append("get_target_property(EMCC_LINK_FLAGS pd4web LINK_FLAGS)")
-            self.cmakeFile.append(
-                'set_target_properties(pd4web PROPERTIES LINK_FLAGS "${EMCC_LINK_FLAGS} --preload-file \\"${CMAKE_CURRENT_SOURCE_DIR}/.tmp@/Libs/\\"")'
-            )
-        if os.path.exists(self.Pd4Web.PROJECT_ROOT + "/Extras"):
-            self.cmakeFile.append("get_target_property(EMCC_LINK_FLAGS pd4web LINK_FLAGS)")
-            self.cmakeFile.append(
-                'set_target_properties(pd4web PROPERTIES LINK_FLAGS "${EMCC_LINK_FLAGS} --preload-file \\"${CMAKE_CURRENT_SOURCE_DIR}/Extras@/Extras/\\"")'
+        self.cmakeFile.append("target_link_options(pd4web PRIVATE")
+        self.cmakeFile.append("    -sFORCE_FILESYSTEM=1")
+        self.cmakeFile.append('    "SHELL:--pre-js \\"${CMAKE_CURRENT_SOURCE_DIR}/Pd4Web/pd4web.data.js\\""')
+        self.cmakeFile.append(")")
+        self.cmakeFile.append(
+            "set_property(TARGET pd4web APPEND PROPERTY LINK_DEPENDS "
+            + '"${CMAKE_CURRENT_SOURCE_DIR}/Pd4Web/pd4web.data.js")'
+        )
+
+    def PackageData(self):
+        """
+        Create WebPatch/pd4web.data with the emscripten file packager. The loader is only rewritten when
+        its code changes (for example, a new folder), then the wasm is linked again.
+        """
+        preload = ["WebPatch/index.pd@/index.pd"]
+        for folder, mountPoint in [("Audios", "/Audios/"), (".tmp", "/Libs/"), ("Extras", "/Extras/")]:
+            if os.path.exists(self.Pd4Web.PROJECT_ROOT + "/" + folder):
+                preload.append(f"{folder}@{mountPoint}")
+
+        buildFolder = self.Pd4Web.PROJECT_ROOT + "/build"
+        os.makedirs(buildFolder, exist_ok=True)
+        loader = buildFolder + "/pd4web.data.js"
+        command = [
+            sys.executable,
+            self.Pd4Web.Compiler.FILE_PACKAGER,
+            "WebPatch/pd4web.data",
+            "--preload",
+            *preload,
+            f"--js-output={loader}",
+            "--separate-metadata",
+        ]
+        if self.Pd4Web.verbose:
+            self.Pd4Web.print(
+                " ".join(command), color="green", silence=self.Pd4Web.SILENCE, pd4web=self.Pd4Web.PD_EXTERNAL
             )
+        result = self.Pd4Web.Tracer.Run(
+            command,
+            cwd=self.Pd4Web.PROJECT_ROOT,
+            env=self.Pd4Web.env,
+            capture_output=not self.Pd4Web.verbose,
+            text=True,
+        ).returncode
+        if result != 0:
+            self.Pd4Web.exception("Error: Could not package the patch files")
+        os.replace(loader + ".metadata", self.Pd4Web.PROJECT_ROOT + "/WebPatch/pd4web.data.js.metadata")
+
+        with open(loader, "r") as file:
+            loaderCode = file.read()
+        WriteIfChanged(self.Pd4Web.PROJECT_ROOT + "/Pd4Web/pd4web.data.js", loaderCode)
 
     def CreateCppCallsExternalFile(self):
         audioConfig = self.Pd4Web.PROJECT_ROOT + "/Pd4Web/config.h"
@@ -294,7 +432,7 @@ class GetAndBuildExternals:
         # ╭──────────────────────────────────────╮
         # │             Config File              │
         # ╰──────────────────────────────────────╯
-        with open(audioConfig, "w") as f:
+        with io.StringIO() as f:
             # Audio Config
             if self.Pd4Web.OUTCHS_COUNT == 0:
                 self.Pd4Web.OUTCHS_COUNT = 2
@@ -339,12 +477,13 @@ class GetAndBuildExternals:
                 f.write(f"#define PD4WEB_MIDI true\n")
             else:
                 f.write(f"#define PD4WEB_MIDI false\n")
+            WriteIfChanged(audioConfig, f.getvalue())
 
         # ╭──────────────────────────────────────╮
         # │            External File             │
         # ╰──────────────────────────────────────╯
         externals = self.Pd4Web.PROJECT_ROOT + "/Pd4Web/externals.cpp"
-        with open(externals, "w") as f:
+        with io.StringIO() as f:
             # Escrever o cabeçalho e a função Pd4WebInitExternals()
             f.write("// This is automatically generated code from pd4web.py script\n\n")
             for usedObjects in self.Pd4Web.usedObjects:
@@ -360,15 +499,80 @@ class GetAndBuildExternals:
 
             f.write("    return;\n")
             f.write("};\n")
+            WriteIfChanged(externals, f.getvalue())
 
-    def CreateCMakeLists(self):
-        with open(self.Pd4Web.PROJECT_ROOT + "/CMakeLists.txt", "w") as cmakeFile:
-            for line in self.cmakeFile:
-                cmakeFile.write(line + "\n")
+    def CreateCMakeLists(self) -> bool:
+        """
+        Write CMakeLists.txt, returns False when it was already the same (configure is not needed).
+        """
+        cmakeText = "".join(line + "\n" for line in self.cmakeFile)
+        return WriteIfChanged(self.Pd4Web.PROJECT_ROOT + "/CMakeLists.txt", cmakeText)
+
+    def preloadedFiles(self) -> list:
+        """
+        Files embedded in pd4web.data, paths relative to the project.
+        """
+        files = ["WebPatch/index.pd"]
+        for folder in ["Audios", ".tmp", "Extras"]:
+            for root, _, fileNames in os.walk(self.Pd4Web.PROJECT_ROOT + "/" + folder):
+                for fileName in fileNames:
+                    path = os.path.join(root, fileName)
+                    files.append(os.path.relpath(path, self.Pd4Web.PROJECT_ROOT).replace(os.sep, "/"))
+        return sorted(files)
+
+    def BuildFingerprint(self, kind: str) -> str:
+        """
+        Hash of what changes one part of the output. `data` is the patch and the files packaged with it,
+        `link` is the used objects, the flags, the versions and the generated files (pd4web.wasm and pd4web.js),
+        `configure` is the cmake command that configures build/ (build type and tools).
+        """
+        if kind == "data":
+            paths = self.preloadedFiles()
+            fingerprint = {}
+        elif kind == "configure":
+            paths = []
+            fingerprint = {"command": self.configureCommand()}
+        else:
+            paths = ["CMakeLists.txt", "Pd4Web/config.h", "Pd4Web/externals.cpp", "Pd4Web/pd4web.data.js"]
+            fingerprint = {
+                "objects": [[obj["Lib"], obj["Obj"], obj.get("SetupFunction", "")] for obj in self.Pd4Web.usedObjects],
+                "flags": {
+                    "MEMORY_SIZE": self.Pd4Web.MEMORY_SIZE,
+                    "GUI": self.Pd4Web.GUI,
+                    "DEBUG": self.Pd4Web.DEBUG,
+                    "PATCH_ZOOM": self.Pd4Web.PATCH_ZOOM,
+                },
+                "versions": self.Pd4Web.Version,
+            }
+        files = {}
+        for path in paths:
+            fullPath = self.Pd4Web.PROJECT_ROOT + "/" + path
+            files[path] = FileHash(fullPath) if os.path.isfile(fullPath) else None
+        fingerprint["files"] = files
+        text = json.dumps(fingerprint, sort_keys=True, default=str)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def hasOutputs(self, outputs: list) -> bool:
+        for output in outputs:
+            if not os.path.exists(self.Pd4Web.PROJECT_ROOT + "/WebPatch/" + output):
+                return False
+        return True
 
-    def ConfigureProject(self):
-        cwd = os.getcwd()
-        os.chdir(self.Pd4Web.PROJECT_ROOT)
+    def LoadFingerprint(self) -> dict:
+        fingerprintFile = self.Pd4Web.PROJECT_ROOT + "/build/pd4web.fingerprint"
+        if not os.path.exists(fingerprintFile):
+            return {}
+        try:
+            with open(fingerprintFile, "r") as file:
+                return json.load(file)
+        except ValueError:
+            return {}
+
+    def SaveFingerprint(self, fingerprint: dict):
+        os.makedirs(self.Pd4Web.PROJECT_ROOT + "/build", exist_ok=True)
+        WriteIfChanged(self.Pd4Web.PROJECT_ROOT + "/build/pd4web.fingerprint", json.dumps(fingerprint, indent=4))
+
+    def configureCommand(self) -> list:
         emcmake = self.Pd4Web.Compiler.EMCMAKE
         cmake = self.Pd4Web.Compiler.CMAKE
         ninja = self.Pd4Web.Compiler.NINJA
@@ -392,23 +596,30 @@ class GetAndBuildExternals:
             "-DEMMAKE=" + make,
             f"-DCMAKE_MAKE_PROGRAM={ninja}",
         ]
+        return command
+
+    def ConfigureProject(self, fresh: bool = False):
+        """
+        Configure build/, with `fresh` the cache of build/ is discarded (the tools or the build type changed).
+        """
+        command = self.configureCommand()
+        if fresh:
+            command.append("--fresh")
         if self.Pd4Web.verbose:
             self.Pd4Web.print(
                 " ".join(command), color="green", silence=self.Pd4Web.SILENCE, pd4web=self.Pd4Web.PD_EXTERNAL
             )
-        result = subprocess.run(
-            command, env=self.Pd4Web.env, capture_output=not self.Pd4Web.verbose, text=True
-        ).returncode
+        progress = NinjaProgress(self.Pd4Web, "Configuring")
+        result = self.Pd4Web.Tracer.Stream(command, progress.Line, env=self.Pd4Web.env, cwd=self.Pd4Web.PROJECT_ROOT)
         if result != 0:
+            self.printErrorOutput(progress)
             self.Pd4Web.exception("Error: Could not configure the project")
-        os.chdir(cwd)
 
     def CompileProject(self):
-        cwd = os.getcwd()
-        os.chdir(self.Pd4Web.PROJECT_ROOT)
-        cpu_count = os.cpu_count()
+        # build-many shares the cores between the projects that are compiled at the same time
+        jobs = self.Pd4Web.BUILD_JOBS if self.Pd4Web.BUILD_JOBS > 0 else os.cpu_count()
         command = [self.Pd4Web.Compiler.CMAKE, "--build", "build"]
-        command.append(f"-j{cpu_count}")
+        command.append(f"-j{jobs}")
         command.append("--target")
         command.append("pd4web")
         self.Pd4Web.print(
@@ -423,16 +634,43 @@ class GetAndBuildExternals:
                 " ".join(command), color="green", silence=self.Pd4Web.SILENCE, pd4web=self.Pd4Web.PD_EXTERNAL
             )
 
-        result = subprocess.run(
-            command, env=self.Pd4Web.env, capture_output=not self.Pd4Web.verbose, text=True
-        ).returncode
+        cacheBefore = self.Pd4Web.Compiler.CompilerCacheStats()
+        ninjaLog = NinjaLog(self.Pd4Web, os.path.join(self.Pd4Web.PROJECT_ROOT, "build"))
+        progress = NinjaProgress(self.Pd4Web, "Compiling")
+        # one `[n/m]` line for each step, whatever NINJA_STATUS the user has
+        env = dict(self.Pd4Web.env, NINJA_STATUS="[%f/%t] ")
+        result = self.Pd4Web.Tracer.Stream(command, progress.Line, env=env, cwd=self.Pd4Web.PROJECT_ROOT)
+        progress.Finish()
         if result != 0:
-            self.Pd4Web.exception("Error: Could not compile the project, run on verbose mode to see the error")
-        os.chdir(cwd)
+            self.printErrorOutput(progress)
+            self.Pd4Web.exception("Error: Could not compile the project")
+        ninjaLog.PrintReport()
+        self.PrintCompilerCacheStats(cacheBefore)
+
+    def printErrorOutput(self, progress: NinjaProgress):
+        # with --verbose the output was already printed
+        if self.Pd4Web.verbose or self.Pd4Web.SILENCE:
+            return
+        for line in progress.ErrorOutput().splitlines():
+            self.Pd4Web.print(line, pd4web=self.Pd4Web.PD_EXTERNAL)
 
-    def CopyExtraJsFiles(self):
-        cwd = os.getcwd()
+    def PrintCompilerCacheStats(self, cacheBefore):
+        cacheAfter = self.Pd4Web.Compiler.CompilerCacheStats()
+        if cacheBefore is None or cacheAfter is None:
+            return
+        hits = cacheAfter[0] - cacheBefore[0]
+        misses = cacheAfter[1] - cacheBefore[1]
+        if hits + misses == 0:
+            return
+        self.Pd4Web.print(
+            f"Compiler cache ({self.Pd4Web.Compiler.COMPILER_CACHE_NAME}): {hits} hits, {misses} misses, "
+            f"{100 * hits / (hits + misses):.0f}% hit rate",
+            color="blue",
+            silence=self.Pd4Web.SILENCE,
+            pd4web=self.Pd4Web.PD_EXTERNAL,
+        )
 
+    def CopyExtraJsFiles(self):
         # just copy files if they don't exist
 
         if not os.path.exists(self.Pd4Web.PROJECT_ROOT + "/.gitignore"):
@@ -441,8 +679,6 @@ class GetAndBuildExternals:
                 self.Pd4Web.PROJECT_ROOT + "/.gitignore",
             )
 
-        os.chdir(self.Pd4Web.PROJECT_ROOT)
-
         # Define source and destination paths
         favicon_src = self.Pd4Web.PD4WEB_ROOT + "/../favicon.ico"
         favicon_dest = self.Pd4Web.PROJECT_ROOT + "/favicon.ico"
@@ -507,7 +743,6 @@ class GetAndBuildExternals:
             for file in files:
                 if not os.path.exists(self.Pd4Web.PROJECT_ROOT + "/WebPatch/" + file):
                     shutil.copy(os.path.join(root, file), self.Pd4Web.PROJECT_ROOT + "/WebPatch/")
-        os.chdir(cwd)
 
     def SaveProjectVersions(self):
         # check if file exists
@@ -0,0 +1,264 @@
+import re
+
+
+class CMakeCommand:
+    """
+    One command of a CMake file: its name, its arguments (quotes removed) and where it is in the text.
+    """
+
+    def __init__(self, name: str, args: list, start: int, end: int):
+        self.name = name
+        self.args = args
+        self.start = start
+        self.end = end
+
+    def __repr__(self) -> str:
+        return f"< CMake: {self.name}({' '.join(self.args)}) >"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+
+def ParseCMakeCommands(text: str) -> list:
+    """
+    Split a CMake file in commands. Comments are skipped, quoted and bracket arguments are kept
+    as one argument and nested parentheses are part of the arguments.
+    """
+    commands = []
+    nameRegex = re.compile(r"([A-Za-z_][A-Za-z0-9_]*)[ \t]*\(")
+    i = 0
+    size = len(text)
+    while i < size:
+        char = text[i]
+        if char == "#":
+            i = skipComment(text, i)
+            continue
+        if char.isspace():
+            i += 1
+            continue
+        match = nameRegex.match(text, i)
+        if match is None:
+            i += 1
+            continue
+        args, end = parseArguments(text, match.end())
+        commands.append(CMakeCommand(match.group(1), args, i, end))
+        i = end
+    return commands
+
+
+def skipComment(text: str, i: int) -> int:
+    bracket = re.match(r"#\[(=*)\[", text[i:])
+    if bracket:
+        close = text.find("]" + bracket.group(1) + "]", i)
+        return len(text) if close == -1 else close + len(bracket.group(1)) + 2
+    newline = text.find("\n", i)
+    return len(text) if newline == -1 else newline + 1
+
+
+def parseArguments(text: str, i: int):
+    """
+    Parse the arguments after the `(` at `i`, returns the arguments and the index after the closing `)`.
+    """
+    args = []
+    current = ""
+    depth = 1
+    size = len(text)
+    while i < size:
+        char = text[i]
+        if char == "\\" and i + 1 < size:
+            current += text[i : i + 2]
+            i += 2
+        elif char == '"':
+            close = i + 1
+            while close < size and text[close] != '"':
+                close += 2 if text[close] == "\\" else 1
+            current += text[i + 1 : close]
+            args.append(current)
+            current = ""
+            i = close + 1
+        elif char == "#" and current == "":
+            i = skipComment(text, i)
+        elif char == "(":
+            depth += 1
+            current += char
+            i += 1
+        elif char == ")":
+            depth -= 1
+            if depth == 0:
+                if current != "":
+                    args.append(current)
+                return args, i + 1
+            current += char
+            i += 1
+        elif char.isspace():
+            if current != "":
+                args.append(current)
+                current = ""
+            i += 1
+        else:
+            current += char
+            i += 1
+    if current != "":
+        args.append(current)
+    return args, size
+
+
+def ExpandVariables(value: str, variables: dict) -> str:
+    """
+    Replace ${VAR} by its value, unknown variables are kept as they are.
+    """
+    regex = re.compile(r"\$\{([A-Za-z0-9_.+-]+)\}")
+    for _ in range(16):
+        expanded = regex.sub(lambda match: variables.get(match.group(1), match.group(0)), value)
+        if expanded == value:
+            break
+        value = expanded
+    return value
+
+
+def CMakeVariables(commands: list, variables: dict) -> dict:
+    """
+    Follow the set(), list(APPEND) and project() commands of a file. Both branches of if() are
+    followed, so the result is a superset of what CMake would see.
+    """
+    variables = dict(variables)
+    for command in commands:
+        name = command.name.lower()
+        if name == "project" and len(command.args) > 0:
+            variables["PROJECT_NAME"] = command.args[0]
+        elif name == "set" and len(command.args) > 0:
+            values = []
+            for arg in command.args[1:]:
+                if arg in ["CACHE", "PARENT_SCOPE"]:
+                    break
+                values.append(ExpandVariables(arg, variables))
+            variables[command.args[0]] = ";".join(values)
+        elif name == "list" and len(command.args) > 2 and command.args[0] == "APPEND":
+            values = [ExpandVariables(arg, variables) for arg in command.args[2:]]
+            previous = variables.get(command.args[1], "")
+            variables[command.args[1]] = ";".join([previous] + values if previous else values)
+    return variables
+
+
+def MutatingFunctions(commands: list, known=()) -> set:
+    """
+    Names (lower case) of the functions defined in `commands` that rewrite a file with file(WRITE) or
+    file(APPEND), directly or through a function of `known` (the ones of the other .cmake files).
+    """
+    calls = {}
+    current = None
+    for command in commands:
+        name = command.name.lower()
+        if name == "function" and len(command.args) > 0:
+            current = command.args[0].lower()
+            calls.setdefault(current, set())
+        elif name == "endfunction":
+            current = None
+        elif current is not None and IsFileWrite(command):
+            calls[current].add("file")
+        elif current is not None:
+            calls[current].add(name)
+
+    functions = set(known)
+    changed = True
+    while changed:
+        changed = False
+        for function, called in calls.items():
+            if function not in functions and ("file" in called or len(called & functions) > 0):
+                functions.add(function)
+                changed = True
+    return functions
+
+
+def IsFileWrite(command) -> bool:
+    """
+    True for file(WRITE <path> ...) and file(APPEND <path> ...).
+    """
+    return command.name.lower() == "file" and len(command.args) > 1 and command.args[0] in ("WRITE", "APPEND")
+
+
+# commands whose arguments are never a target
+NO_TARGET_COMMANDS = ("project", "cmake_minimum_required")
+
+# commands that configure a target given as their first argument
+TARGET_COMMANDS = (
+    "target_link_libraries",
+    "target_include_directories",
+    "target_compile_features",
+    "target_compile_options",
+    "target_compile_definitions",
+    "target_link_options",
+    "target_sources",
+    "set_target_properties",
+    "add_dependencies",
+)
+
+
+def ExternalTarget(command: CMakeCommand) -> str:
+    """
+    Target created by a pd_add_external() command, `name~` is `name_tilde` unless TARGET is given.
+    """
+    target = command.args[0].replace("~", "_tilde")
+    if "TARGET" in command.args[:-1]:
+        target = command.args[command.args.index("TARGET") + 1]
+    return target
+
+
+def PruneExternals(text: str, targets: list):
+    """
+    Remove from the CMake `text` the pd_add_external() of the externals that are not in `targets` and the
+    commands that configure them. The externals that a kept external links are kept too, and so are the
+    externals named by other commands (generate_export_header, set_property(TARGET ...), ...), which
+    would fail without them. Returns the new text, the kept and the removed targets.
+    """
+    commands = ParseCMakeCommands(text)
+    externals = {}
+    links = {}
+    referenced = []
+    for command in commands:
+        name = command.name.lower()
+        if name == "pd_add_external" and len(command.args) > 0:
+            target = ExternalTarget(command)
+            externals[target] = command
+            if "LINK_LIBRARIES" in command.args:
+                links.setdefault(target, []).extend(command.args[command.args.index("LINK_LIBRARIES") + 1 :])
+        elif name in ["target_link_libraries", "add_dependencies"] and len(command.args) > 0:
+            links.setdefault(command.args[0], []).extend(command.args[1:])
+        elif name not in TARGET_COMMANDS and name not in NO_TARGET_COMMANDS:
+            referenced += command.args
+
+    kept = set()
+    toKeep = [target for target in targets if target in externals]
+    toKeep += [target for target in referenced if target in externals]
+    while len(toKeep) > 0:
+        target = toKeep.pop()
+        if target not in kept:
+            kept.add(target)
+            toKeep += [link for link in links.get(target, []) if link in externals]
+    removed = [target for target in externals if target not in kept]
+    if len(removed) == 0:
+        return text, sorted(kept), []
+
+    removedSet = set(removed)
+    pruned = []
+    position = 0
+    for command in commands:
+        name = command.name.lower()
+        if name == "pd_add_external" and len(command.args) > 0:
+            remove = ExternalTarget(command) in removedSet
+        else:
+            remove = name in TARGET_COMMANDS and len(command.args) > 0 and command.args[0] in removedSet
+        if remove:
+            # the whole line, when the command is alone in it
+            start = command.start
+            lineStart = text.rfind("\n", 0, start) + 1
+            lineEnd = text.find("\n", command.end)
+            lineEnd = len(text) if lineEnd == -1 else lineEnd + 1
+            if text[lineStart:start].strip() == "" and text[command.end : lineEnd].strip() == "":
+                start, end = lineStart, lineEnd
+            else:
+                end = command.end
+            pruned.append(text[position:start])
+            position = end
+    pruned.append(text[position:])
+    return "".join(pruned), sorted(kept), removed
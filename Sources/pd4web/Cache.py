@@ -0,0 +1,74 @@
+import os
+import json
+import threading
+
+from .Pd4Web import Pd4Web
+from .Helpers import TmpPath
+
+
+class SymbolCache:
+    """
+    Library indexes shared by all projects of the machine, saved in APPDATA/Cache/Libraries.
+    Each entry is keyed by the library name and the commit resolved for it, so pinning a
+    new Version in Libraries.yaml creates a new entry instead of reusing the old one.
+    """
+
+    FORMAT = 1
+    # entries already read in this process, by CACHE_ROOT, kept warm by `pd4web --serve`
+    LOADED: dict = {}
+    LOCK = threading.Lock()
+
+    def __init__(self, Pd4Web: Pd4Web):
+        self.Pd4Web = Pd4Web
+        self.CACHE_ROOT = os.path.join(Pd4Web.APPDATA, "Cache", "Libraries")
+        self.entries = SymbolCache.LOADED.setdefault(self.CACHE_ROOT, {})
+
+    def __repr__(self) -> str:
+        return f"<SYMBOL_CACHE | Entries: {len(self.entries)}>"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+    def entryFile(self, libName: str, libVersion: str) -> str:
+        return os.path.join(self.CACHE_ROOT, libName, f"{libVersion}.json")
+
+    def loadEntry(self, libName: str, libVersion: str) -> dict:
+        key = (libName, libVersion)
+        if key in self.entries:
+            return self.entries[key]
+
+        entry = {}
+        entryFile = self.entryFile(libName, libVersion)
+        if os.path.exists(entryFile):
+            try:
+                with open(entryFile, "r") as file:
+                    entry = json.load(file)
+            except (OSError, ValueError):
+                entry = {}
+            if entry.get("format") != self.FORMAT:
+                entry = {}
+        self.entries[key] = entry
+        return entry
+
+    def Get(self, libName: str, libVersion: str, section: str):
+        """
+        Return the cached `section` of the library index, or None if it was never saved.
+        """
+        if not libVersion:
+            return None
+        return self.loadEntry(libName, libVersion).get(section)
+
+    def Set(self, libName: str, libVersion: str, section: str, data):
+        if not libVersion:
+            return
+        with SymbolCache.LOCK:
+            entry = self.loadEntry(libName, libVersion)
+            entry["format"] = self.FORMAT
+            entry[section] = data
+
+            entryFile = self.entryFile(libName, libVersion)
+            os.makedirs(os.path.dirname(entryFile), exist_ok=True)
+            tmpFile = TmpPath(entryFile)
+            with open(tmpFile, "w") as file:
+                json.dump(entry, file)
+            os.replace(tmpFile, entryFile)
@@ -1,13 +1,12 @@
 import os
 import sys
+import json
+import shutil
 import platform
 import cmake
 import ninja
-import subprocess
 import tarfile
 
-import pygit2
-
 from .Pd4Web import Pd4Web
 
 
@@ -15,38 +14,26 @@ class ExternalsCompiler:
     def __init__(self, Pd4Web: Pd4Web):
         self.Pd4Web = Pd4Web
         self.InitVariables()
-        if not os.path.exists(Pd4Web.APPDATA + "/emsdk"):
+        with self.Pd4Web.Tracer.Span("ExternalsCompiler"):
+            if not os.path.exists(Pd4Web.APPDATA + "/emsdk"):
 
-            self.Pd4Web.print(
-                "Cloning emsdk", color="yellow", silence=self.Pd4Web.SILENCE, pd4web=self.Pd4Web.PD_EXTERNAL
-            )
-            emsdk_path = Pd4Web.APPDATA + "/emsdk"
-            emsdk_git = "https://github.com/emscripten-core/emsdk"
-            ok = pygit2.clone_repository(emsdk_git, emsdk_path)
-            if not ok:
-                self.Pd4Web.exception("Failed to clone emsdk")
-            libRepo: pygit2.Repository = pygit2.Repository(emsdk_path)
-            tag_name = Pd4Web.EMSDK_VERSION
-
-            # commit
-            tag_ref = libRepo.references.get(f"refs/tags/{tag_name}")
-            if isinstance(tag_ref.peel(), pygit2.Tag):
-                commit = tag_ref.peel().target
-            else:
-                commit = tag_ref.peel()
-            libRepo.set_head(commit.id)
-            libRepo.checkout_tree(commit)
-            libRepo.reset(commit.id, pygit2.GIT_RESET_HARD)
-            self.Pd4Web.print(
-                f"Checking out emsdk to {tag_name}",
-                color="yellow",
-                silence=self.Pd4Web.SILENCE,
-                pd4web=self.Pd4Web.PD_EXTERNAL,
-            )
+                self.Pd4Web.print(
+                    "Cloning emsdk", color="yellow", silence=self.Pd4Web.SILENCE, pd4web=self.Pd4Web.PD_EXTERNAL
+                )
+                emsdk_path = Pd4Web.APPDATA + "/emsdk"
+                emsdk_git = "https://github.com/emscripten-core/emsdk"
+                tag_name = Pd4Web.EMSDK_VERSION
+                self.Pd4Web.Fetcher.Fetch("emsdk", emsdk_git, emsdk_path, tag_name)
+                self.Pd4Web.print(
+                    f"Checking out emsdk to {tag_name}",
+                    color="yellow",
+                    silence=self.Pd4Web.SILENCE,
+                    pd4web=self.Pd4Web.PD_EXTERNAL,
+                )
 
-        # check if Cmake
-        if not os.path.exists(self.EMCMAKE):
-            self.InstallEMCC()
+            # check if Cmake
+            if not os.path.exists(self.EMCMAKE):
+                self.InstallEMCC()
 
     def InitVariables(self):
         self.EMSDK = self.Pd4Web.APPDATA + "/emsdk/emsdk"
@@ -60,11 +47,13 @@ class ExternalsCompiler:
         self.NINJA = ninja.BIN_DIR + "/ninja"
         self.CONFIGURE = self.Pd4Web.APPDATA + "/emsdk/upstream/emscripten/emconfigure"
         self.MAKE = self.Pd4Web.APPDATA + "/emsdk/upstream/emscripten/emmake"
+        self.FILE_PACKAGER = self.Pd4Web.APPDATA + "/emsdk/upstream/emscripten/tools/file_packager.py"
         if platform.system() == "Windows":
             self.NINJA += ".exe"
             self.EMCC += ".bat"
             self.CONFIGURE += ".bat"
             self.MAKE += ".bat"
+        self.GetCompilerCache()
 
     def GetCmake(self):
         cmake_dir = cmake.CMAKE_BIN_DIR
@@ -85,7 +74,7 @@ class ExternalsCompiler:
                 silence=self.Pd4Web.SILENCE,
                 pd4web=self.Pd4Web.PD_EXTERNAL,
             )
-            result = subprocess.run(command, shell=True, env=self.Pd4Web.env).returncode
+            result = self.Pd4Web.Tracer.Run(command, shell=True, env=self.Pd4Web.env).returncode
             if result != 0:
                 self.Pd4Web.print(
                     "Failed to install emsdk", color="red", silence=self.Pd4Web.SILENCE, pd4web=self.Pd4Web.PD_EXTERNAL
@@ -99,7 +88,7 @@ class ExternalsCompiler:
                 silence=self.Pd4Web.SILENCE,
                 pd4web=self.Pd4Web.PD_EXTERNAL,
             )
-            result = subprocess.run(command, shell=True, env=self.Pd4Web.env).returncode
+            result = self.Pd4Web.Tracer.Run(command, shell=True, env=self.Pd4Web.env).returncode
             if result != 0:
                 self.Pd4Web.print(
                     "Failed to activate emsdk", color="red", silence=self.Pd4Web.SILENCE, pd4web=self.Pd4Web.PD_EXTERNAL
@@ -111,7 +100,7 @@ class ExternalsCompiler:
             self.Pd4Web.print(
                 "Installing emsdk", color="yellow", silence=self.Pd4Web.SILENCE, pd4web=self.Pd4Web.PD_EXTERNAL
             )
-            result = subprocess.run(
+            result = self.Pd4Web.Tracer.Run(
                 ["chmod", "+x", self.EMSDK], env=self.Pd4Web.env, capture_output=not self.Pd4Web.verbose, text=True
             )
 
@@ -132,7 +121,7 @@ class ExternalsCompiler:
                 pd4web=self.Pd4Web.PD_EXTERNAL,
             )
             # ──────────────────────────────────────
-            result = subprocess.run(
+            result = self.Pd4Web.Tracer.Run(
                 [self.EMSDK, "install", "latest"],
                 capture_output=not self.Pd4Web.verbose,
                 env=self.Pd4Web.env,
@@ -148,7 +137,7 @@ class ExternalsCompiler:
                 )
 
             # ──────────────────────────────────────
-            result = subprocess.run(
+            result = self.Pd4Web.Tracer.Run(
                 [self.EMSDK, "activate", self.Pd4Web.EMSDK_VERSION],
                 env=self.Pd4Web.env,
                 capture_output=not self.Pd4Web.verbose,
@@ -159,6 +148,76 @@ class ExternalsCompiler:
                     f"Failed to install emsdk, result {result.returncode}, cmd: " + " ".join(result.args)
                 )
 
+    def GetCompilerCache(self):
+        """
+        Find the compiler cache (ccache or sccache) used as compiler launcher by the generated CMakeLists.
+        The cache is stored in APPDATA/Cache, so all projects share the objects of Pd and the libraries.
+        """
+        self.COMPILER_CACHE = ""
+        self.COMPILER_CACHE_NAME = ""
+        choice = self.Pd4Web.COMPILER_CACHE
+        if choice == "none":
+            return
+        candidates = ["ccache", "sccache"] if choice == "auto" else [choice]
+        for candidate in candidates:
+            path = shutil.which(candidate)
+            if path is not None:
+                self.COMPILER_CACHE = path
+                self.COMPILER_CACHE_NAME = candidate
+                break
+        if self.COMPILER_CACHE == "":
+            if choice != "auto":
+                self.Pd4Web.exception(f"{choice} was asked as compiler cache but it is not installed")
+            return
+
+        cacheDir = os.path.join(self.Pd4Web.APPDATA, "Cache", self.COMPILER_CACHE_NAME)
+        if self.COMPILER_CACHE_NAME == "ccache":
+            self.Pd4Web.env["CCACHE_DIR"] = cacheDir
+            # emcc is a script, the emsdk version is what identifies the compiler
+            self.Pd4Web.env["CCACHE_COMPILERCHECK"] = f"string:emsdk-{self.Pd4Web.EMSDK_VERSION}"
+            # paths inside the project are hashed as relative paths, so projects share the entries
+            self.Pd4Web.env["CCACHE_BASEDIR"] = self.Pd4Web.PROJECT_ROOT
+            if not self.Pd4Web.DEBUG:
+                self.Pd4Web.env["CCACHE_NOHASHDIR"] = "1"
+        else:
+            # sccache doesn't know the emsdk version either, each version has its own cache
+            self.Pd4Web.env["SCCACHE_DIR"] = os.path.join(cacheDir, self.Pd4Web.EMSDK_VERSION)
+            self.Pd4Web.env["SCCACHE_C_CUSTOM_CACHE_BUSTER"] = f"emsdk-{self.Pd4Web.EMSDK_VERSION}"
+
+    def CompilerCacheStats(self):
+        """
+        Return the total of (hits, misses) of the compiler cache, or None if they are not available.
+        """
+        if self.COMPILER_CACHE == "":
+            return None
+        if self.COMPILER_CACHE_NAME == "ccache":
+            command = [self.COMPILER_CACHE, "--print-stats"]
+        else:
+            command = [self.COMPILER_CACHE, "--show-stats", "--stats-format=json"]
+        try:
+            result = self.Pd4Web.Tracer.Run(command, env=self.Pd4Web.env, capture_output=True, text=True)
+        except OSError:
+            return None
+        if result.returncode != 0:
+            return None
+
+        if self.COMPILER_CACHE_NAME == "ccache":
+            counters = {}
+            for line in result.stdout.splitlines():
+                fields = line.split("\t")
+                if len(fields) == 2 and fields[1].isdigit():
+                    counters[fields[0]] = int(fields[1])
+            hits = counters.get("direct_cache_hit", 0) + counters.get("preprocessed_cache_hit", 0)
+            return hits, counters.get("cache_miss", 0)
+
+        try:
+            stats = json.loads(result.stdout)["stats"]
+        except (ValueError, KeyError):
+            return None
+        hits = sum(stats.get("cache_hits", {}).get("counts", {}).values())
+        misses = sum(stats.get("cache_misses", {}).get("counts", {}).values())
+        return hits, misses
+
     def __str__(self):
         return "< Compiler >"
 
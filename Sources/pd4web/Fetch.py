@@ -0,0 +1,292 @@
+import os
+import re
+import shutil
+import time
+import threading
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+import pygit2
+
+from .Pd4Web import Pd4Web
+from .Helpers import TmpPath
+
+
+class GitFetcher:
+    """
+    Fetch the git repositories used by pd4web (Pd, emsdk and the libraries).
+
+    Only the pinned version is fetched, with depth 1, when it is a tag, a branch or a
+    full commit id. Short commit ids (like timbreIDLib `ef2e24a`) can't be asked to the
+    server, so for them, and for servers that refuse shallow fetches, all the history is
+    fetched. Every fetch is recorded in `Report` with the bytes received and the time spent.
+
+    With a mirror (`--mirror` or PD4WEB_MIRROR, Pd4Web.MIRROR), each repository is first fetched from
+    the mirror roots, in the order they are given, and then from its upstream url (not with
+    `--mirror-only`). A mirror root has the layout of `git clone --mirror`: the upstream
+    https://github.com/pure-data/pure-data is looked for in <root>/github.com/pure-data/pure-data.git
+    or <root>/github.com/pure-data/pure-data. The attempts, failures and time of each source are kept
+    in `SourceStats`.
+    """
+
+    FULL_REFSPECS = [
+        "+refs/heads/*:refs/remotes/origin/*",
+        "+refs/tags/*:refs/tags/*",
+        "+HEAD:refs/remotes/origin/HEAD",
+    ]
+
+    def __init__(self, Pd4Web: Pd4Web):
+        self.Pd4Web = Pd4Web
+        self.Report = []
+        self.SourceStats = {}
+        self.lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"<GIT_FETCHER | Fetches: {len(self.Report)}>"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+    def MirrorRoots(self) -> list:
+        return [root.strip() for root in self.Pd4Web.MIRROR.split(",") if root.strip() != ""]
+
+    def mirrorUrl(self, root: str, url: str):
+        """
+        Url of the mirror of `url` in `root`, None when `root` is local and doesn't have it.
+        """
+        upstream = urlparse(url)
+        if upstream.netloc == "":
+            return None
+        path = upstream.path.strip("/")
+        if path.endswith(".git"):
+            path = path[:-4]
+        candidates = [f"{upstream.netloc}/{path}.git", f"{upstream.netloc}/{path}"]
+
+        mirror = urlparse(root)
+        if mirror.scheme not in ["", "file"] and len(mirror.scheme) > 1:
+            return f"{root.rstrip('/')}/{candidates[0]}"
+        local = url2pathname(mirror.path) if mirror.scheme == "file" else root
+        for candidate in candidates:
+            mirrorPath = os.path.join(os.path.abspath(os.path.expanduser(local)), *candidate.split("/"))
+            if os.path.isdir(mirrorPath):
+                return mirrorPath
+        return None
+
+    def Sources(self, url: str) -> list:
+        """
+        [(source, url)] to fetch `url` from, in the order they are tried.
+        """
+        roots = self.MirrorRoots()
+        if self.Pd4Web.MIRROR_ONLY and len(roots) == 0:
+            self.Pd4Web.exception("--mirror-only needs the mirror roots of --mirror or $PD4WEB_MIRROR")
+        sources = []
+        for root in roots:
+            mirrorUrl = self.mirrorUrl(root, url)
+            if mirrorUrl is not None:
+                sources.append((root, mirrorUrl))
+        if not self.Pd4Web.MIRROR_ONLY:
+            sources.append((urlparse(url).netloc or url, url))
+        return sources
+
+    def addSourceStats(self, source: str, ok: bool, received: int, start: float):
+        with self.lock:
+            stats = self.SourceStats.setdefault(source, {"Fetches": 0, "Failures": 0, "Bytes": 0, "Time": 0.0})
+            stats["Fetches"] += 1
+            stats["Failures"] += 0 if ok else 1
+            stats["Bytes"] += received
+            stats["Time"] += time.perf_counter() - start
+
+    def isCommitId(self, version) -> bool:
+        return version is not None and re.fullmatch(r"[0-9a-fA-F]{40}", version) is not None
+
+    def isShortCommitId(self, version) -> bool:
+        return version is not None and re.fullmatch(r"[0-9a-fA-F]{4,39}", version) is not None
+
+    def shallowRefspecs(self, version) -> list:
+        """
+        Candidate refspecs to fetch only `version`, in the order they are tried.
+        """
+        if version is None:
+            return [["+HEAD:refs/remotes/origin/HEAD"]]
+        if self.isCommitId(version):
+            return [[f"+{version}:refs/pd4web/pinned"]]
+        if self.isShortCommitId(version):
+            return []
+        return [[f"+refs/tags/{version}:refs/tags/{version}"], [f"+refs/heads/{version}:refs/remotes/origin/{version}"]]
+
+    def ResolveVersion(self, repo: pygit2.Repository, version):
+        """
+        Return the commit of `version` (tag, branch or commit id) in `repo`, or None if it is not there.
+        """
+        if version is None:
+            candidates = ["refs/remotes/origin/HEAD", "HEAD"]
+        else:
+            candidates = [f"refs/tags/{version}", f"refs/remotes/origin/{version}"]
+            if self.isCommitId(version):
+                candidates.append("refs/pd4web/pinned")
+            candidates.append(version)
+        for candidate in candidates:
+            try:
+                return repo.revparse_single(candidate).peel(pygit2.Commit)
+            except (KeyError, ValueError, pygit2.GitError, pygit2.InvalidSpecError):
+                continue
+        return None
+
+    def fetchVersion(self, repo: pygit2.Repository, url: str, version):
+        """
+        Fetch `version` into `repo`, shallow when possible. Returns the mode used and the bytes received.
+        """
+        if "origin" in [remote.name for remote in repo.remotes]:
+            if repo.remotes["origin"].url != url:
+                repo.remotes.set_url("origin", url)
+            remote = repo.remotes["origin"]
+        else:
+            remote = repo.remotes.create("origin", url)
+
+        received = 0
+        for refspecs in self.shallowRefspecs(version):
+            try:
+                stats = remote.fetch(refspecs, depth=1)
+            except pygit2.GitError:
+                continue
+            received += stats.received_bytes
+            if self.ResolveVersion(repo, version) is not None:
+                return "shallow", received
+
+        if repo.is_shallow:
+            # the history must be complete to find a short commit id
+            stats = remote.fetch(self.FULL_REFSPECS, depth=2147483647)
+        else:
+            stats = remote.fetch(self.FULL_REFSPECS)
+        received += stats.received_bytes
+        return "full", received
+
+    def checkout(self, repo: pygit2.Repository, commit: pygit2.Commit):
+        repo.set_head(commit.id)
+        repo.checkout_tree(commit, strategy=pygit2.GIT_CHECKOUT_FORCE)
+        repo.reset(commit.id, pygit2.GIT_RESET_HARD)
+
+    def fetchFromSources(self, name: str, repo: pygit2.Repository, url: str, version):
+        """
+        Fetch `version` into `repo` from the first source of `url` that has it. Returns its commit, the
+        source, the mode used and the bytes received.
+        """
+        sources = self.Sources(url)
+        if len(sources) == 0:
+            self.Pd4Web.exception(f"No mirror of {name} ({url}) in {self.Pd4Web.MIRROR}")
+        errors = []
+        for source, sourceUrl in sources:
+            start = time.perf_counter()
+            try:
+                mode, received = self.fetchVersion(repo, sourceUrl, version)
+            except pygit2.GitError as e:
+                self.addSourceStats(source, False, 0, start)
+                errors.append(f"Failed to fetch {name} from {sourceUrl}: {str(e)}")
+                continue
+            commit = self.ResolveVersion(repo, version)
+            self.addSourceStats(source, commit is not None, received, start)
+            if commit is not None:
+                return commit, source, mode, received
+            errors.append(f"Version {version} of {name} not found in {sourceUrl}")
+        self.Pd4Web.exception("\n".join(errors))
+
+    def addReport(self, name: str, source: str, mode: str, received: int, start: float):
+        with self.lock:
+            self.Report.append(
+                {"Name": name, "Source": source, "Mode": mode, "Bytes": received, "Time": time.perf_counter() - start}
+            )
+
+    def Fetch(self, name: str, url: str, path: str, version=None) -> pygit2.Commit:
+        """
+        Create the repository `path` with `version` of `url` checked out and return its commit. The repository
+        is created next to `path` and moved there once checked out, a failed fetch leaves nothing behind.
+        """
+        start = time.perf_counter()
+        tmpPath = TmpPath(path)
+        with self.Pd4Web.Tracer.Span(f"fetch {name}", "fetch", url=url, version=version, cache="miss") as span:
+            try:
+                repo = pygit2.init_repository(tmpPath)
+                commit, source, mode, received = self.fetchFromSources(name, repo, url, version)
+                span.update(source=source, mode=mode, bytesReceived=received)
+                self.checkout(repo, commit)
+                repo.free()
+                os.replace(tmpPath, path)
+            except BaseException:
+                shutil.rmtree(tmpPath, ignore_errors=True)
+                raise
+            self.addReport(name, source, mode, received, start)
+        return commit
+
+    def Update(self, name: str, url: str, path: str, version=None) -> pygit2.Commit:
+        """
+        Checkout `version` in the existing repository `path`, fetching it only when it is not there yet.
+        """
+        with self.Pd4Web.Tracer.Span(f"update {name}", "fetch", url=url, version=version, cache="hit") as span:
+            repo = pygit2.Repository(path)
+            if version is None and not repo.head_is_unborn:
+                return repo.head.peel(pygit2.Commit)
+
+            commit = self.ResolveVersion(repo, version)
+            if commit is None:
+                start = time.perf_counter()
+                commit, source, mode, received = self.fetchFromSources(name, repo, url, version)
+                span.update(cache="miss", source=source, mode=mode, bytesReceived=received)
+                self.addReport(name, source, mode, received, start)
+
+            if repo.head_is_unborn or repo.head.peel(pygit2.Commit).id != commit.id:
+                span["checkout"] = True
+                self.checkout(repo, commit)
+        return commit
+
+    def UpdateSubmodules(self, path: str):
+        repo = pygit2.Repository(path)
+        if len(repo.listall_submodules()) == 0:
+            return
+        with self.Pd4Web.Tracer.Span(f"submodules {os.path.basename(path)}", "fetch"):
+            if len(self.MirrorRoots()) > 0:
+                self.mirrorSubmodules(repo)
+            try:
+                repo.submodules.update(init=True, depth=1)
+            except pygit2.GitError:
+                repo.submodules.update(init=True)
+
+    def mirrorSubmodules(self, repo: pygit2.Repository):
+        """
+        Point the submodules of `repo` to their first mirror, they keep their upstream url when there is none.
+        """
+        repo.submodules.init()
+        for name in repo.listall_submodules():
+            submodule = repo.submodules[name]
+            sources = self.Sources(submodule.url)
+            if len(sources) == 0:
+                self.Pd4Web.exception(f"No mirror of the submodule {name} ({submodule.url}) in {self.Pd4Web.MIRROR}")
+            if sources[0][1] != submodule.url:
+                repo.config[f"submodule.{submodule.name}.url"] = sources[0][1]
+
+    def PrintReport(self):
+        """
+        Print the bytes received and the time spent by each fetch of this run, and by each source.
+        """
+        if len(self.Report) == 0:
+            return
+        for fetch in sorted(self.Report, key=lambda fetch: fetch["Name"]):
+            size = fetch["Bytes"] / (1024 * 1024)
+            name = fetch["Name"] + " " * max(1, 16 - len(fetch["Name"]))
+            self.Pd4Web.print(
+                f"Fetched {name} {size:8.2f} MB in {fetch['Time']:6.2f}s ({fetch['Mode']}, {fetch['Source']})",
+                color="blue",
+                silence=self.Pd4Web.SILENCE,
+                pd4web=self.Pd4Web.PD_EXTERNAL,
+            )
+        if len(self.MirrorRoots()) == 0:
+            return
+        for source, stats in self.SourceStats.items():
+            size = stats["Bytes"] / (1024 * 1024)
+            average = stats["Time"] / stats["Fetches"] * 1000
+            self.Pd4Web.print(
+                f"Source {source}: {stats['Fetches']} fetches, {stats['Failures']} failed, "
+                + f"{size:.2f} MB in {stats['Time']:.2f}s ({average:.0f} ms per fetch)",
+                color="blue",
+                silence=self.Pd4Web.SILENCE,
+                pd4web=self.Pd4Web.PD_EXTERNAL,
+            )
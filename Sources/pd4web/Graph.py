@@ -0,0 +1,167 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .Pd4Web import Pd4Web
+from .Lexer import ObjectRecords
+
+
+class PatchGraph:
+    """
+    Graph of the main patch and its abstractions.
+
+    Discover() follows the local abstractions of the patch tree before it is processed, reading and
+    tokenizing them with a pool of threads. Only the reading and the lexing run in parallel: objects are
+    still resolved one patch at a time in the order of the patch (a [declare] changes how the next
+    objects are found), so the results are the same of a sequential run.
+
+    The tokenized records of the small abstractions (up to CACHE_SIZE bytes) are kept until Patch takes
+    them with PatchRecords(), so they are read and lexed once. The main patch and the bigger abstractions
+    are streamed again from the file, they are never kept in memory. The edges found while the patches
+    are processed can be saved as a Graphviz file with `--patch-graph`.
+    """
+
+    CACHE_SIZE = 64 * 1024
+
+    def __init__(self, Pd4Web: Pd4Web):
+        self.Pd4Web = Pd4Web
+        self.PROJECT_ROOT = Pd4Web.PROJECT_ROOT
+        self.discovered = {}
+        self.parsed = {}
+        self.edges = {}
+        self.stack = []
+
+    def __repr__(self) -> str:
+        return f"<PATCH_GRAPH | Patches: {len(self.discovered)} | Edges: {sum(len(e) for e in self.edges.values())}>"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+    def scanPatch(self, path: str, isMain: bool = False):
+        """
+        Local abstractions used by `path` and its tokenized records, the records are None for the main patch
+        and for the patches bigger than CACHE_SIZE.
+        """
+        with self.Pd4Web.Tracer.Span(f"scan {os.path.basename(path)}", "abstraction", file=path) as span:
+            with open(path, "r") as file:
+                size = os.fstat(file.fileno()).st_size
+                span["bytesRead"] = size
+                if isMain or size > self.CACHE_SIZE:
+                    return self.localAbstractions(path, ObjectRecords(file)), None
+                records = list(ObjectRecords(file))
+            return self.localAbstractions(path, records), records
+
+    def PatchRecords(self, path: str):
+        """
+        Tokenized records of `path`, the ones kept by Discover() are given once. The other patches are read
+        line by line.
+        """
+        records = self.parsed.pop(os.path.abspath(path), None)
+        if records is not None:
+            return iter(records)
+        return self.readRecords(path)
+
+    def readRecords(self, path: str):
+        with open(path, "r") as file:
+            yield from ObjectRecords(file)
+
+    def localAbstractions(self, path: str, records) -> list:
+        """
+        Local abstractions that `path` can use: [name], [folder/name], [clone name] and the abstractions
+        of its [declare -path] folders.
+        """
+        declaredFolders = []
+        # each name once, in the order they are used
+        names = {}
+        for _, tokens in records:
+            if tokens is None or len(tokens) < 4 or tokens[0] != "#X":
+                continue
+            if tokens[1] == "declare" or (tokens[1] == "obj" and len(tokens) > 4 and tokens[4] == "declare"):
+                args = tokens[2:] if tokens[1] == "declare" else tokens[5:]
+                for i in range(len(args) - 1):
+                    if args[i] == "-path":
+                        declaredFolders.append(args[i + 1])
+            elif tokens[1] == "obj" and len(tokens) > 4:
+                if tokens[4] == "clone":
+                    clone = [token for token in tokens[5:] if not token.startswith("-")]
+                    if len(clone) > 0:
+                        names[clone[0]] = None
+                else:
+                    names[tokens[4]] = None
+
+        children = []
+        for name in names:
+            for folder in [""] + declaredFolders:
+                child = os.path.join(self.PROJECT_ROOT, folder, name + ".pd")
+                if os.path.isfile(child):
+                    children.append(os.path.abspath(child))
+                    break
+        return list(dict.fromkeys(children))
+
+    def Discover(self, mainPatch: str):
+        """
+        Scan the patch tree with a pool of threads, level by level.
+        """
+        mainPatch = os.path.abspath(mainPatch)
+        seen = {mainPatch}
+        self.parsed = {}
+        with ThreadPoolExecutor() as pool:
+            pending = {pool.submit(self.scanPatch, mainPatch, True): mainPatch}
+            while len(pending) > 0:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = pending.pop(future)
+                    try:
+                        children, records = future.result()
+                    except OSError:
+                        continue
+                    if records is not None:
+                        self.parsed[path] = records
+                    self.discovered[path] = children
+                    for child in children:
+                        if child not in seen:
+                            seen.add(child)
+                            pending[pool.submit(self.scanPatch, child)] = child
+
+    def Enter(self, path: str, isAbstraction: bool):
+        """
+        Called by Patch before processing `path`, records the edge from the patch that uses it.
+        """
+        path = os.path.abspath(path)
+        if isAbstraction:
+            self.AddEdge(path)
+        self.edges.setdefault(path, [])
+        self.stack.append(path)
+
+    def AddEdge(self, path: str):
+        """
+        Edge from the patch being processed to the abstraction `path`.
+        """
+        if len(self.stack) == 0:
+            return
+        children = self.edges.setdefault(self.stack[-1], [])
+        if os.path.abspath(path) not in children:
+            children.append(os.path.abspath(path))
+
+    def Leave(self):
+        self.stack.pop()
+
+    def Dump(self, dotFile: str):
+        """
+        Save the graph of the processed patches as a Graphviz file.
+        """
+        def label(path):
+            relPath = os.path.relpath(path, self.PROJECT_ROOT)
+            return relPath if not relPath.startswith("..") else os.path.basename(path)
+
+        os.makedirs(os.path.dirname(dotFile), exist_ok=True)
+        with open(dotFile, "w") as file:
+            file.write("digraph patches {\n")
+            file.write("    rankdir=LR;\n")
+            for path, children in self.edges.items():
+                file.write(f'    "{label(path)}";\n')
+                for child in children:
+                    file.write(f'    "{label(path)}" -> "{label(child)}";\n')
+            file.write("}\n")
+        self.Pd4Web.print(
+            f"Patch graph saved in {dotFile}", color="blue", silence=self.Pd4Web.SILENCE, pd4web=self.Pd4Web.PD_EXTERNAL
+        )
@@ -0,0 +1,72 @@
+import os
+import shutil
+import threading
+import filecmp
+import hashlib
+
+
+def TmpPath(path: str) -> str:
+    """
+    Temporary file next to `path`, unique per process and thread, to be moved over `path` with os.replace.
+    """
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def WriteIfChanged(path: str, content: str) -> bool:
+    """
+    Write `content` to `path` only when it is different, so the timestamp (and the build) is kept.
+    Returns True if the file was written.
+    """
+    if os.path.isfile(path):
+        try:
+            with open(path, "r") as file:
+                if file.read() == content:
+                    return False
+        except UnicodeDecodeError:
+            pass
+    tmpFile = TmpPath(path)
+    with open(tmpFile, "w") as file:
+        file.write(content)
+    os.replace(tmpFile, path)
+    return True
+
+
+def WriteLinesIfChanged(path: str, lines) -> bool:
+    """
+    Same as WriteIfChanged, but the `lines` are written while they are generated, so the content is never
+    kept in memory. The file is only replaced when it changed.
+    """
+    tmpFile = TmpPath(path)
+    try:
+        with open(tmpFile, "w") as file:
+            for line in lines:
+                file.write(line)
+    except BaseException:
+        if os.path.exists(tmpFile):
+            os.remove(tmpFile)
+        raise
+    if os.path.isfile(path) and filecmp.cmp(tmpFile, path, shallow=False):
+        os.remove(tmpFile)
+        return False
+    os.replace(tmpFile, path)
+    return True
+
+
+def CopyIfChanged(src: str, dst: str) -> bool:
+    """
+    Same as shutil.copy, but the destination is not touched when it already has the same content.
+    """
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+    if os.path.isfile(dst) and filecmp.cmp(src, dst, shallow=False):
+        return False
+    shutil.copy(src, dst)
+    return True
+
+
+def FileHash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
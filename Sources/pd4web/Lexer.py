@@ -0,0 +1,73 @@
+import re
+
+# an atom is a run of escaped or normal characters, `;` and `,` are atoms by themselves
+ATOM = re.compile(r"(?:\\.|[^\s;,\\])+|[;,]", re.S)
+
+
+def Records(lines):
+    """
+    Group the lines of a Pd file into records, each record ends with an unescaped `;` (and the newline
+    after it). Long records are saved by Pd in more than one line, `\\;` and `\\,` are part of the atoms.
+    Yields the original text of each record, so "".join(Records(lines)) is the file again.
+    """
+    pending = []
+    for line in lines:
+        # most lines are one record, ending with the only `;` of the line (not escaped)
+        if len(pending) == 0 and line.endswith(";\n") and line.count(";") == 1 and line[-3:-2] != "\\":
+            yield line
+            continue
+
+        # a `;` ends the record when the backslashes before it (if any) escape each other
+        start = 0
+        position = 0
+        for piece in line.split(";")[:-1]:
+            position += len(piece) + 1
+            if (len(piece) - len(piece.rstrip("\\"))) % 2 == 0:
+                end = position
+                if line.startswith("\r\n", end):
+                    end += 2
+                elif line.startswith("\n", end):
+                    end += 1
+                pending.append(line[start:end])
+                yield "".join(pending)
+                pending = []
+                start = end
+        if start < len(line):
+            pending.append(line[start:])
+
+    # record without `;` at the end of the file
+    if len(pending) > 0:
+        yield "".join(pending)
+
+
+def Atoms(record: str) -> list:
+    """
+    Atoms of one record, without the final `;`. Commas are kept as "," atoms and the escapes (`\\;`,
+    `\\,`, `\\$0`) are kept as they are in the file.
+    """
+    if "\\" not in record:
+        return record.replace(",", " , ").replace(";", " ").split()
+    return [atom for atom in ATOM.findall(record) if atom != ";"]
+
+
+def Tokens(record: str) -> list:
+    """
+    Atoms of the record without the commas, `#X obj 10 10 knob 50, f 8;` is
+    ["#X", "obj", "10", "10", "knob", "50", "f", "8"].
+    """
+    if "\\" not in record:
+        return record.replace(",", " ").replace(";", " ").split()
+    return [atom for atom in ATOM.findall(record) if atom != ";" and atom != ","]
+
+
+def ObjectRecords(lines):
+    """
+    Records of the lines with the tokens of the objects and [declare] records, (record, tokens). The
+    other records are not tokenized, their tokens are None.
+    """
+    for record in Records(lines):
+        fields = record.split(None, 2)
+        if len(fields) < 2 or fields[1].rstrip(";,") not in ("obj", "declare"):
+            yield record, None
+        else:
+            yield record, Tokens(record)
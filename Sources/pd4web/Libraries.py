@@ -1,12 +1,11 @@
 import os
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
 import yaml
-import pygit2
-import shutil
 
 from .Pd4Web import Pd4Web
+from .Lexer import Records, Tokens
 
 # ╭──────────────────────────────────────╮
 # │    In this file we have all code     │
@@ -15,10 +14,27 @@ from .Pd4Web import Pd4Web
 # ╰──────────────────────────────────────╯
 
 
+class LibrariesLoader(getattr(yaml, "CFullLoader", yaml.FullLoader)):
+    """
+    Loader of Libraries.yaml that keeps `Version` as it is written, yaml 1.1 reads a short commit id with
+    only digits as a number (0123456 is the octal 42798).
+    """
+
+    def construct_mapping(self, node, deep=False):
+        for key, value in node.value:
+            if key.value == "Version" and isinstance(value, yaml.ScalarNode) and value.tag != "tag:yaml.org,2002:null":
+                value.tag = "tag:yaml.org,2002:str"
+        return super().construct_mapping(node, deep)
+
+
 class ExternalLibraries:
+    # Libraries.yaml already parsed in this process, {path: (mtime, data)}, kept warm by `pd4web --serve`
+    LOADED: dict = {}
+
     def __init__(self, Pd4Web: Pd4Web) -> None:
         self.Pd4Web = Pd4Web
         self.PROJECT_ROOT = Pd4Web.PROJECT_ROOT
+        self.fetchedLibraries = set()
         self.GetSupportedLibraries()
         return
 
@@ -29,6 +45,8 @@ class ExternalLibraries:
         self.LibraryNames = []
         self.DownloadSources = {}
         self.SupportedLibraries = {}
+        self.LibrariesData = {}
+        self.libraryClasses = {}
         self.LibraryScriptDir = ""
 
     def GetSupportedLibraries(self):
@@ -42,12 +60,21 @@ class ExternalLibraries:
             pass
 
         self.DynamicLibraries = []
-        with open(externalFile) as file:
-            supportedLibraries = yaml.load(file, Loader=yaml.FullLoader)
-            self.DownloadSources = supportedLibraries["Sources"]
-            self.SupportedLibraries = supportedLibraries["Libraries"]
-            self.LibraryNames = [lib["Name"] for lib in self.SupportedLibraries]
-            self.totalOfLibraries = len(supportedLibraries)
+        mtime = os.stat(externalFile).st_mtime_ns
+        loaded = ExternalLibraries.LOADED.get(externalFile)
+        if loaded is not None and loaded[0] == mtime:
+            supportedLibraries = loaded[1]
+        else:
+            with open(externalFile) as file:
+                supportedLibraries = yaml.load(file, Loader=LibrariesLoader)
+            ExternalLibraries.LOADED[externalFile] = (mtime, supportedLibraries)
+        self.DownloadSources = supportedLibraries["Sources"]
+        self.SupportedLibraries = supportedLibraries["Libraries"]
+        # {name: data of Libraries.yaml}, the LibraryClass of each library is created once by GetLibraryData
+        self.LibrariesData = {lib["Name"]: lib for lib in self.SupportedLibraries}
+        self.LibraryNames = list(self.LibrariesData)
+        self.libraryClasses = {}
+        self.totalOfLibraries = len(supportedLibraries)
 
     class LibraryClass:
         def __init__(self, LibraryData, DownloadSources) -> None:
@@ -84,7 +111,7 @@ class ExternalLibraries:
             else:
                 self.unsupported = []
 
-            if "Version" in LibraryData:
+            if "Version" in LibraryData and LibraryData["Version"] is not None:
                 self.version = LibraryData["Version"]
             else:
                 self.version = None
@@ -113,17 +140,18 @@ class ExternalLibraries:
                 return self.directLink
 
     def GetLibraryData(self, libName) -> LibraryClass:
-        lib = next((lib for lib in self.SupportedLibraries if lib["Name"] == libName), None)
-        lib = self.LibraryClass(lib, self.DownloadSources)
+        lib = self.libraryClasses.get(libName)
+        if lib is None:
+            lib = self.LibraryClass(self.LibrariesData.get(libName), self.DownloadSources)
+            self.libraryClasses[libName] = lib
         return lib
 
     def isSupportedLibrary(self, name):
-        if name in self.LibraryNames:
-            return True
-        else:
-            return False
+        return name in self.LibrariesData
 
     def CheckLibraryLink(self, url: str):
+        import requests
+
         try:
             response = requests.head(url, allow_redirects=True)
             if response.status_code == 200:
@@ -133,63 +161,121 @@ class ExternalLibraries:
         except:
             return False
 
-    def getLibCommitVersion(self, libRepo, tag_name) -> pygit2.Commit:
-        """ """
-        try:
-            tag_ref = libRepo.references.get(f"refs/tags/{tag_name}")
-            if isinstance(tag_ref.peel(), pygit2.Tag):
-                commit = tag_ref.peel().target
-            else:
-                commit = tag_ref.peel()
-        except:
-            commit = libRepo.head.peel()
-        return commit
+    def GetLibraryRemote(self, libData) -> str:
+        """
+        Upstream url of the library, from its download source in Libraries.yaml (the mirror is used by the Fetcher).
+        """
+        return libData.GetLinkForDownload()
 
-    def CloneLibrary(self, libData):
+    def FindPatchLibraries(self, patchFile: str) -> list:
         """
-        Initializes submodules in the specified repository path.
+        Scan the patch and its local abstractions for the supported libraries they use,
+        without resolving any object. Libraries are returned in the order they are found.
+        """
+        libraries = {}
+        localPaths = []
+        visited = set()
+        toScan = [os.path.abspath(patchFile)]
+        while len(toScan) > 0:
+            patch = toScan.pop(0)
+            if patch in visited or not os.path.isfile(patch):
+                continue
+            visited.add(patch)
+            with open(patch, "r", errors="ignore") as file:
+                for record in Records(file):
+                    if not record.startswith("#X"):
+                        continue
+                    tokens = Tokens(record)
+                    if len(tokens) > 2 and tokens[1] == "declare":
+                        self.findDeclaredLibraries(tokens[2:], libraries, localPaths)
+                    elif len(tokens) > 4 and tokens[1] == "obj":
+                        if tokens[4] == "declare":
+                            self.findDeclaredLibraries(tokens[5:], libraries, localPaths)
+                            continue
+                        names = [tokens[4]]
+                        if tokens[4] == "clone":
+                            names = [token for token in tokens[5:] if token != "" and token[0] != "-"]
+                        for name in names:
+                            if self.isSupportedLibrary(name.split("/")[0]):
+                                libraries[name.split("/")[0]] = True
+                            for folder in [os.path.dirname(patch), self.PROJECT_ROOT] + localPaths:
+                                absPath = os.path.join(folder, name + ".pd")
+                                if os.path.isfile(absPath):
+                                    toScan.append(os.path.abspath(absPath))
+                                    break
+        return list(libraries)
+
+    def findDeclaredLibraries(self, args: list, libraries: dict, localPaths: list):
+        for i in range(len(args) - 1):
+            if args[i] in ["-lib", "-path", "-stdlib", "-stdpath"]:
+                if self.isSupportedLibrary(args[i + 1]):
+                    libraries[args[i + 1]] = True
+                else:
+                    localPath = os.path.join(self.PROJECT_ROOT, args[i + 1])
+                    if os.path.isdir(localPath) and localPath not in localPaths:
+                        localPaths.append(localPath)
 
-        Args:
-            path (str): The path to the repository containing submodules.
+    def FetchLibraries(self, libNames: list):
         """
+        Clone, checkout and init the submodules of all libraries concurrently.
+        """
+        libNames = [lib for lib in libNames if self.isSupportedLibrary(lib) and lib not in self.fetchedLibraries]
+        if len(libNames) == 0:
+            return
+        if not os.path.exists(self.Pd4Web.APPDATA + "/Externals"):
+            os.makedirs(self.Pd4Web.APPDATA + "/Externals", exist_ok=True)
+
+        workers = max(1, min(len(libNames), self.Pd4Web.FETCH_JOBS))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(self.CloneLibrary, self.GetLibraryData(lib)) for lib in libNames]
+            # results in submission order, the first error is raised
+            for future in futures:
+                future.result()
+
+    def CloneLibrary(self, libData):
+        """
+        Clone the library to APPDATA (if needed), checkout the version of Libraries.yaml and init its submodules.
+        Each library is only checked once per run.
+        """
+        if libData.name in self.fetchedLibraries:
+            return
         libPath = self.Pd4Web.APPDATA + "/Externals/" + libData.name
+        libLink = self.GetLibraryRemote(libData)
         if os.path.exists(libPath):
-            libRepo: pygit2.Repository = pygit2.Repository(libPath)
-            curr_commit: pygit2.Commit = libRepo.head.peel()
-            lib_commit: pygit2.Commit = self.getLibCommitVersion(libRepo, libData.version)
-            if curr_commit.id == lib_commit.id:
-                self.Pd4Web.Version["externals"][libData.name] = str(lib_commit.id)
-                return  
-            libRepo.set_head(lib_commit.id)
-            libRepo.checkout_tree(lib_commit)
-            libRepo.reset(lib_commit.id, pygit2.GIT_RESET_HARD)
-            self.Pd4Web.Version["externals"][libData.name] = str(lib_commit.id)
+            commit = self.Pd4Web.Fetcher.Update(libData.name, libLink, libPath, libData.version)
+            self.Pd4Web.Version["externals"][libData.name] = str(commit.id)
+            self.fetchedLibraries.add(libData.name)
             return
 
-        libLink = f"https://github.com/{libData.dev}/{libData.repo}"
+        self.Pd4Web.print(
+            f"Cloning library {libData.repo}... This will take some time!",
+            color="green",
+            silence=self.Pd4Web.SILENCE,
+            pd4web=self.Pd4Web.PD_EXTERNAL,
+        )
+        commit = self.Pd4Web.Fetcher.Fetch(libData.name, libLink, libPath, libData.version)
+        self.Pd4Web.print(
+            f"Library {libData.repo} cloned successfully!",
+            color="green",
+            silence=self.Pd4Web.SILENCE,
+            pd4web=self.Pd4Web.PD_EXTERNAL,
+        )
+        self.Pd4Web.print(
+            f"Using commit {commit.id}", color="green", silence=self.Pd4Web.SILENCE, pd4web=self.Pd4Web.PD_EXTERNAL
+        )
         try:
-            self.Pd4Web.print(f"Cloning library {libData.repo}... This will take some time!", color="green", silence=self.Pd4Web.SILENCE, pd4web=self.Pd4Web.PD_EXTERNAL)
-            pygit2.clone_repository(libLink, libPath)
-        except Exception as e:
-            self.Pd4Web.exception(f"Failed to clone repository: {str(e)}")
-
-        libRepo: pygit2.Repository = pygit2.Repository(libPath)
-        tagName = libData.version
-        commit = self.getLibCommitVersion(libRepo, tagName)
-        libRepo.set_head(commit.id)
-        libRepo.checkout_tree(commit)
-        libRepo.reset(commit.id, pygit2.GIT_RESET_HARD)
-        self.Pd4Web.print(f"Library {libData.repo} cloned successfully!", color="green", silence=self.Pd4Web.SILENCE, pd4web=self.Pd4Web.PD_EXTERNAL)
-        self.Pd4Web.print(f"Using commit {commit.id}", color="green", silence=self.Pd4Web.SILENCE, pd4web=self.Pd4Web.PD_EXTERNAL)
-        try:
-            self.Pd4Web.print(f"Initializing submodules of {libData.repo}...", color="green", silence=self.Pd4Web.SILENCE, pd4web=self.Pd4Web.PD_EXTERNAL)
-            submodule_collection = pygit2.submodules.SubmoduleCollection(pygit2.Repository(libPath))
-            submodule_collection.init()
-            submodule_collection.update()
+            self.Pd4Web.print(
+                f"Initializing submodules of {libData.repo}...",
+                color="green",
+                silence=self.Pd4Web.SILENCE,
+                pd4web=self.Pd4Web.PD_EXTERNAL,
+            )
+            self.Pd4Web.Fetcher.UpdateSubmodules(libPath)
         except:
             self.Pd4Web.exception("Failed to initialize submodules.")
-            
+
         self.Pd4Web.Version["externals"][libData.name] = str(commit.id)
+        self.fetchedLibraries.add(libData.name)
 
         # TODO: Try to merge commits from submodules
         # try:
@@ -218,33 +304,19 @@ class ExternalLibraries:
         self.CloneLibrary(libData)
         if not os.path.exists(self.PROJECT_ROOT + f"/Pd4Web/Externals/{libData.name}"):
             self.Pd4Web.print(
-                f"Copying {libData.name} to Pd4Web/Externals...",
+                f"Materializing {libData.name} in Pd4Web/Externals...",
                 color="blue",
                 silence=self.Pd4Web.SILENCE,
                 pd4web=self.Pd4Web.PD_EXTERNAL,
             )
-            try:
-                shutil.copytree(
-                    libFolder,
-                    self.PROJECT_ROOT + "/Pd4Web/Externals/" + libData.name,
-                    symlinks=False,
-                    dirs_exist_ok=True,
-                    ignore_dangling_symlinks=True,
-                    ignore=shutil.ignore_patterns(".git"),
-                )
-            except:
-
-                def ignore_symlinks(src, names):
-                    return [name for name in names if os.path.islink(os.path.join(src, name))]
-
-                shutil.copytree(
-                    libFolder,
-                    self.PROJECT_ROOT + "/Pd4Web/Externals/" + libData.name,
-                    symlinks=False,
-                    ignore=ignore_symlinks,
-                    dirs_exist_ok=True,
-                    ignore_dangling_symlinks=True,
-                )
+            cmakeFile = os.path.join(self.Pd4Web.PD4WEB_LIBRARIES, f"{libData.name}.cmake")
+            self.Pd4Web.Materializer.Materialize(
+                libData.name,
+                libFolder,
+                self.PROJECT_ROOT + "/Pd4Web/Externals/" + libData.name,
+                cmakeFile,
+            )
+            self.Pd4Web.Materializer.PrintReport(libData.name)
             self.Pd4Web.Objects.GetLibraryObjects(libFolder, libName)
             # externalsJson = os.path.join(self.PROJECT_ROOT, "Pd4Web/Externals/Objects.json")
         return True
@@ -0,0 +1,245 @@
+import os
+import re
+import sys
+import glob
+import errno
+import shutil
+import ctypes
+
+from .Pd4Web import Pd4Web
+from .CMake import ParseCMakeCommands, CMakeVariables, ExpandVariables, MutatingFunctions, IsFileWrite
+
+
+class SourceMaterializer:
+    """
+    Put the sources kept in APPDATA (Pd and the libraries) inside Pd4Web/ of the project.
+
+    The mode (`--materialize`) decides how each file gets there: `copy` (the old behaviour),
+    `reflink` (copy-on-write clone, btrfs/xfs/apfs), `hardlink`, `symlink` or `auto` (reflink,
+    then hardlink, then copy). Files that the CMake of the libraries rewrites with file(WRITE)
+    or file(APPEND) are always copied, so the shared checkout is never modified by one project.
+    A library is materialized once in a project: a checkout of another version in APPDATA writes
+    new files, so hard links, reflinks and copies keep the files of the version they were made
+    from, only symbolic links see the new ones.
+
+    With `--materialize-used-only` the C/C++ sources are only put in the project when the CMake
+    of the project refers to them, the other files (headers, abstractions, data) are always there.
+    """
+
+    MODES = ["auto", "copy", "reflink", "hardlink", "symlink"]
+    SOURCE_EXTENSIONS = (".c", ".cc", ".cpp", ".cxx", ".C", ".m", ".mm", ".S", ".s")
+    FICLONE = 0x40049409
+
+    def __init__(self, Pd4Web: Pd4Web):
+        self.Pd4Web = Pd4Web
+        self.Mode = Pd4Web.MATERIALIZE
+        self.UsedOnly = Pd4Web.MATERIALIZE_USED_ONLY
+        if self.Mode not in self.MODES:
+            self.Pd4Web.exception(f"Unknown materialize mode {self.Mode}, use one of {', '.join(self.MODES)}")
+        self.Report = {}
+        self.unsupported = set()
+        self.sharedFunctions = {}
+
+    def __repr__(self) -> str:
+        return f"<SOURCE_MATERIALIZER | Mode: {self.Mode} | UsedOnly: {self.UsedOnly}>"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+    def methods(self, mutable: bool) -> list:
+        if self.Mode == "auto":
+            methods = ["reflink", "hardlink", "copy"]
+        elif self.Mode == "copy":
+            methods = ["copy"]
+        else:
+            methods = [self.Mode, "copy"]
+        if mutable:
+            methods = [method for method in methods if method in ["reflink", "copy"]]
+        return [method for method in methods if method not in self.unsupported]
+
+    def reflink(self, src: str, dst: str):
+        if sys.platform == "darwin":
+            libc = ctypes.CDLL(None, use_errno=True)
+            if libc.clonefile(src.encode(), dst.encode(), 0) != 0:
+                raise OSError(ctypes.get_errno(), "clonefile failed", dst)
+        elif sys.platform == "linux":
+            import fcntl
+
+            with open(src, "rb") as srcFile:
+                fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+                try:
+                    fcntl.ioctl(fd, self.FICLONE, srcFile.fileno())
+                except OSError:
+                    os.close(fd)
+                    os.remove(dst)
+                    raise
+                os.close(fd)
+            shutil.copystat(src, dst)
+        else:
+            raise OSError(errno.EOPNOTSUPP, "reflink not supported", dst)
+
+    def materializeFile(self, src: str, dst: str, mutable: bool = False) -> str:
+        """
+        Create `dst` from `src` with the first method that works, returns the method used.
+        """
+        for method in self.methods(mutable):
+            try:
+                if method == "reflink":
+                    self.reflink(src, dst)
+                elif method == "hardlink":
+                    os.link(src, dst)
+                elif method == "symlink":
+                    os.symlink(src, dst)
+                else:
+                    shutil.copy2(src, dst)
+                return method
+            except OSError:
+                if method == "copy":
+                    raise
+                # the file system (or the platform) does not support it, don't try it again
+                self.unsupported.add(method)
+        return "copy"
+
+    def Materialize(self, name: str, src: str, dst: str, cmakeFile: str = "", files=None):
+        """
+        Materialize the folder `src` in `dst`, files already in `dst` are kept. When `files` is
+        given only these paths (relative to `src`) are materialized.
+        """
+        mutable = set()
+        if cmakeFile != "" and os.path.exists(cmakeFile):
+            _, mutable = self.CMakeReferences(name, cmakeFile, src, dst)
+
+        with self.Pd4Web.Tracer.Span(f"materialize {name}", "materialize", files=0) as span:
+            report = self.Report.setdefault(name, {})
+            for root, dirs, fileNames in os.walk(src, followlinks=True):
+                dirs[:] = [folder for folder in dirs if folder != ".git"]
+                relRoot = os.path.relpath(root, src)
+                for fileName in fileNames:
+                    relFile = os.path.normpath(os.path.join(relRoot, fileName))
+                    if files is not None:
+                        if relFile not in files:
+                            continue
+                    elif self.UsedOnly and fileName.endswith(self.SOURCE_EXTENSIONS) and relFile not in mutable:
+                        continue
+                    srcFile = os.path.realpath(os.path.join(root, fileName))
+                    dstFile = os.path.join(dst, relFile)
+                    if not os.path.isfile(srcFile) or os.path.lexists(dstFile):
+                        continue
+                    os.makedirs(os.path.dirname(dstFile), exist_ok=True)
+                    method = self.materializeFile(srcFile, dstFile, relFile in mutable)
+                    report[method] = report.get(method, 0) + 1
+                    span["files"] += 1
+
+    def MaterializeReferenced(self, name: str, src: str, dst: str, cmakeFile: str):
+        """
+        With `--materialize-used-only`, materialize the sources that `cmakeFile` refers to.
+        """
+        if not self.UsedOnly or not os.path.exists(cmakeFile):
+            return
+        sources, mutable = self.CMakeReferences(name, cmakeFile, src, dst)
+        sources = self.includedSources(src, sources | mutable)
+        self.Materialize(name, src, dst, cmakeFile, files=sources)
+        self.PrintReport(name)
+
+    def CMakeReferences(self, name: str, cmakeFile: str, src: str, dst: str):
+        """
+        Files of `src` that `cmakeFile` refers to and the files it rewrites, as paths relative to `src`.
+        """
+        with open(cmakeFile, "r") as file:
+            commands = ParseCMakeCommands(file.read())
+        variables = CMakeVariables(
+            commands,
+            {
+                "CMAKE_CURRENT_SOURCE_DIR": self.Pd4Web.PROJECT_ROOT,
+                "PD4WEB_EXTERNAL_DIR": self.Pd4Web.PROJECT_ROOT + "/Pd4Web/Externals/",
+                "PDCMAKE_DIR": self.Pd4Web.PROJECT_ROOT + "/Pd4Web/Externals/",
+                "PROJECT_NAME": name,
+            },
+        )
+        mutatingFunctions = MutatingFunctions(commands, self.SharedMutatingFunctions(os.path.dirname(cmakeFile)))
+
+        referenced = set()
+        mutable = set()
+        dst = os.path.normpath(dst)
+        for command in commands:
+            commandName = command.name.lower()
+            isMutating = commandName in mutatingFunctions or IsFileWrite(command)
+            pathIndex = 1 if commandName == "file" else 0
+            for i, arg in enumerate(command.args):
+                for value in ExpandVariables(arg, variables).split(";"):
+                    if value == "" or "${" in value:
+                        continue
+                    path = os.path.normpath(value)
+                    if path != dst and not path.startswith(dst + os.sep):
+                        continue
+                    relPaths = self.matchPaths(src, os.path.relpath(path, dst), commandName)
+                    referenced.update(relPaths)
+                    if isMutating and i == pathIndex:
+                        mutable.update(relPaths)
+        return referenced, mutable
+
+    def SharedMutatingFunctions(self, folder: str) -> set:
+        """
+        Functions that rewrite files defined by the .cmake files of `folder`, the CMake of all libraries is
+        included in the same project, so a library can call the functions of the others.
+        """
+        if folder not in self.sharedFunctions:
+            commands = []
+            for cmakeFile in sorted(glob.glob(os.path.join(folder, "*.cmake"))):
+                if os.path.isfile(cmakeFile):
+                    with open(cmakeFile, "r") as file:
+                        commands += ParseCMakeCommands(file.read())
+            self.sharedFunctions[folder] = MutatingFunctions(commands)
+        return self.sharedFunctions[folder]
+
+    def matchPaths(self, src: str, relPath: str, commandName: str) -> set:
+        storePath = os.path.join(src, relPath)
+        if any(char in relPath for char in "*?["):
+            found = glob.glob(storePath, recursive=True)
+        elif os.path.isdir(storePath):
+            if commandName != "add_subdirectory":
+                return set()
+            found = []
+            for root, dirs, files in os.walk(storePath, followlinks=True):
+                dirs[:] = [folder for folder in dirs if folder != ".git"]
+                found.extend(os.path.join(root, file) for file in files)
+        elif os.path.isfile(storePath):
+            found = [storePath]
+        else:
+            return set()
+        return {os.path.normpath(os.path.relpath(path, src)) for path in found if os.path.isfile(path)}
+
+    def includedSources(self, src: str, sources: set) -> set:
+        """
+        Add the sources included by other sources (`#include "file.c"`).
+        """
+        pattern = re.compile(r'#\s*include\s*"([^"]+\.(?:c|cc|cpp|cxx))"')
+        pending = list(sources)
+        sources = set(sources)
+        while pending:
+            relFile = pending.pop()
+            try:
+                with open(os.path.join(src, relFile), "r", encoding="utf-8", errors="ignore") as file:
+                    contents = file.read()
+            except OSError:
+                continue
+            for match in pattern.finditer(contents):
+                included = os.path.normpath(os.path.join(os.path.dirname(relFile), match.group(1)))
+                if included not in sources and os.path.isfile(os.path.join(src, included)):
+                    sources.add(included)
+                    pending.append(included)
+        return sources
+
+    def PrintReport(self, name: str):
+        report = self.Report.get(name, {})
+        total = sum(report.values())
+        if total == 0:
+            return
+        methods = ", ".join(f"{method} {count}" for method, count in sorted(report.items()))
+        self.Pd4Web.print(
+            f"Materialized {total} files of {name} ({methods})",
+            color="blue",
+            silence=self.Pd4Web.SILENCE,
+            pd4web=self.Pd4Web.PD_EXTERNAL,
+        )
+        self.Report[name] = {}
@@ -0,0 +1,227 @@
+import os
+import re
+import sys
+import time
+from collections import deque
+
+from .Pd4Web import Pd4Web
+
+
+class NinjaProgress:
+    """
+    Output of cmake (configure or `cmake --build`) read line by line. The `[n/m]` lines of ninja give the
+    progress and the ETA of the build, the output of each failed command (from `FAILED:` to the next
+    `[n/m]` line) is kept to be shown on error. With --verbose every line is printed as it comes.
+    """
+
+    PROGRESS = re.compile(r"^\[(\d+)/(\d+)\]\s?(.*)$")
+
+    def __init__(self, Pd4Web: Pd4Web, label: str = "Compiling"):
+        self.Pd4Web = Pd4Web
+        self.label = label
+        self.start = time.perf_counter()
+        self.done = 0
+        self.total = 0
+        self.first = None
+        self.lines = deque(maxlen=60)
+        self.failures = []
+        self.failure = None
+        self.lastShown = 0.0
+        self.lastStep = 0
+        self.quiet = Pd4Web.SILENCE or Pd4Web.verbose
+        self.live = not self.quiet and not Pd4Web.PD_EXTERNAL and sys.stdout.isatty()
+
+    def __repr__(self) -> str:
+        return f"<NINJA_PROGRESS | {self.label} {self.done}/{self.total} | Failures: {len(self.failures)}>"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+    def Line(self, line: str):
+        """
+        Process one line of the output.
+        """
+        if self.Pd4Web.verbose:
+            print(line)
+            sys.stdout.flush()
+        self.lines.append(line)
+        progress = self.PROGRESS.match(line)
+        if progress is not None:
+            self.failure = None
+            self.done, self.total = int(progress.group(1)), int(progress.group(2))
+            if self.first is None:
+                self.first = (time.perf_counter(), self.done)
+            self.show()
+        elif line.startswith("FAILED: "):
+            self.failure = [line]
+            self.failures.append(self.failure)
+        elif line.startswith("ninja: build stopped"):
+            self.failure = None
+        elif self.failure is not None:
+            self.failure.append(line)
+
+    def ETA(self):
+        """
+        Seconds until the end of the build, from the rate of the steps done since the first `[n/m]` line.
+        """
+        if self.first is None or self.done <= self.first[1]:
+            return None
+        rate = (time.perf_counter() - self.first[0]) / (self.done - self.first[1])
+        return rate * (self.total - self.done)
+
+    def status(self) -> str:
+        percent = 100 * self.done / self.total if self.total > 0 else 0
+        eta = self.ETA()
+        text = f"{self.label} [{self.done}/{self.total}] {percent:3.0f}%"
+        if eta is not None:
+            text += f", {int(eta) // 60}:{int(eta) % 60:02d} left"
+        return text
+
+    def show(self):
+        if self.quiet:
+            return
+        if self.live:
+            now = time.perf_counter()
+            if now - self.lastShown < 0.1 and self.done < self.total:
+                return
+            self.lastShown = now
+            sys.stdout.write(f"\r    {self.status()}\033[K")
+            sys.stdout.flush()
+            return
+        # logs and the Pd external get one line each 10%
+        step = 10 * self.done // self.total if self.total > 0 else 0
+        if step > self.lastStep:
+            self.lastStep = step
+            self.Pd4Web.print(self.status(), color="blue", silence=self.Pd4Web.SILENCE, pd4web=self.Pd4Web.PD_EXTERNAL)
+
+    def Finish(self):
+        """
+        Clear the live progress line.
+        """
+        if self.live and self.first is not None:
+            sys.stdout.write("\r\033[K")
+            sys.stdout.flush()
+
+    def ErrorOutput(self) -> str:
+        """
+        Output of the failed commands, or the last lines when the error doesn't come from a command.
+        """
+        if len(self.failures) > 0:
+            return "\n".join("\n".join(failure) for failure in self.failures)
+        return "\n".join(self.lines)
+
+
+class NinjaLog:
+    """
+    Times of the steps of the last build from build/.ninja_log, which ninja appends after each command.
+    Compile steps (objects) and link steps are grouped by the library of their sources in Pd4Web/Externals.
+    """
+
+    def __init__(self, Pd4Web: Pd4Web, buildDir: str):
+        self.Pd4Web = Pd4Web
+        self.logFile = os.path.join(buildDir, ".ninja_log")
+        self.offset = os.path.getsize(self.logFile) if os.path.exists(self.logFile) else 0
+
+    def __repr__(self) -> str:
+        return f"<NINJA_LOG | {self.logFile}>"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+    def library(self, output: str) -> str:
+        external = re.search(r"Pd4Web/Externals/([^/]+)/", output)
+        if external is not None:
+            return external.group(1)
+        if "Pd4Web/pure-data/" in output:
+            return "pure-data"
+        return ""
+
+    def Steps(self) -> list:
+        """
+        Steps of the build that started after this object was created, [{Output, Library, Kind, Time}].
+        """
+        if not os.path.exists(self.logFile):
+            return []
+        with open(self.logFile, "r", errors="replace") as file:
+            # ninja recompacts the log when it grows too much, then all of it is read
+            if os.fstat(file.fileno()).st_size >= self.offset:
+                file.seek(self.offset)
+            lines = file.read().splitlines()
+
+        commands = {}
+        for line in lines:
+            fields = line.split("\t")
+            if line.startswith("#") or len(fields) < 5 or not fields[0].isdigit() or not fields[1].isdigit():
+                continue
+            # a command with many outputs (.js and .wasm) has one line for each of them
+            commands.setdefault((fields[0], fields[1], fields[4]), fields[3])
+
+        steps = []
+        targets = {}
+        for (start, end, _), output in commands.items():
+            if output.endswith(".ninja"):
+                continue
+            kind = "compile" if output.endswith((".o", ".obj")) else "link"
+            library = self.library(output)
+            target = re.match(r"CMakeFiles/([^/]+)\.dir/", output)
+            if kind == "compile" and library != "" and target is not None:
+                targets[target.group(1)] = library
+            steps.append({"Output": output, "Library": library, "Kind": kind, "Time": (int(end) - int(start)) / 1000})
+
+        for step in steps:
+            if step["Kind"] == "link" and step["Library"] == "":
+                name = os.path.splitext(os.path.basename(step["Output"]))[0]
+                if name not in targets and name.startswith("lib"):
+                    name = name[3:]
+                step["Library"] = targets.get(name, "pd4web")
+            elif step["Library"] == "":
+                step["Library"] = "pd4web"
+        return steps
+
+    def PrintReport(self, count: int = 5):
+        """
+        Print the compile and link time of each library and the slowest translation units.
+        """
+        steps = self.Steps()
+        if len(steps) == 0:
+            return
+        libraries = {}
+        for step in steps:
+            library = libraries.setdefault(step["Library"], {"compile": [], "link": []})
+            library[step["Kind"]].append(step)
+
+        compiled = [step for step in steps if step["Kind"] == "compile"]
+        linked = [step for step in steps if step["Kind"] == "link"]
+        self.Pd4Web.print(
+            f"Build steps: {len(compiled)} compiled in {sum(step['Time'] for step in compiled):.1f}s, "
+            + f"{len(linked)} linked in {sum(step['Time'] for step in linked):.1f}s (time of each job)",
+            color="blue",
+            silence=self.Pd4Web.SILENCE,
+            pd4web=self.Pd4Web.PD_EXTERNAL,
+        )
+        ordered = sorted(libraries.items(), key=lambda item: -sum(step["Time"] for step in item[1]["compile"]))
+        for name, library in ordered:
+            compileTime = sum(step["Time"] for step in library["compile"])
+            linkTime = sum(step["Time"] for step in library["link"])
+            text = f"{name:<16} {len(library['compile']):5d} files {compileTime:8.1f}s"
+            if len(library["link"]) > 0:
+                slowest = max(library["link"], key=lambda step: step["Time"])
+                slowestName = os.path.basename(slowest["Output"])
+                text += f", link {linkTime:6.2f}s (slowest {slowestName} {slowest['Time']:.2f}s)"
+            self.Pd4Web.print(text, silence=self.Pd4Web.SILENCE, pd4web=self.Pd4Web.PD_EXTERNAL)
+
+        if len(compiled) == 0:
+            return
+        self.Pd4Web.print(
+            "Slowest translation units:",
+            color="blue",
+            silence=self.Pd4Web.SILENCE,
+            pd4web=self.Pd4Web.PD_EXTERNAL,
+        )
+        for step in sorted(compiled, key=lambda step: -step["Time"])[:count]:
+            source = re.sub(r"^CMakeFiles/[^/]+\.dir/", "", step["Output"])
+            self.Pd4Web.print(
+                f"{step['Time']:6.2f}s {step['Library']:<16} {source}",
+                silence=self.Pd4Web.SILENCE,
+                pd4web=self.Pd4Web.PD_EXTERNAL,
+            )
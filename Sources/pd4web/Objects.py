@@ -1,4 +1,5 @@
 from .Pd4Web import Pd4Web
+from .Helpers import TmpPath
 
 import os
 import re
@@ -22,6 +23,8 @@ class Objects:
         self.LibraryNames = []
         self.unsupportedObjects = {}
         self.TotalOfLibraries = 0
+        self.absPaths = {}
+        self.ambiguousAbs = set()
 
     def __repr__(self) -> str:
         return f"<PD_OBJECTS | Total: {self.TotalOfLibraries}>"
@@ -66,92 +69,275 @@ class Objects:
             except:
                 return None
 
+    def GetLibraryVersion(self, libName: str):
+        """
+        Return the commit (or the Pd tag) of the library source code used in this run.
+        """
+        if libName == "pure-data":
+            return self.Pd4Web.PD_VERSION
+        return self.Pd4Web.Version["externals"].get(libName)
+
     def GetLibraryObjects(self, libFolder: str, libName: str):
         """
-        Recursively enumerate all external and abstractions and save the JSON file.
+        Recursively enumerate all external and abstractions and add them to the object index.
+        The result is shared with other projects through the SymbolCache.
         """
-        self.Pd4Web.print(
-            f"Listing all external supported by {libName}, this may take a while...",
-            color="blue",
-            silence=self.Pd4Web.SILENCE,
-            pd4web=self.Pd4Web.PD_EXTERNAL,
-        )
+        libVersion = self.GetLibraryVersion(libName)
+        with self.Pd4Web.Tracer.Span(f"GetLibraryObjects {libName}", "library", bytesRead=0) as span:
+            cachedObjects = self.Pd4Web.SymbolCache.Get(libName, libVersion, "objects")
+            span["cache"] = "miss" if cachedObjects is None else "hit"
+            if cachedObjects is not None:
+                self.Pd4Web.ObjectIndex.AddLibrary(libName, cachedObjects["objs"], cachedObjects["abs"], libVersion)
+                return
 
-        externalsJson = os.path.join(self.PROJECT_ROOT, "Pd4Web/Externals/Objects.json")
-        directory = os.path.dirname(externalsJson)
-        if not os.path.exists(directory):
-            os.makedirs(directory)
+            self.Pd4Web.print(
+                f"Listing all external supported by {libName}, this may take a while...",
+                color="blue",
+                silence=self.Pd4Web.SILENCE,
+                pd4web=self.Pd4Web.PD_EXTERNAL,
+            )
 
-        if os.path.exists(externalsJson):
-            with open(externalsJson, "r") as file:
-                externalsDict = json.load(file)
+            extObjs = []
+            absObjs = []
+            absFiles = []
+            for root, _, files in os.walk(libFolder):
+                for file in files:
+                    if file.endswith(".c") or file.endswith(".cpp"):
+                        with open(os.path.join(root, file), "r", encoding="utf-8") as c_file:
+                            span["bytesRead"] += os.fstat(c_file.fileno()).st_size
+                            try:
+                                file_contents = c_file.read()
+                            except:
+                                self.Pd4Web.print(
+                                    f"Impossible to read file {file}", color="yellow", pd4web=self.Pd4Web.PD_EXTERNAL
+                                )
+                                continue
+                            pattern = r'class_new\s*\(\s*gensym\s*\(\s*\"([^"]*)\"\s*\)'
+                            matches = re.finditer(pattern, file_contents)
+                            for match in matches:
+                                objectName = match.group(1)
+                                extObjs.append(objectName)
 
-        else:
-            externalsDict = {}
-
-        extObjs = []
-        absObjs = []
-        externalsDict[libName] = {}
-        for root, _, files in os.walk(libFolder):
-            for file in files:
-                if file.endswith(".c") or file.endswith(".cpp"):
-                    with open(os.path.join(root, file), "r", encoding="utf-8") as c_file:
-                        try:
-                            file_contents = c_file.read()
-                        except:
-                            self.Pd4Web.print(
-                                f"Impossible to read file {file}", color="yellow", pd4web=self.Pd4Web.PD_EXTERNAL
-                            )
-                            continue
-                        pattern = r'class_new\s*\(\s*gensym\s*\(\s*\"([^"]*)\"\s*\)'
-                        matches = re.finditer(pattern, file_contents)
-                        for match in matches:
-                            objectName = match.group(1)
-                            extObjs.append(objectName)
-
-                        pattern = r'class_addcreator\s*\(\s*\([^,]*,\s*gensym\s*\(\s*"([^"]*)"\s*\)'
-                        matches = re.finditer(pattern, file_contents)
-                        for match in matches:
-                            objectName = match.group(1)
-                            extObjs.append(objectName)
-
-                if file.endswith(".pd"):
-                    if "-help.pd" not in file:
-                        absObjs.append(file.split(".pd")[0])
+                            pattern = r'class_addcreator\s*\(\s*\([^,]*,\s*gensym\s*\(\s*"([^"]*)"\s*\)'
+                            matches = re.finditer(pattern, file_contents)
+                            for match in matches:
+                                objectName = match.group(1)
+                                extObjs.append(objectName)
 
+                    if file.endswith(".pd"):
+                        if "-help.pd" not in file:
+                            absObjs.append(file.split(".pd")[0])
+                            absFiles.append(os.path.relpath(os.path.join(root, file), libFolder))
+
+            if libName == "pure-data":
+                extObjs.append("pointer")
+                extObjs.append("float")
+                extObjs.append("symbol")
+                extObjs.append("bang")
+                extObjs.append("list")
+            self.Pd4Web.SymbolCache.Set(libName, libVersion, "objects", {"objs": extObjs, "abs": absObjs})
+            self.Pd4Web.SymbolCache.Set(libName, libVersion, "abspaths", self.indexPaths(absFiles))
+            self.Pd4Web.ObjectIndex.AddLibrary(libName, extObjs, absObjs, libVersion)
+
+    def indexPaths(self, files: list) -> dict:
+        """
+        {name: [paths]} of the abstraction `files`, the paths of each name are sorted by depth (the order os.walk
+        finds them) and use / on all systems.
+        """
+        index = {}
+        for file in files:
+            index.setdefault(os.path.basename(file).split(".pd")[0], []).append(file.replace(os.sep, "/"))
+        for paths in index.values():
+            paths.sort(key=lambda path: (path.count("/"), path))
+        return index
+
+    def IndexAbstractions(self, folder: str, helpFiles=False) -> dict:
+        """
+        {name: [paths relative to folder]} of all abstractions inside `folder`.
+        """
+        files = []
+        for root, _, names in os.walk(folder):
+            for file in names:
+                if file.endswith(".pd") and (helpFiles or "-help.pd" not in file):
+                    files.append(os.path.relpath(os.path.join(root, file), folder))
+        return self.indexPaths(files)
+
+    def GetAbstractionPaths(self, libName: str) -> dict:
+        """
+        Abstractions of the library in Pd4Web/Externals, built once and kept in the SymbolCache with the objects.
+        """
+        if libName in self.absPaths:
+            return self.absPaths[libName]
+        libVersion = self.GetLibraryVersion(libName)
+        absPaths = self.Pd4Web.SymbolCache.Get(libName, libVersion, "abspaths")
+        if absPaths is None:
+            libFolder = os.path.join(self.PROJECT_ROOT, "Pd4Web", "Externals", libName)
+            if not os.path.isdir(libFolder):
+                return {}
+            absPaths = self.IndexAbstractions(libFolder)
+            self.Pd4Web.SymbolCache.Set(libName, libVersion, "abspaths", absPaths)
+        self.absPaths[libName] = absPaths
+        return absPaths
+
+    def GetAbstractionPath(self, libName: str, absName: str) -> str:
+        """
+        Path of the abstraction `absName` of the library, or "" if the library has no abstraction with this name.
+        """
+        paths = self.GetAbstractionPaths(libName).get(absName, [])
+        if len(paths) == 0:
+            return ""
+        if len(paths) > 1 and (libName, absName) not in self.ambiguousAbs:
+            self.ambiguousAbs.add((libName, absName))
+            self.Pd4Web.print(
+                f"Abstraction {absName} is in more than one folder of {libName} ({', '.join(paths)}), using {paths[0]}",
+                color="yellow",
+                silence=self.Pd4Web.SILENCE,
+                pd4web=self.Pd4Web.PD_EXTERNAL,
+            )
+        return os.path.join(self.PROJECT_ROOT, "Pd4Web", "Externals", libName, *paths[0].split("/"))
+
+    def IndexLibrary(self, libName: str):
+        """
+        Get the library (when it is supported) and index its objects, once for each version.
+        """
+        # the shared checkout is read, the project may only have part of the sources
         if libName == "pure-data":
-            extObjs.append("pointer")
-            extObjs.append("float")
-            extObjs.append("symbol")
-            extObjs.append("bang")
-            extObjs.append("list")
-        externalsDict[libName]["objs"] = extObjs
-        externalsDict[libName]["abs"] = absObjs
-        with open(externalsJson, "w") as file:
-            json.dump(externalsDict, file, indent=4)
-
-    def GetSupportedObjects(self, libName: str):
-        if libName == "pure-data":
-            libFolder = os.path.join(self.PROJECT_ROOT, "Pd4Web/", libName)
+            libFolder = os.path.join(self.Pd4Web.APPDATA, "Pd", "src")
         else:
-            libFolder = os.path.join(self.PROJECT_ROOT, "Pd4Web/Externals", libName)
+            libFolder = os.path.join(self.Pd4Web.APPDATA, "Externals", libName)
 
         if self.Pd4Web.Libraries.isSupportedLibrary(libName):
             self.Pd4Web.Libraries.GetLibrarySourceCode(libName)
 
-        externalsJson = os.path.join(self.PROJECT_ROOT, "Pd4Web/Externals/Objects.json")
-        if not os.path.exists(externalsJson):
+        if not self.Pd4Web.ObjectIndex.HasLibrary(libName, self.GetLibraryVersion(libName)):
             self.GetLibraryObjects(libFolder, libName)
 
-        with open(externalsJson, "r") as file:
-            externalsDict = json.load(file)
+    def GetSupportedObjects(self, libName: str) -> list:
+        """
+        Objects and abstractions of the library, a new list that can be changed without changing the index.
+        """
+        self.IndexLibrary(libName)
+        return self.Pd4Web.ObjectIndex.GetAllList(libName)
 
-        if libName not in externalsDict:
-            self.GetLibraryObjects(libFolder, libName)
-            with open(externalsJson, "r") as file:
+    def IsSupportedObject(self, libName: str, objName: str) -> bool:
+        """
+        Check if the library has the object or abstraction `objName`, without copying its objects.
+        """
+        self.IndexLibrary(libName)
+        return objName in self.Pd4Web.ObjectIndex.GetAll(libName)
+
+
+class ObjectIndex:
+    """
+    In-memory view of Pd4Web/Externals/Objects.json. The file is read once when
+    the index is created and written once by Save(), lookups are answered from
+    per-library sets and reverse maps (object -> libraries). The sets are frozen
+    and the lists are copied, so callers can't change the index.
+    """
+
+    def __init__(self, Pd4Web: Pd4Web):
+        self.Pd4Web = Pd4Web
+        self.PROJECT_ROOT = Pd4Web.PROJECT_ROOT
+        self.jsonFile = os.path.join(self.PROJECT_ROOT, "Pd4Web/Externals/Objects.json")
+        self.InitVariables()
+        self.Load()
+
+    def InitVariables(self):
+        self.librariesData = {}
+        self.objs = {}
+        self.abs = {}
+        self.all = {}
+        self.objLibraries = {}
+        self.absLibraries = {}
+        self.modified = False
+
+    def __repr__(self) -> str:
+        return f"<OBJECT_INDEX | Libraries: {len(self.librariesData)}>"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+    def Load(self):
+        if not os.path.exists(self.jsonFile):
+            return
+        try:
+            with open(self.jsonFile, "r") as file:
                 externalsDict = json.load(file)
+        except (OSError, ValueError):
+            self.Pd4Web.print(
+                f"Could not read {self.jsonFile}, the object index will be rebuilt",
+                color="yellow",
+                silence=self.Pd4Web.SILENCE,
+                pd4web=self.Pd4Web.PD_EXTERNAL,
+            )
+            return
+        for libName, libData in externalsDict.items():
+            self.indexLibrary(libName, libData.get("objs", []), libData.get("abs", []), libData.get("version"))
+
+    def indexLibrary(self, libName: str, objs: list, absObjs: list, libVersion=None):
+        if libName in self.librariesData:
+            for obj in self.objs[libName]:
+                self.objLibraries[obj].remove(libName)
+            for absObj in self.abs[libName]:
+                self.absLibraries[absObj].remove(libName)
+
+        self.librariesData[libName] = {"objs": list(objs), "abs": list(absObjs), "version": libVersion}
+        self.objs[libName] = frozenset(objs)
+        self.abs[libName] = frozenset(absObjs)
+        self.all[libName] = self.objs[libName] | self.abs[libName]
+        for obj in self.objs[libName]:
+            self.objLibraries.setdefault(obj, []).append(libName)
+        for absObj in self.abs[libName]:
+            self.absLibraries.setdefault(absObj, []).append(libName)
+
+    def AddLibrary(self, libName: str, objs: list, absObjs: list, libVersion=None):
+        self.indexLibrary(libName, objs, absObjs, libVersion)
+        self.modified = True
 
-        allObjsAndAbs = externalsDict[libName]["objs"]
-        allObjsAndAbs.extend(externalsDict[libName]["abs"])
+    def HasLibrary(self, libName: str, libVersion=None) -> bool:
+        """
+        Check if the library is indexed, when `libVersion` is given the index must be of that version.
+        """
+        if libName not in self.librariesData:
+            return False
+        if libVersion is None:
+            return True
+        return self.librariesData[libName]["version"] == libVersion
+
+    def GetObjects(self, libName: str) -> frozenset:
+        return self.objs.get(libName, frozenset())
+
+    def GetAbstractions(self, libName: str) -> frozenset:
+        return self.abs.get(libName, frozenset())
+
+    def GetAll(self, libName: str) -> frozenset:
+        return self.all.get(libName, frozenset())
+
+    def GetAllList(self, libName: str) -> list:
+        """
+        Objects and then abstractions of the library, in the order of Objects.json.
+        """
+        libData = self.librariesData.get(libName, {"objs": [], "abs": []})
+        return libData["objs"] + libData["abs"]
+
+    def LibrariesWithObject(self, objName: str) -> list:
+        return list(self.objLibraries.get(objName, []))
+
+    def LibrariesWithAbstraction(self, absName: str) -> list:
+        return list(self.absLibraries.get(absName, []))
 
-        return allObjsAndAbs
+    def Save(self):
+        """
+        Write the index to Objects.json, only if some library was added since it was loaded.
+        """
+        if not self.modified:
+            return
+        directory = os.path.dirname(self.jsonFile)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        # build-many and the compile daemon can save the index of the same project at the same time
+        tmpFile = TmpPath(self.jsonFile)
+        with open(tmpFile, "w") as file:
+            json.dump(self.librariesData, file, indent=4)
+        os.replace(tmpFile, self.jsonFile)
+        self.modified = False
@@ -1,36 +1,52 @@
 import os
-import json
 
-# from .Helpers import self.Pd4Web.print
+from .Helpers import WriteLinesIfChanged
+from .Lexer import ObjectRecords
 from .Pd4Web import Pd4Web
 
 
 class PatchLine:
-    def __init__(self):
+    """
+    One object line of the patch. The other lines (#A data, coords, comments, messages, connections...)
+    go through Patch as the original strings and are not kept.
+    """
+
+    __slots__ = (
+        "isExternal",
+        "isAbstraction",
+        "objwithSlash",
+        "completLine",
+        "name",
+        "completName",
+        "library",
+        "index",
+        "setupFunction",
+        "functionName",
+        "uiReceiver",
+        "absPath",
+        "localAbs",
+        "Tokens",
+    )
+    SPECIAL_OBJECTS = ("adc~", "dac~")
+
+    def __init__(self, index=0, completLine="", Tokens=None):
         self.InitVariables()
+        self.index = index
+        self.completLine = completLine
+        self.Tokens = Tokens if Tokens is not None else []
 
     def InitVariables(self):
         self.isExternal = False
         self.isAbstraction = False
-        self.isLocalAbstraction = False
         self.objwithSlash = False  # for objects like /~ / and //
-        self.completLine = ""
         self.name = ""
         self.completName = ""
         self.library = "pure-data"
-        self.index = 0
-        self.objGenSym = ""
         self.setupFunction = ""
-        self.singleObject = False
-        self.genSymIndex = 0
         self.functionName = ""
-        self.objFound = False
         self.uiReceiver = False
-        self.uiSymbol = ""
         self.absPath = ""
         self.localAbs = False
-        self.Tokens = []
-        self.SpecialObjects = ["adc~", "dac~"]
 
     # ──────────────────────────────────────
     def __str__(self) -> str:
@@ -40,7 +56,7 @@ class PatchLine:
             if self.Tokens[0] == "#X":
                 if self.Tokens[1] == "obj":
                     objName = self.Tokens[4].replace("\n", "").replace(";", "")
-                    if objName in self.SpecialObjects:
+                    if objName in self.SPECIAL_OBJECTS:
                         return "< Pd Special Object: " + objName + " >"
                     else:
                         return "< Pd Object: " + self.Tokens[1] + " | " + objName + " >"
@@ -79,6 +95,7 @@ class Patch:
         if isabs:
             patchfile = os.path.basename(patch)
             if patch in self.Pd4Web.processedAbs:
+                self.Pd4Web.PatchGraph.AddEdge(patch)
                 self.Pd4Web.print(
                     f"Abstraction {patchfile} already processed",
                     color="blue",
@@ -94,8 +111,9 @@ class Patch:
                 pd4web=self.Pd4Web.PD_EXTERNAL,
             )
         else:
-            libFolder = os.path.join(self.Pd4Web.PROJECT_ROOT, "Pd4Web/pure-data/src")
-            self.Pd4Web.Objects.GetLibraryObjects(libFolder, "pure-data")
+            if not self.Pd4Web.ObjectIndex.HasLibrary("pure-data", self.Pd4Web.PD_VERSION):
+                libFolder = os.path.join(self.Pd4Web.APPDATA, "Pd", "src")
+                self.Pd4Web.Objects.GetLibraryObjects(libFolder, "pure-data")
 
         if patch is not None:
             self.patchFile = patch
@@ -105,22 +123,33 @@ class Patch:
             else:
                 self.Pd4Web.exception("Patch not found")
 
-        # Read Line by Line
-        with open(self.patchFile, "r") as file:
-            self.patchLines = file.readlines()
+        # Find the patch tree before, the abstractions are scanned in parallel
+        graph = self.Pd4Web.PatchGraph
+        if not isabs:
+            graph.Discover(self.patchFile)
 
         # Init Supported Libraries
         self.initVariables()
 
-        # Main Functions
-        self.execute()
-
-        # Rewrite the patches to remove preffix
-        self.reConfigurePatch()
+        # Main Functions, the patch is read, processed and rewritten line by line
+        graph.Enter(self.patchFile, isabs)
+        name = f"Patch {os.path.basename(self.patchFile)}"
+        with self.Pd4Web.Tracer.Span(name, "abstraction" if isabs else "patch", file=self.patchFile) as span:
+            span["bytesRead"] = os.path.getsize(self.patchFile)
+            try:
+                span["bytesWritten"] = self.execute()
+            finally:
+                graph.Leave()
+
+        # Everything was indexed, write Objects.json once
+        if not isabs:
+            self.Pd4Web.ObjectIndex.Save()
+            if self.Pd4Web.PATCH_GRAPH:
+                graph.Dump(os.path.join(self.Pd4Web.PROJECT_ROOT, "build", "patch-graph.dot"))
 
         # if not abs:
         if isabs and patch != "" and patch not in self.Pd4Web.processedAbs:
-            self.Pd4Web.processedAbs.append(patch)
+            self.Pd4Web.processedAbs[patch] = True
             # print(f"Processed Abs: {self.Pd4Web.processedAbs}")
 
     def initVariables(self):
@@ -128,9 +157,10 @@ class Patch:
         self.libraryClass = None
         self.localAbstractions = []
         self.patchLinesExternals = []
-        self.declaredAbs = []
         self.absProcessed = []
-        self.patchLinesProcessed = []
+        # functionName of the last line of each (library, object), the lines themselves are not kept
+        self.objectFunctions = {}
+        self.objectCount = 0
         self.uiReceiversSymbol = []
         self.needExtra = False
         self.guiObject = 0
@@ -139,8 +169,9 @@ class Patch:
         # Abstractions
         self.getAbstractions()
 
-        # Find Externals in Patch
-        self.processPatch()
+        # Find Externals in Patch and rewrite the patches to remove preffix
+        self.patchRecords = self.Pd4Web.PatchGraph.PatchRecords(self.patchFile)
+        return self.reConfigurePatch(self.rewritePatch(self.processPatch()))
 
     # ╭──────────────────────────────────────╮
     # │             Abstractions             │
@@ -210,25 +241,13 @@ class Patch:
         line.library = line.Tokens[4].split("/")[0]
         line.name = line.completName.split("/")[-1]
         if self.Pd4Web.Libraries.isSupportedLibrary(line.library):
-            externalsJson = os.path.join(self.PROJECT_ROOT, "Pd4Web/Externals/Objects.json")
-            if not os.path.exists(externalsJson):
-                self.Pd4Web.exception("Externals Json not found!")
-            libAbs = []
-            with open(externalsJson, "r") as file:
-                externalsDict = json.load(file)
-                if line.library in externalsDict:
-                    libAbs = externalsDict[line.library]["abs"]
-                else:
-                    self.Pd4Web.Objects.GetSupportedObjects(line.library)
+            objectIndex = self.Pd4Web.ObjectIndex
+            if not objectIndex.HasLibrary(line.library):
+                self.Pd4Web.Objects.IndexLibrary(line.library)
+            if not objectIndex.HasLibrary(line.library):
+                self.Pd4Web.exception(f"Library {line.library} not found in the object index")
 
-            with open(externalsJson, "r") as file:
-                externalsDict = json.load(file)
-                if line.library in externalsDict:
-                    libAbs = externalsDict[line.library]["abs"]
-                else:
-                    self.Pd4Web.exception(f"Library {line.library} not found in {externalsJson}")
-
-            if line.name in libAbs:
+            if line.name in objectIndex.GetAbstractions(line.library):
                 externalSpace = 25 - len(line.name)
                 absName = line.name + (" " * externalSpace)
                 self.Pd4Web.print(
@@ -238,13 +257,9 @@ class Patch:
                     pd4web=self.Pd4Web.PD_EXTERNAL,
                 )
                 line.isAbstraction = True
-                libPath = os.path.join(self.PROJECT_ROOT, "Pd4Web/Externals", line.library)
-                for root, _, files in os.walk(libPath):
-                    for file in files:
-                        if file == line.name + ".pd":
-                            line.absPath = os.path.join(root, file)
-                            return True
+                line.absPath = self.Pd4Web.Objects.GetAbstractionPath(line.library, line.name)
                 return True
+            return False
 
         else:
             return False
@@ -331,53 +346,75 @@ class Patch:
 
     def processPatch(self):
         """
-        This function will find all externals objects in the patch.
+        This function will find all externals objects in the patch. It yields the lines one by one, the
+        objects as PatchLine and the other lines as they are.
         """
-        for line in enumerate(self.patchLines):
-            patchLine = PatchLine()
-            patchLine.index, patchLine.completLine = line
-            tokens = patchLine.completLine.replace("\n", "")
-            tokens = tokens.replace(";", "")
-            tokens = tokens.replace(",", "")  # when width is specificied
-            patchLine.Tokens = tokens.split(" ")
+        for index, (line, tokens) in enumerate(self.patchRecords):
+            # only objects and [declare] are tokenized, the other records are kept as they are
+            if tokens is None:
+                yield line
+                continue
 
             # no objects
-            if len(patchLine.Tokens) < 5 or patchLine.Tokens[1] != "obj":
+            if len(tokens) < 5 or tokens[1] != "obj":
                 # declare libs
-                if len(patchLine.Tokens) == 4 and patchLine.Tokens[1] == "declare":
-                    if patchLine.Tokens[2] == "-lib":
-                        path = patchLine.Tokens[3]
+                if len(tokens) == 4 and tokens[1] == "declare":
+                    if tokens[2] == "-lib":
+                        path = tokens[3]
                         if not self.Pd4Web.Libraries.isSupportedLibrary(path):
                             self.Pd4Web.exception(f"Library not supported: {path} in {self.patchFile}")
-                        self.Pd4Web.Objects.GetSupportedObjects(path)
+                        self.Pd4Web.Objects.IndexLibrary(path)
                         self.Pd4Web.declaredLibsObjs.append(path)
 
-                    elif patchLine.Tokens[2] == "-path":
-                        path = patchLine.Tokens[3]
+                    elif tokens[2] == "-path":
+                        path = tokens[3]
                         if self.Pd4Web.Libraries.isSupportedLibrary(path):
                             self.Pd4Web.Libraries.GetLibrarySourceCode(path)
                             self.Pd4Web.declaredPaths.append(path)
                         else:
                             self.Pd4Web.declaredPaths.append(path)
-                            localPath = os.path.join(self.Pd4Web.PROJECT_ROOT, patchLine.Tokens[3])
-                            if os.path.exists(localPath):
-                                for _, _, files in os.walk(localPath):
-                                    for file in files:
-                                        if file.endswith(".pd"):
-                                            obj_name = file.split(".pd")[0]
-                                            self.Pd4Web.declaredLocalAbs.append(obj_name)
+                            localPath = os.path.join(self.Pd4Web.PROJECT_ROOT, tokens[3])
+                            # each folder is listed once, the abstractions can declare the same path
+                            if os.path.exists(localPath) and localPath not in self.Pd4Web.declaredLocalFolders:
+                                absPaths = self.Pd4Web.Objects.IndexAbstractions(localPath, helpFiles=True)
+                                self.Pd4Web.declaredLocalFolders[localPath] = absPaths
+                                self.Pd4Web.declaredLocalAbs += list(absPaths)
                 # check if it is a comment
                 else:
-                    self.patchLinesProcessed.append(patchLine)
+                    yield line
             else:
+                patchLine = PatchLine(index, line, tokens)
                 self.patchObject(patchLine)
+                yield patchLine
 
-    def reConfigurePatch(self):
+    def rewritePatch(self, lines):
         """
-        Reconfigures the patch file for the project.
         Pd4Web compile as objects as native objects, so we need to remove
         the preffix of the Libraries.
         """
+        for line in lines:
+            if isinstance(line, str):
+                yield line
+            elif (line.isExternal or line.isAbstraction or line.uiReceiver) and not line.objwithSlash:
+                obj = line.Tokens[4].split("/")
+                if len(obj) > 1:
+                    line.Tokens[4] = obj[-1]
+                if line.Tokens[-2] == "f" and line.Tokens[-1].isdigit():
+                    line.Tokens[-3] = line.Tokens[-3] + ","
+                yield " ".join(line.Tokens) + ";\n"
+
+            # check if it is a clone object
+            elif line.Tokens[0] == "#X" and line.Tokens[1] == "obj" and line.Tokens[4] == "clone":
+                yield " ".join(line.Tokens) + ";\n"
+
+            else:
+                yield line.completLine
+
+    def reConfigurePatch(self, lines):
+        """
+        Writes the rewritten `lines` of the patch to the project as they are processed.
+        Returns the size of the new file, 0 when it didn't change.
+        """
         if not self.isAbstraction:
             if not os.path.exists(self.Pd4Web.PROJECT_ROOT + "/WebPatch/"):
                 os.mkdir(self.Pd4Web.PROJECT_ROOT + "/WebPatch/")
@@ -386,66 +423,44 @@ class Patch:
             if not os.path.exists(self.Pd4Web.PROJECT_ROOT + "/.tmp/"):
                 os.mkdir(self.Pd4Web.PROJECT_ROOT + "/.tmp/")
             patchFile = self.Pd4Web.PROJECT_ROOT + "/.tmp/" + os.path.basename(self.patchFile)
-        with open(patchFile, "w") as f:
-            for line in self.patchLinesProcessed:
-                if (line.isExternal or line.isAbstraction or line.uiReceiver) and not line.objwithSlash:
-                    obj = line.Tokens[4].split("/")
-                    if len(obj) > 1:
-                        line.Tokens[4] = obj[-1]
-                    if line.Tokens[-2] == "f" and line.Tokens[-1].isdigit():
-                        line.Tokens[-3] = line.Tokens[-3] + ","
-                    f.write(" ".join(line.Tokens) + ";\n")
-
-                # check if it is a clone object
-                elif line.Tokens[0] == "#X" and line.Tokens[1] == "obj" and line.Tokens[4] == "clone":
-                    f.write(" ".join(line.Tokens) + ";\n")
 
-                else:
-                    f.write(line.completLine)
+        # unchanged patches keep their timestamp, so nothing is rebuilt
+        if WriteLinesIfChanged(patchFile, lines):
+            return os.path.getsize(patchFile)
+        return 0
 
     def objThatIsSingleLib(self, patchLine: PatchLine):
         """
         This function will check if the object is a single library object. For example earplug~, ambi~, and others
         """
         if patchLine.Tokens[0] == "#X" and patchLine.Tokens[1] == "obj":
-            supportedLibs = self.Pd4Web.Libraries.SupportedLibraries
-            libs = [lib["Name"] for lib in supportedLibs]
-            if patchLine.Tokens[4] in libs:
-                return True
-            else:
-                return False
+            return self.Pd4Web.Libraries.isSupportedLibrary(patchLine.Tokens[4])
         else:
             return False
 
+    def declaredLibraries(self, libraries: list, declared: list) -> list:
+        """
+        Return the libraries of `libraries` that were declared, in declaration order.
+        """
+        if len(libraries) == 0:
+            return []
+        return [lib for lib in dict.fromkeys(declared) if lib in libraries]
+
     def objInDeclaredLib(self, patchLine: PatchLine):
         """ """
-        declaredObjs = []
-        externalsJson = os.path.join(self.PROJECT_ROOT, "Pd4Web/Externals/Objects.json")
-        if not os.path.exists(externalsJson):
-            return False
-        librariesCount = 0
-        libName = ""
-
-        # list of all objects/abs declared in one library
-        file = open(externalsJson, "r")
-        externalsDict = json.load(file)
-        file.close()
-
-        for lib in self.Pd4Web.declaredLibsObjs:
-            declaredObjs.extend(externalsDict[lib]["objs"])
-            if patchLine.completName in declaredObjs:
-                libName = lib
-                librariesCount += 1
-
-        if librariesCount > 0:
-            if librariesCount > 1:
+        objectIndex = self.Pd4Web.ObjectIndex
+        libraries = self.declaredLibraries(
+            objectIndex.LibrariesWithObject(patchLine.completName), self.Pd4Web.declaredLibsObjs
+        )
+        if len(libraries) > 0:
+            if len(libraries) > 1:
                 self.Pd4Web.print(
                     f"Object {patchLine.completName} is in more than one library, using the first declared.",
                     color="yellow",
                     silence=self.Pd4Web.SILENCE,
                     pd4web=self.Pd4Web.PD_EXTERNAL,
                 )
-            patchLine.library = libName
+            patchLine.library = libraries[0]
             return True
         return False
 
@@ -454,33 +469,26 @@ class Patch:
         Libraries like else has a lot of abstractions that must be used with [declare -path else],
         this function make the work to make these patches avaible.
         """
-        externalsJson = os.path.join(self.PROJECT_ROOT, "Pd4Web/Externals/Objects.json")
-        if not os.path.exists(externalsJson):
-            return False
-        librariesCount = 0
-        libName = ""
-
-        with open(externalsJson, "r") as file:
-            externalsDict = json.load(file)
-            for lib in self.Pd4Web.declaredPaths:
-                if lib in externalsDict.keys():
-                    self.declaredAbs.extend(externalsDict[lib]["abs"])
-                    if patchLine.completName in self.declaredAbs:
-                        libName = lib
-                        librariesCount += 1
-
-        if librariesCount > 0:
-            if librariesCount > 1:
+        objectIndex = self.Pd4Web.ObjectIndex
+        libraries = self.declaredLibraries(
+            objectIndex.LibrariesWithAbstraction(patchLine.completName), self.Pd4Web.declaredPaths
+        )
+        if len(libraries) > 0:
+            if len(libraries) > 1:
                 self.Pd4Web.print(
                     f"Abstraction {patchLine.completName} is in more than one library, using the first declared.",
                     color="yellow",
                     silence=self.Pd4Web.SILENCE,
                     pd4web=self.Pd4Web.PD_EXTERNAL,
                 )
-            patchLine.library = libName
+            patchLine.library = libraries[0]
             return True
         return False
 
+    def absInDeclaredPaths(self, absName: str) -> bool:
+        objectIndex = self.Pd4Web.ObjectIndex
+        return len(self.declaredLibraries(objectIndex.LibrariesWithAbstraction(absName), self.Pd4Web.declaredPaths)) > 0
+
     def processClone(self, line: PatchLine):
         args = ["-do", "-di", "-x", "-s"]
         lastToken = ""
@@ -490,7 +498,7 @@ class Patch:
             if token not in args and lastToken not in ["-x", "-s"]:
                 if os.path.exists(self.PROJECT_ROOT + "/" + token + ".pd"):
                     cloneAbs = token
-                elif token in self.declaredAbs:
+                elif self.absInDeclaredPaths(token):
                     self.Pd4Web.print(
                         "Clone Abs is part of declared Abs",
                         color="blue",
@@ -510,7 +518,7 @@ class Patch:
                     library = token.split("/")[0]
                     absPatch = token.split("/")[-1]
                     if self.Pd4Web.Libraries.isSupportedLibrary(library):
-                        if absPatch in self.Pd4Web.Objects.GetSupportedObjects(library):
+                        if self.Pd4Web.Objects.IsSupportedObject(library, absPatch):
                             cloneAbs = absPatch
                             line.Tokens[5] = cloneAbs
                             # print(line.Tokens)
@@ -534,18 +542,18 @@ class Patch:
                 return
                 # self.Pd4Web.processedAbs.append(self.PROJECT_ROOT + "/" + cloneAbs + ".pd")
             clonePathFound = False
-            for lib in self.Pd4Web.declaredPaths:
-                libPath = os.path.join(self.PROJECT_ROOT, "Pd4Web/Externals", lib)
-                for root, _, files in os.walk(libPath):
-                    for file in files:
-                        if file == cloneAbs + ".pd":
-                            clonePathFound = True
-                            if os.path.join(root, file) not in self.Pd4Web.processedAbs:
-                                Patch(
-                                    self.Pd4Web,
-                                    isabs=True,
-                                    patch=os.path.join(root, file),
-                                )
+            for lib in dict.fromkeys(self.Pd4Web.declaredPaths):
+                if not self.Pd4Web.Libraries.isSupportedLibrary(lib):
+                    continue
+                absPath = self.Pd4Web.Objects.GetAbstractionPath(lib, cloneAbs)
+                if absPath != "":
+                    clonePathFound = True
+                    if absPath not in self.Pd4Web.processedAbs:
+                        Patch(
+                            self.Pd4Web,
+                            isabs=True,
+                            patch=absPath,
+                        )
             if not clonePathFound:
                 self.Pd4Web.exception(f"Clone Abstraction {cloneAbs} not found in {self.patchFile}")
         else:
@@ -556,7 +564,7 @@ class Patch:
         line.completName = line.Tokens[4]
         library = line.Tokens[4].split("/")[0]
         if self.Pd4Web.Libraries.isSupportedLibrary(library):
-            self.Pd4Web.Objects.GetSupportedObjects(line.library)
+            self.Pd4Web.Objects.IndexLibrary(line.library)
 
         if self.checkIfIsLibObj(line) and self.checkIfIsSlashObj(line):
             name = line.Tokens[4].split("/")[-1]
@@ -599,7 +607,7 @@ class Patch:
                 line.isExternal = False
 
             # External Object
-            elif name in self.Pd4Web.Objects.GetSupportedObjects(library):
+            elif self.Pd4Web.Objects.IsSupportedObject(library, name):
                 line.isExternal = True
                 line.library = library
                 line.name = line.completName.split("/")[-1]
@@ -659,7 +667,7 @@ class Patch:
             line.name = line.completName
             line.isExternal = False
         else:
-            if line.completName in self.Pd4Web.Objects.GetSupportedObjects("pure-data"):
+            if self.Pd4Web.Objects.IsSupportedObject("pure-data", line.completName):
                 line.name = line.completName
                 line.isExternal = False
             elif line.completName in self.localAbstractions:
@@ -701,7 +709,7 @@ class Patch:
                 self.Pd4Web.exception(msg)
 
         if self.Pd4Web.Libraries.isSupportedLibrary(line.library):
-            self.Pd4Web.Objects.GetSupportedObjects(line.library)
+            self.Pd4Web.Objects.IndexLibrary(line.library)
             if line.library not in self.Pd4Web.declaredLibsObjs:
                 self.Pd4Web.declaredLibsObjs.append(line.library)
             if line.library not in self.Pd4Web.declaredPaths:
@@ -709,14 +717,14 @@ class Patch:
 
         self.searchForGuiObject(line)
         self.searchForSpecialObject(line)
-        self.patchLinesProcessed.append(line)
+        self.objectFunctions[(line.library, line.name)] = line.functionName
+        self.objectCount += 1
         self.addUsedObject(line)
 
     def addUsedObject(self, PatchLine: PatchLine):
-        if (
-            not any(obj["Lib"] == PatchLine.library and obj["Obj"] == PatchLine.name for obj in self.Pd4Web.usedObjects)
-            and PatchLine.isExternal
-        ):
+        key = (PatchLine.library, PatchLine.name)
+        if PatchLine.isExternal and key not in self.Pd4Web.usedObjectsKeys:
+            self.Pd4Web.usedObjectsKeys.add(key)
             self.Pd4Web.usedObjects.append(
                 {
                     "Lib": PatchLine.library,
@@ -726,7 +734,7 @@ class Patch:
             )
 
     def __str__(self):
-        return f"< Patch: {os.path.basename(self.patchFile)} | {len(self.patchLinesProcessed)} objects >"
+        return f"< Patch: {os.path.basename(self.patchFile)} | {self.objectCount} objects >"
 
     def __repr__(self):
         return self.__str__()
@@ -2,16 +2,10 @@ import argparse
 import os
 import sys
 import subprocess
-import pygit2
-import requests
 
 import shutil
 import importlib.metadata as importlib_metadata
 
-import certifi
-
-os.environ["SSL_CERT_FILE"] = certifi.where()
-
 
 class Pd4Web:
     # Paths
@@ -27,9 +21,22 @@ class Pd4Web:
     PD_VERSION: str = "0.55-0"
     EMSDK_VERSION: str = "3.1.68"
     DEBUG: bool = False
+    FETCH_JOBS: int = 4
+    MIRROR: str = ""
+    MIRROR_ONLY: bool = False
+    MATERIALIZE: str = "copy"
+    MATERIALIZE_USED_ONLY: bool = False
+    PATCH_GRAPH: bool = False
+    TRACE: str = ""
+    SERVE_PORT: int = 8091
 
     # Compiler
     MEMORY_SIZE: int = 256
+    BUILD_JOBS: int = 0
+    COMPILER_CACHE: str = "auto"
+    ARCHIVE_CACHE: bool = True
+    RELEASE_FLAGS: str = "-O3 -flto -pthread -matomics -mbulk-memory -msimd128"
+    DEBUG_FLAGS: str = "-g"
 
     # Audio
     OUTCHS_COUNT: int = 0
@@ -45,11 +52,22 @@ class Pd4Web:
     MIDI: bool = False
 
     def __init__(self, Patch=""):
+        from .Trace import Tracer
+
         self.Patch = Patch
         self.verbose = False
+        self.Tracer: Tracer = Tracer(self)
 
-    def argParse(self):
+    def argParse(self, argv=None):
         print()
+        if argv is None:
+            argv = sys.argv[1:]
+        if len(argv) > 0 and argv[0] == "build-many":
+            from .Batch import BatchBuilder
+
+            BatchBuilder(self).argParse(argv[1:])
+            return
+
         parser = argparse.ArgumentParser(
             description="Compile Pure Data externals for the web.",
             usage="pd4web.py <PureData Patch>",
@@ -59,7 +77,7 @@ class Pd4Web:
         self.options_flags(parser)
         self.dev_flags(parser)
 
-        parser = parser.parse_args()
+        parser = parser.parse_args(argv)
 
         self.getMainPaths()
         self.do_actions(parser)
@@ -70,7 +88,18 @@ class Pd4Web:
         if not os.path.isfile(self.Patch):
             self.exception("\n\nError: Patch file not found")
 
-        # default values
+        self.ApplyOptions(self.Parser)
+        self.Execute()
+        if self.Parser.watch:
+            from .Watch import PatchWatcher
+
+            PatchWatcher(self).Watch()
+
+    def ApplyOptions(self, parser):
+        """
+        Set the options of options_flags and dev_flags from the parsed arguments.
+        """
+        self.Parser = parser
         self.verbose = self.Parser.verbose
         self.MEMORY_SIZE = self.Parser.initial_memory
         self.PATCH_ZOOM = self.Parser.patch_zoom
@@ -80,26 +109,24 @@ class Pd4Web:
         self.BYPASS_UNSUPPORTED = self.Parser.bypass_unsupported
         self.TEMPLATE = self.Parser.template
         self.DEBUG = self.Parser.debug
-
-        self.Execute()
+        self.MATERIALIZE = self.Parser.materialize
+        self.MATERIALIZE_USED_ONLY = self.Parser.materialize_used_only
+        self.COMPILER_CACHE = self.Parser.compiler_cache
+        self.ARCHIVE_CACHE = not self.Parser.no_archive_cache
+        self.PATCH_GRAPH = self.Parser.patch_graph
+        self.TRACE = os.path.abspath(self.Parser.trace) if self.Parser.trace else ""
+        self.MIRROR = self.Parser.mirror
+        self.MIRROR_ONLY = self.Parser.mirror_only
 
     def InitVariables(self):
-        from .Objects import Objects
+        from .Objects import Objects, ObjectIndex
+        from .Cache import SymbolCache
+        from .Fetch import GitFetcher
         from .Libraries import ExternalLibraries
-
+        from .Materialize import SourceMaterializer
+        from .Archives import ArchiveCache
         self.cpuCores = os.cpu_count()
-        self.usedObjects = []
-        self.patchLinesProcessed = []
-        self.uiReceiversSymbol = []
-        self.externalsSourceCode = []
-        self.externalsLinkLibraries = []
-        self.externalsLinkLibrariesFolders = []
-        self.externalsSetupFunctions = []
-
-        self.declaredLocalAbs = []
-        self.declaredLibsObjs = []
-        self.declaredPaths = []
-        self.processedAbs = []
+        self.InitPatchVariables()
 
         # Versions
         self.Version = {}
@@ -109,8 +136,18 @@ class Pd4Web:
         self.Version["pd4web"] = importlib_metadata.version("pd4web")
         self.Version["externals"] = {}
 
+        # certificates for pygit2 and the downloads of emsdk, set here to keep `pd4web --version` fast
+        import certifi
+
+        os.environ["SSL_CERT_FILE"] = certifi.where()
+
+        self.Fetcher: GitFetcher = GitFetcher(self)
+        self.Materializer: SourceMaterializer = SourceMaterializer(self)
         self.Libraries: ExternalLibraries = ExternalLibraries(self)
+        self.SymbolCache: SymbolCache = SymbolCache(self)
+        self.ObjectIndex: ObjectIndex = ObjectIndex(self)
         self.Objects: Objects = Objects(self)
+        self.Archives: ArchiveCache = ArchiveCache(self)
 
         self.env = os.environ.copy()
         python_dir = os.path.dirname(sys.executable)
@@ -124,16 +161,49 @@ class Pd4Web:
         if sys.platform == "darwin":
             self.env["PATH"] += ":/bin:/usr/bin"
 
-    def Execute(self):
-        from .Builder import GetAndBuildExternals
-        from .Compilers import ExternalsCompiler
-        from .Patch import Patch
+    def InitPatchVariables(self):
+        """
+        State filled while the patch is processed, reset before the patch is processed again by --watch.
+        """
+        self.usedObjects = []
+        # (library, object) of usedObjects, usedObjects keeps the order of externals.cpp
+        self.usedObjectsKeys = set()
+        self.patchLinesProcessed = []
+        self.uiReceiversSymbol = []
+        self.externalsSourceCode = []
+        self.externalsLinkLibraries = []
+        self.externalsLinkLibrariesFolders = []
+        self.externalsSetupFunctions = []
+
+        self.declaredLocalAbs = []
+        # {folder: {name: [paths]}} of the local folders of [declare -path]
+        self.declaredLocalFolders = {}
+        self.declaredLibsObjs = []
+        self.declaredPaths = []
+        # abstractions already processed, a dict to keep the order with constant time lookups
+        self.processedAbs = {}
+
+        from .Graph import PatchGraph
 
+        self.PatchGraph: PatchGraph = PatchGraph(self)
+
+    def Execute(self):
         if self.Patch == "":
             self.exception("You must set a patch file")
 
         self.getMainPaths()
         self.InitVariables()
+        try:
+            self.Run()
+        finally:
+            self.Tracer.Save()
+
+    def Run(self):
+        """
+        Fetch, process and build the patch, the paths and the variables must be already initialized.
+        """
+        from .Builder import GetAndBuildExternals
+        from .Patch import Patch
 
         # ╭──────────────────────────────────────╮
         # │    NOTE: Sobre a recursivade para    │
@@ -143,14 +213,15 @@ class Pd4Web:
         # ╰──────────────────────────────────────╯
 
         # ───────────── Init Classes ─────────────
-        self.GetPdSourceCode()
-        self.Compiler = ExternalsCompiler(self)
+        with self.Tracer.Span("FetchSources"):
+            self.FetchSources()
 
         # ──────────── Process Patch ──────────
         self.ProcessedPatch: Patch = Patch(self)  # Recursively in case of Abstraction
 
         # ──────────── Build Externals ──────────
-        self.ExternalsBuilder = GetAndBuildExternals(self)
+        with self.Tracer.Span("GetAndBuildExternals"):
+            self.ExternalsBuilder = GetAndBuildExternals(self)
 
         # try:
         #     self.PROJECT_GIT = pygit2.Repository(self.PROJECT_ROOT)
@@ -184,40 +255,58 @@ class Pd4Web:
         if not os.path.exists(self.APPDATA):
             os.makedirs(self.APPDATA)
 
-    def GetPdSourceCode(self):
-        if not os.path.exists(self.APPDATA + "/Pd"):
-            self.print("Cloning Pd", color="yellow", silence=self.SILENCE, pd4web=self.PD_EXTERNAL)
-            pd_path = self.APPDATA + "/Pd"
-            pd_git = "https://github.com/pure-data/pure-data"
-            ok = pygit2.clone_repository(pd_git, pd_path)
-            if not ok:
-                self.exception("Failed to clone emsdk")
-
-            libRepo: pygit2.Repository = pygit2.Repository(pd_path)
-            tag_name = Pd4Web.PD_VERSION
-
-            # commit
-            tag_ref = libRepo.references.get(f"refs/tags/{tag_name}")
-            if tag_ref is None:
-                self.exception("Tag ref is None")
-            if isinstance(tag_ref.peel(), pygit2.Tag):
-                commit = tag_ref.peel().target
-            else:
-                commit = tag_ref.peel()
-            libRepo.set_head(commit.id)
-            libRepo.checkout_tree(commit)
-            libRepo.reset(commit.id, pygit2.GIT_RESET_HARD)
+    def FetchSources(self):
+        """
+        Find the libraries used by the patch tree and fetch them, together with Pd and emsdk,
+        in a bounded thread pool before the patch is parsed.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from .Compilers import ExternalsCompiler
 
-        if not os.path.exists(self.PROJECT_ROOT + "/Pd4Web/pure-data"):
-            shutil.copytree(self.APPDATA + "/Pd/src", self.PROJECT_ROOT + "/Pd4Web/pure-data/src")
-            # copy README and LICENSE
-            shutil.copy(self.APPDATA + "/Pd/README.txt", self.PROJECT_ROOT + "/Pd4Web/pure-data/README.txt")
-            shutil.copy(self.APPDATA + "/Pd/LICENSE.txt", self.PROJECT_ROOT + "/Pd4Web/pure-data/LICENSE.txt")
+        libraries = self.Libraries.FindPatchLibraries(self.Patch)
+        libraries = [lib for lib in libraries if lib not in self.Libraries.fetchedLibraries]
+        if len(libraries) > 0:
+            self.print(
+                f"Fetching {', '.join(libraries)}", color="blue", silence=self.SILENCE, pd4web=self.PD_EXTERNAL
+            )
+        with ThreadPoolExecutor(max_workers=max(1, min(3, self.FETCH_JOBS))) as pool:
+            pdSource = pool.submit(self.GetPdSourceCode)
+            compiler = pool.submit(ExternalsCompiler, self)
+            externals = pool.submit(self.Libraries.FetchLibraries, libraries)
+            pdSource.result()
+            self.Compiler = compiler.result()
+            externals.result()
+        self.Fetcher.PrintReport()
+
+    def GetPdSourceCode(self):
+        with self.Tracer.Span("GetPdSourceCode"):
+            if not os.path.exists(self.APPDATA + "/Pd"):
+                self.print("Cloning Pd", color="yellow", silence=self.SILENCE, pd4web=self.PD_EXTERNAL)
+                pd_path = self.APPDATA + "/Pd"
+                pd_git = "https://github.com/pure-data/pure-data"
+                self.Fetcher.Fetch("pure-data", pd_git, pd_path, self.PD_VERSION)
+
+            if not os.path.exists(self.PROJECT_ROOT + "/Pd4Web/pure-data"):
+                self.Materializer.Materialize(
+                    "pure-data",
+                    self.APPDATA + "/Pd/src",
+                    self.PROJECT_ROOT + "/Pd4Web/pure-data/src",
+                    self.PD4WEB_LIBRARIES + "/libpd.cmake",
+                )
+                self.Materializer.PrintReport("pure-data")
+                # copy README and LICENSE
+                shutil.copy(self.APPDATA + "/Pd/README.txt", self.PROJECT_ROOT + "/Pd4Web/pure-data/README.txt")
+                shutil.copy(self.APPDATA + "/Pd/LICENSE.txt", self.PROJECT_ROOT + "/Pd4Web/pure-data/LICENSE.txt")
 
     def Silence(self):
         self.SILENCE = True
 
     def do_actions(self, parser):
+        if parser.serve:
+            from .Server import CompileServer
+
+            CompileServer(self, parser.serve_port).Serve()
+            exit()
         if parser.run_browser:
             self.RunBrowser()
             exit()
@@ -239,24 +328,12 @@ class Pd4Web:
             exit()
 
         if parser.version:
+            from .Version import VersionCheck
 
-            package = "pd4web"
-            response = requests.get(f"https://pypi.org/pypi/{package}/json")
-            data = response.json()
-            latest_version = data["info"]["version"]
-            pd4web_version = importlib_metadata.version("pd4web")
-            # check if the latest version is different from the installed version
-            this_major, this_minor, this_bug = (
-                pd4web_version.split(".")[0],
-                pd4web_version.split(".")[1],
-                pd4web_version.split(".")[2],
-            )
-            pip_major, pip_minor, pip_bug = (
-                latest_version.split(".")[0],
-                latest_version.split(".")[1],
-                latest_version.split(".")[2],
-            )
-            if this_major < pip_major or this_minor < pip_minor or this_bug < pip_bug:
+            versionCheck = VersionCheck(self)
+            latest_version = versionCheck.Latest()
+            pd4web_version = versionCheck.installed
+            if versionCheck.IsOutdated(latest_version):
                 self.print(
                     f"pd4web version {pd4web_version} is outdated. The latest version is {latest_version}, please update",
                     color="yellow",
@@ -293,6 +370,29 @@ class Pd4Web:
             help="Clear the cache before running",
         )
 
+        parser.add_argument(
+            "--serve",
+            required=False,
+            action="store_true",
+            default=False,
+            help="Keep pd4web running and compile the patches sent to http://127.0.0.1:<serve-port>",
+        )
+        parser.add_argument(
+            "--serve-port",
+            required=False,
+            default=self.SERVE_PORT,
+            type=int,
+            help=f"Port used by --serve (default {self.SERVE_PORT})",
+        )
+
+        parser.add_argument(
+            "--watch",
+            required=False,
+            action="store_true",
+            default=False,
+            help="Rebuild the project when the patch, its abstractions, Audios/ or Extras/ change",
+        )
+
         parser.add_argument(
             "--install-emcc",
             required=False,
@@ -338,6 +438,22 @@ class Pd4Web:
             help="Zoom level for the patch (must be a number)",
         )
 
+        parser.add_argument(
+            "--compiler-cache",
+            required=False,
+            default="auto",
+            choices=["auto", "ccache", "sccache", "none"],
+            help="Compiler cache used for emcc, auto uses ccache or sccache when installed",
+        )
+
+        parser.add_argument(
+            "--no-archive-cache",
+            required=False,
+            action="store_true",
+            default=False,
+            help="Always build the externals instead of linking the archives cached by other projects",
+        )
+
         # Debug
         parser.add_argument(
             "--debug",
@@ -373,6 +489,22 @@ class Pd4Web:
             help="Version of the pd4web external being used",
         )
 
+        # Sources
+        parser.add_argument(
+            "--materialize",
+            required=False,
+            default="copy",
+            choices=["auto", "copy", "reflink", "hardlink", "symlink"],
+            help="How Pd and the libraries sources are put in the project, auto tries reflink, hardlink and then copy",
+        )
+        parser.add_argument(
+            "--materialize-used-only",
+            required=False,
+            action="store_true",
+            default=False,
+            help="Only put in the project the C/C++ sources used by the build",
+        )
+
         ## User
         parser.add_argument(
             "--template",
@@ -405,6 +537,34 @@ class Pd4Web:
             action="store_true",
             help="Bypass unsupported objects in libraries",
         )
+        parser.add_argument(
+            "--patch-graph",
+            required=False,
+            default=False,
+            action="store_true",
+            help="Save the graph of the patch and its abstractions in build/patch-graph.dot",
+        )
+        parser.add_argument(
+            "--trace",
+            required=False,
+            default="",
+            type=str,
+            help="Save the time of each stage, fetch, abstraction and subprocess in this file (Chrome trace format)",
+        )
+        parser.add_argument(
+            "--mirror",
+            required=False,
+            default=os.environ.get("PD4WEB_MIRROR", ""),
+            type=str,
+            help="Git mirror roots (paths or urls, separated by commas) tried before GitHub, default $PD4WEB_MIRROR",
+        )
+        parser.add_argument(
+            "--mirror-only",
+            required=False,
+            default=False,
+            action="store_true",
+            help="Fetch Pd, emsdk and the libraries only from the mirror, for offline builds",
+        )
 
     def print(self, text, color=None, bright=False, silence=False, pd4web=False):
         tab = " " * 4
@@ -0,0 +1,298 @@
+import os
+import sys
+import json
+import time
+import secrets
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import importlib.metadata as importlib_metadata
+
+from .Pd4Web import Pd4Web
+
+
+class JobOutput:
+    """
+    Replaces sys.stdout while a job runs, every line is sent to the client as one chunk.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.buffer = ""
+        self.closed = False
+
+    def write(self, text: str):
+        self.buffer += text
+        while "\n" in self.buffer:
+            line, self.buffer = self.buffer.split("\n", 1)
+            self.send(line + "\n")
+        return len(text)
+
+    def flush(self):
+        if self.buffer != "":
+            self.send(self.buffer)
+            self.buffer = ""
+
+    def send(self, text: str):
+        if self.closed:
+            return
+        try:
+            self.handler.writeChunk(text)
+        except OSError:
+            # the client is gone (for example, the compilation was canceled in Pd), the job keeps running
+            self.closed = True
+
+    def isatty(self) -> bool:
+        return False
+
+
+class CompileServer:
+    """
+    Long-lived `pd4web --serve` process used by the [pd4web] Pd external.
+
+    The server listens on localhost and runs one compile job at a time (the jobs change the working
+    directory), others wait their turn. Imports, the parsed Libraries.yaml, the symbol cache and the
+    toolchain paths stay loaded between jobs.
+
+    Every request must have the token of the session in the `X-Pd4Web-Token` header. The token is
+    PD4WEB_SERVE_TOKEN (set by the Pd external that starts the server) or a random one, and it is
+    written to APPDATA/serve-<port>.token, readable only by the user. Requests from browsers (other
+    Host or any Origin) and POSTs that are not application/json are refused.
+
+    - `GET /version` returns the version of pd4web.
+    - `POST /compile` receives `{"args": [...]}`, the arguments of the command line limited to
+      JOB_FLAGS and the patch, and streams the output of the job. The last line is `PD4WEB_EXIT <code>`.
+    - `POST /stop` stops the server.
+    """
+
+    # flags accepted in the jobs and if they take a value, the ones sent by the Pd external
+    JOB_FLAGS = {
+        "--pd-external": False,
+        "--pd-external-version": True,
+        "-v": False,
+        "--verbose": False,
+        "-m": True,
+        "--initial-memory": True,
+        "-nogui": False,
+        "--nogui": False,
+        "-z": True,
+        "--patch-zoom": True,
+        "--clear": False,
+        "--debug": False,
+        "--template": True,
+    }
+
+    def __init__(self, Pd4Web: Pd4Web, port: int):
+        self.Pd4Web = Pd4Web
+        self.port = port
+        self.lock = threading.Lock()
+        self.jobs = 0
+        self.httpd = None
+        self.token = os.environ.pop("PD4WEB_SERVE_TOKEN", "") or secrets.token_hex(16)
+        self.tokenFile = ""
+
+    def __repr__(self) -> str:
+        return f"<COMPILE_SERVER | Port: {self.port} | Jobs: {self.jobs}>"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+    def jobPatches(self, args: list):
+        """
+        Indexes of the positional arguments of `args` and the first flag that is not accepted.
+        """
+        patches = []
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            if arg in self.JOB_FLAGS:
+                if self.JOB_FLAGS[arg] and i + 1 >= len(args):
+                    return patches, arg
+                i += 2 if self.JOB_FLAGS[arg] else 1
+                continue
+            if arg.startswith("-") or arg == "build-many":
+                return patches, arg
+            patches.append(i)
+            i += 1
+        return patches, ""
+
+    def CheckJobArgs(self, args: list) -> str:
+        """
+        Return why the job `args` is refused, or "" when it is a compilation of one patch.
+        """
+        patches, flag = self.jobPatches(args)
+        if flag != "":
+            return f"{flag} is not accepted by pd4web --serve"
+        if len(patches) != 1 or not args[patches[0]].endswith(".pd"):
+            return "Expected the path of one .pd patch"
+        return ""
+
+    def SaveToken(self):
+        """
+        Write the token to APPDATA/serve-<port>.token, readable and writable only by the user.
+        """
+        self.tokenFile = os.path.join(self.Pd4Web.APPDATA, f"serve-{self.port}.token")
+        if os.path.exists(self.tokenFile):
+            os.remove(self.tokenFile)
+        fd = os.open(self.tokenFile, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as file:
+            file.write(self.token)
+
+    def WarmUp(self):
+        """
+        Import the modules used by the jobs and parse Libraries.yaml before the first job.
+        """
+        from . import Builder, Patch, Objects, Compilers  # noqa: F401
+        from .Libraries import ExternalLibraries
+
+        self.Pd4Web.PROJECT_ROOT = os.getcwd()
+        ExternalLibraries(self.Pd4Web)
+
+    def Listen(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                return
+
+            def writeChunk(self, text: str):
+                data = text.encode("utf-8")
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def sendText(self, status: int, text: str):
+                data = text.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "text/plain; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def refused(self, post: bool) -> bool:
+                """
+                Send an error and return True when the request doesn't come from a client of this session.
+                """
+                hosts = [f"127.0.0.1:{server.port}", f"localhost:{server.port}"]
+                origin = self.headers.get("Origin")
+                if self.headers.get("Host") not in hosts or (origin is not None and origin[7:] not in hosts):
+                    self.sendText(403, "Forbidden host or origin\n")
+                elif not secrets.compare_digest(self.headers.get("X-Pd4Web-Token", ""), server.token):
+                    self.sendText(403, "Invalid token\n")
+                elif post and self.headers.get_content_type() != "application/json":
+                    self.sendText(415, "Expected application/json\n")
+                else:
+                    return False
+                self.close_connection = True
+                return True
+
+            def do_GET(self):
+                if self.refused(post=False):
+                    return
+                if self.path == "/version":
+                    self.sendText(200, f"pd4web version {importlib_metadata.version('pd4web')}\n")
+                else:
+                    self.sendText(404, "Not found\n")
+
+            def do_POST(self):
+                if self.refused(post=True):
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length) if length > 0 else b""
+                if self.path == "/stop":
+                    self.sendText(200, "Stopping\n")
+                    threading.Thread(target=server.httpd.shutdown, daemon=True).start()
+                elif self.path == "/compile":
+                    try:
+                        args = json.loads(body.decode("utf-8"))["args"]
+                        if not isinstance(args, list):
+                            raise ValueError
+                    except (ValueError, KeyError, TypeError):
+                        self.sendText(400, 'Expected {"args": [...]}\n')
+                        return
+                    args = [str(arg) for arg in args]
+                    error = server.CheckJobArgs(args)
+                    if error != "":
+                        self.sendText(400, error + "\n")
+                        return
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; charset=utf-8")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    code = server.RunJob(args, self)
+                    try:
+                        self.writeChunk(f"PD4WEB_EXIT {code}\n")
+                        self.wfile.write(b"0\r\n\r\n")
+                    except OSError:
+                        pass
+                else:
+                    self.sendText(404, "Not found\n")
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+
+    def Serve(self):
+        self.WarmUp()
+        try:
+            self.Listen()
+        except OSError as e:
+            self.Pd4Web.exception(f"pd4web server could not listen on port {self.port}: {e}")
+        self.Pd4Web.print(
+            f"pd4web server listening on http://127.0.0.1:{self.port}",
+            color="green",
+            silence=self.Pd4Web.SILENCE,
+            pd4web=self.Pd4Web.PD_EXTERNAL,
+        )
+        self.SaveToken()
+        try:
+            self.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.httpd.server_close()
+            if os.path.exists(self.tokenFile):
+                os.remove(self.tokenFile)
+
+    def RunJob(self, args: list, handler) -> int:
+        """
+        Run one compilation with the command line `args`, returns its exit code.
+        """
+        output = JobOutput(handler)
+        if self.lock.locked():
+            output.write("Waiting for the running compilation...\n")
+        with self.lock:
+            self.jobs += 1
+            cwd = os.getcwd()
+            stdout = sys.stdout
+            start = time.perf_counter()
+            sys.stdout = output
+            code = 0
+            try:
+                # the job runs in the folder of the patch, --clear removes the build of this project
+                index = self.jobPatches(args)[0][0]
+                args = args[:index] + [os.path.abspath(args[index])] + args[index + 1 :]
+                if os.path.isdir(os.path.dirname(args[index])):
+                    os.chdir(os.path.dirname(args[index]))
+                job = Pd4Web()
+                job.argParse(args)
+            except SystemExit as e:
+                if isinstance(e.code, int):
+                    code = e.code
+                elif e.code is not None:
+                    print(e.code)
+                    code = 1
+            except Exception as e:
+                print(f"ERROR: {e}")
+                code = 1
+            finally:
+                output.flush()
+                sys.stdout = stdout
+                os.chdir(cwd)
+            self.Pd4Web.print(
+                f"Job {self.jobs} finished with code {code} in {time.perf_counter() - start:.2f}s",
+                color="blue",
+                silence=self.Pd4Web.SILENCE,
+            )
+            return code
@@ -0,0 +1,152 @@
+import os
+import sys
+import json
+import time
+import threading
+import subprocess
+from contextlib import contextmanager
+
+from .Pd4Web import Pd4Web
+from .Helpers import TmpPath
+
+
+class Tracer:
+    """
+    Spans of the build saved by `--trace <file>` (Pd4Web.TRACE) in the Chrome trace event format, to be
+    opened in chrome://tracing or https://ui.perfetto.dev. Spans of the same thread are nested by their
+    times. Without --trace, Span only runs the code inside it.
+    """
+
+    def __init__(self, Pd4Web: Pd4Web):
+        self.Pd4Web = Pd4Web
+        self.events = []
+        self.threads = {}
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+
+    def __repr__(self) -> str:
+        return f"<TRACER | Events: {len(self.events)}>"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+    @contextmanager
+    def Span(self, name: str, category: str = "stage", **args):
+        """
+        Record the time spent in the `with` block. The yielded dict are the arguments of the span, the
+        code inside the block can add to it (bytes read or written, cache hit or miss...).
+        """
+        if self.Pd4Web.TRACE == "":
+            yield args
+            return
+        start = time.perf_counter()
+        try:
+            yield args
+        except BaseException as e:
+            args["error"] = type(e).__name__
+            raise
+        finally:
+            self.addEvent(name, category, start, time.perf_counter(), args)
+
+    def addEvent(self, name: str, category: str, start: float, end: float, args: dict):
+        thread = threading.current_thread()
+        with self.lock:
+            self.threads[thread.ident] = thread.name
+            self.events.append(
+                {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "ts": round((start - self.start) * 1e6, 1),
+                    "dur": round((end - start) * 1e6, 1),
+                    "pid": os.getpid(),
+                    "tid": thread.ident,
+                    "args": dict(args),
+                }
+            )
+
+    def commandName(self, command):
+        if isinstance(command, str):
+            commandLine = command
+            name = os.path.basename(command.split()[0]) if command.strip() != "" else command
+        else:
+            commandLine = " ".join(str(arg) for arg in command)
+            name = " ".join(os.path.basename(str(arg)) for arg in command[:2])
+        return name, commandLine
+
+    def hasFileno(self, stream) -> bool:
+        try:
+            stream.fileno()
+            return True
+        except (AttributeError, OSError, ValueError):
+            return False
+
+    def Run(self, command, **kwargs) -> subprocess.CompletedProcess:
+        """
+        subprocess.run(command, **kwargs) recorded as a "subprocess" span. When sys.stdout is not a file
+        (the client stream of `pd4web --serve`), the output of the command is written to it.
+        """
+        if not self.hasFileno(sys.stdout) and not kwargs.get("capture_output") and "stdout" not in kwargs:
+            kwargs.pop("text", None)
+            returncode = self.Stream(command, print, **kwargs)
+            return subprocess.CompletedProcess(command, returncode)
+        name, commandLine = self.commandName(command)
+        with self.Span(name, "subprocess", command=commandLine) as span:
+            result = subprocess.run(command, **kwargs)
+            span["returncode"] = result.returncode
+        return result
+
+    def Stream(self, command, onLine, **kwargs) -> int:
+        """
+        Run `command` recorded as a "subprocess" span, calling `onLine` with each line of its output (stdout
+        and stderr) as soon as it is written. Returns the return code.
+        """
+        name, commandLine = self.commandName(command)
+        with self.Span(name, "subprocess", command=commandLine) as span:
+            process = subprocess.Popen(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                stdin=subprocess.DEVNULL,
+                text=True,
+                errors="replace",
+                bufsize=1,
+                **kwargs,
+            )
+            with process:
+                for line in process.stdout:
+                    onLine(line.rstrip("\r\n"))
+            span["returncode"] = process.returncode
+        return process.returncode
+
+    def Save(self):
+        """
+        Write all the spans recorded until now to the trace file.
+        """
+        traceFile = self.Pd4Web.TRACE
+        if traceFile == "":
+            return
+        with self.lock:
+            events = list(self.events)
+            threads = dict(self.threads)
+        pid = os.getpid()
+        metadata = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "pd4web"}}]
+        for tid, name in threads.items():
+            metadata.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}})
+        trace = {
+            "traceEvents": metadata + events,
+            "displayTimeUnit": "ms",
+            "otherData": {"patch": self.Pd4Web.Patch, "versions": getattr(self.Pd4Web, "Version", {})},
+        }
+
+        os.makedirs(os.path.dirname(os.path.abspath(traceFile)), exist_ok=True)
+        tmpFile = TmpPath(traceFile)
+        with open(tmpFile, "w") as file:
+            json.dump(trace, file)
+        os.replace(tmpFile, traceFile)
+        self.Pd4Web.print(
+            f"Trace saved in {traceFile} ({len(events)} spans)",
+            color="blue",
+            silence=self.Pd4Web.SILENCE,
+            pd4web=self.Pd4Web.PD_EXTERNAL,
+        )
@@ -0,0 +1,119 @@
+import os
+import re
+import sys
+import json
+import time
+import subprocess
+import importlib.metadata as importlib_metadata
+
+from .Pd4Web import Pd4Web
+from .Helpers import TmpPath
+
+# run by VersionCheck.Refresh in a detached process, with the cache file and the url as arguments
+REFRESH_SCRIPT = """
+import os, sys, json, time, urllib.request
+try:
+    import certifi
+    os.environ["SSL_CERT_FILE"] = certifi.where()
+except ImportError:
+    pass
+cacheFile, url = sys.argv[1], sys.argv[2]
+try:
+    with open(cacheFile) as file:
+        cached = json.load(file)
+except (OSError, ValueError):
+    cached = {}
+try:
+    with urllib.request.urlopen(url, timeout=10) as response:
+        cached["latest"] = json.load(response)["info"]["version"]
+except Exception:
+    pass
+cached["checked"] = time.time()
+tmpFile = f"{cacheFile}.{os.getpid()}.tmp"
+with open(tmpFile, "w") as file:
+    json.dump(cached, file)
+os.replace(tmpFile, cacheFile)
+"""
+
+
+def VersionKey(version: str) -> tuple:
+    """
+    Key to compare versions, "2.3.0.dev1" < "2.3.0" == "2.3" < "2.3.1".
+    """
+    match = re.match(r"\d+(\.\d+)*", version)
+    if match is None:
+        return (), 0
+    release = [int(number) for number in match.group().split(".")]
+    while len(release) > 1 and release[-1] == 0:
+        release.pop()
+    return tuple(release), int(match.end() == len(version))
+
+
+class VersionCheck:
+    """
+    Compare the installed pd4web with the last version published on PyPI.
+
+    `pd4web --version` runs each time a patch with [pd4web] is opened, so it never waits for PyPI: it
+    uses the version saved in APPDATA/Cache/pypi.json and, when it is older than TTL, a detached
+    process asks PyPI again for the next run.
+    """
+
+    URL = "https://pypi.org/pypi/pd4web/json"
+    TTL = 24 * 60 * 60
+    # a refresh started less than RETRY seconds ago is still running (or PyPI is not reachable)
+    RETRY = 10 * 60
+
+    def __init__(self, Pd4Web: Pd4Web):
+        self.Pd4Web = Pd4Web
+        self.cacheFile = os.path.join(Pd4Web.APPDATA, "Cache", "pypi.json")
+        self.installed = importlib_metadata.version("pd4web")
+
+    def __repr__(self) -> str:
+        return f"<VERSION_CHECK | Installed: {self.installed}>"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+    def cached(self) -> dict:
+        try:
+            with open(self.cacheFile, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def Refresh(self, cached: dict):
+        """
+        Start the process that saves the latest version of PyPI in the cache file, without waiting for it.
+        """
+        cached = dict(cached, started=time.time())
+        os.makedirs(os.path.dirname(self.cacheFile), exist_ok=True)
+        tmpFile = TmpPath(self.cacheFile)
+        with open(tmpFile, "w") as file:
+            json.dump(cached, file)
+        os.replace(tmpFile, self.cacheFile)
+
+        if sys.platform == "win32":
+            detach = {"creationflags": subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            detach = {"start_new_session": True}
+        subprocess.Popen(
+            [sys.executable, "-c", REFRESH_SCRIPT, self.cacheFile, self.URL],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            close_fds=True,
+            **detach,
+        )
+
+    def Latest(self):
+        """
+        Last version seen on PyPI (None if it was never checked), refreshed in background when older than TTL.
+        """
+        cached = self.cached()
+        now = time.time()
+        if now - cached.get("checked", 0) > self.TTL and now - cached.get("started", 0) > self.RETRY:
+            self.Refresh(cached)
+        return cached.get("latest")
+
+    def IsOutdated(self, latest) -> bool:
+        return latest is not None and VersionKey(latest) > VersionKey(self.installed)
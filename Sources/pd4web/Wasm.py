@@ -0,0 +1,158 @@
+import os
+import json
+
+from .Pd4Web import Pd4Web
+
+WASM_MAGIC = b"\0asm"
+CODE_SECTION = 10
+DATA_SECTION = 11
+
+
+def ArchiveMembers(data: bytes):
+    """
+    Yield (name, content) of the members of a static library (ar format, GNU and BSD names).
+    """
+    if not data.startswith(b"!<arch>\n"):
+        return
+    longNames = b""
+    position = 8
+    while position + 60 <= len(data):
+        header = data[position : position + 60]
+        name = header[:16].decode(errors="replace").strip()
+        size = int(header[48:58].decode().strip() or 0)
+        content = data[position + 60 : position + 60 + size]
+        position += 60 + size + (size % 2)
+        if name == "//":
+            longNames = content
+            continue
+        if name in ["/", "/SYM64/", "__.SYMDEF", "__.SYMDEF SORTED"]:
+            continue
+        if name.startswith("#1/"):
+            nameSize = int(name[3:])
+            name = content[:nameSize].decode(errors="replace").rstrip("\0")
+            content = content[nameSize:]
+        elif name.startswith("/") and name[1:].isdigit():
+            offset = int(name[1:])
+            name = longNames[offset : longNames.find(b"\n", offset)].decode(errors="replace")
+        yield name.rstrip("/"), content
+
+
+def readLEB128(data: bytes, position: int):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if byte & 0x80 == 0:
+            return result, position
+        shift += 7
+
+
+def WasmSections(data: bytes) -> dict:
+    """
+    {section id: size} of a wasm module or object file, empty if `data` is not wasm.
+    """
+    if not data.startswith(WASM_MAGIC):
+        return {}
+    sections = {}
+    position = 8
+    while position < len(data):
+        sectionId = data[position]
+        size, position = readLEB128(data, position + 1)
+        sections[sectionId] = sections.get(sectionId, 0) + size
+        position += size
+    return sections
+
+
+class ExternalsSizeReport:
+    """
+    Size of the code and data of each external linked in pd4web.wasm.
+
+    The sizes come from the wasm objects in the static library of each external, before the linker removes
+    the functions that are never called, so they are an upper bound of what each external adds to the download.
+    """
+
+    def __init__(self, Pd4Web: Pd4Web):
+        self.Pd4Web = Pd4Web
+        self.PROJECT_ROOT = Pd4Web.PROJECT_ROOT
+        self.targetsFile = os.path.join(self.PROJECT_ROOT, "build", "externals.txt")
+        self.reportFile = os.path.join(self.PROJECT_ROOT, "build", "externals-size.json")
+
+    def __repr__(self) -> str:
+        return f"<EXTERNALS_SIZE_REPORT | {self.reportFile}>"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+    def CMakeLines(self, targets: dict) -> list:
+        """
+        CMake lines that write, at generation time, the static library of each external, `targets` is
+        {target: library}.
+        """
+        if len(targets) == 0:
+            return []
+        content = "".join(f"{library}/{target}=$<TARGET_FILE:{target}>\\n" for target, library in targets.items())
+        return [f'file(GENERATE OUTPUT "${{CMAKE_BINARY_DIR}}/externals.txt" CONTENT "{content}")']
+
+    def archiveSize(self, archive: str) -> dict:
+        size = {"code": 0, "data": 0, "archive": 0}
+        if not os.path.isfile(archive):
+            return size
+        with open(archive, "rb") as file:
+            data = file.read()
+        size["archive"] = len(data)
+        for _, content in ArchiveMembers(data):
+            sections = WasmSections(content)
+            size["code"] += sections.get(CODE_SECTION, 0)
+            size["data"] += sections.get(DATA_SECTION, 0)
+        return size
+
+    def Collect(self) -> list:
+        """
+        Sizes of the externals of the last build, the biggest first.
+        """
+        if not os.path.exists(self.targetsFile):
+            return []
+        with open(self.targetsFile, "r") as file:
+            lines = file.read().splitlines()
+        externals = []
+        for line in lines:
+            name, _, archive = line.partition("=")
+            library, _, target = name.partition("/")
+            if target == "":
+                continue
+            external = {"library": library, "target": target}
+            external.update(self.archiveSize(archive))
+            externals.append(external)
+        externals.sort(key=lambda external: external["code"] + external["data"], reverse=True)
+        return externals
+
+    def Save(self):
+        """
+        Print the sizes and save them in build/externals-size.json.
+        """
+        externals = self.Collect()
+        if len(externals) == 0:
+            return
+        wasmFile = os.path.join(self.PROJECT_ROOT, "WebPatch", "pd4web.wasm")
+        wasmSize = os.path.getsize(wasmFile) if os.path.exists(wasmFile) else 0
+        with open(self.reportFile, "w") as file:
+            json.dump({"wasm": wasmSize, "externals": externals}, file, indent=4)
+
+        self.Pd4Web.print(
+            f"Size of the externals (code + data before linking), pd4web.wasm has {wasmSize / 1024:.1f} KiB",
+            color="blue",
+            silence=self.Pd4Web.SILENCE,
+            pd4web=self.Pd4Web.PD_EXTERNAL,
+        )
+        for external in externals:
+            size = external["code"] + external["data"]
+            share = f"{100 * size / wasmSize:5.1f}%" if wasmSize > 0 else ""
+            name = f"{external['library']}/{external['target']}"
+            self.Pd4Web.print(
+                f"    {name:<32} {size / 1024:8.1f} KiB {share}",
+                color="blue",
+                silence=self.Pd4Web.SILENCE,
+                pd4web=self.Pd4Web.PD_EXTERNAL,
+            )
@@ -0,0 +1,220 @@
+import os
+import time
+import threading
+
+from .Pd4Web import Pd4Web
+
+
+class PatchWatcher:
+    """
+    `pd4web --watch` keeps pd4web running after the first build and rebuilds the project when the main
+    patch, its local abstractions, the local `declare -path` folders, Audios/ or Extras/ change.
+
+    Events come from watchdog (inotify, FSEvents, ReadDirectoryChangesW) when it is installed, otherwise the
+    files are polled. Changes are debounced, and each rebuild only runs the stages that can be affected:
+
+    - When only Audios/ or Extras/ changed, pd4web.data is packaged again.
+    - When a patch changed, the patches are processed again. externals.cpp and CMakeLists.txt are only
+      generated again if the used objects changed, and pd4web.wasm is only linked if its inputs changed.
+    """
+
+    DEBOUNCE: float = 0.3
+    POLL_INTERVAL: float = 0.5
+    IGNORED_FOLDERS = ["Pd4Web", "WebPatch", "build", ".tmp"]
+    GENERATED = [
+        "usedObjects",
+        "externalsSourceCode",
+        "externalsLinkLibraries",
+        "externalsLinkLibrariesFolders",
+        "externalsSetupFunctions",
+    ]
+
+    def __init__(self, Pd4Web: Pd4Web):
+        self.Pd4Web = Pd4Web
+        self.PROJECT_ROOT = Pd4Web.PROJECT_ROOT
+        self.changed = set()
+        self.lastEvent = 0.0
+        self.lock = threading.Lock()
+        self.stop = False
+        self.observer = None
+        self.Rebuilds = 0
+
+    def __repr__(self) -> str:
+        return f"<PATCH_WATCHER | Files: {len(self.WatchedFiles())} | Rebuilds: {self.Rebuilds}>"
+
+    def __str__(self) -> str:
+        return self.__repr__()
+
+    def isLocal(self, path: str) -> bool:
+        relPath = os.path.relpath(path, self.PROJECT_ROOT)
+        if relPath.startswith(".."):
+            return False
+        return relPath.split(os.sep)[0] not in self.IGNORED_FOLDERS
+
+    def WatchedFolders(self) -> list:
+        """
+        Folders of the project where every file is watched.
+        """
+        folders = []
+        for folder in ["Audios", "Extras"]:
+            folders.append(os.path.join(self.PROJECT_ROOT, folder))
+        for path in self.Pd4Web.declaredPaths:
+            folder = os.path.join(self.PROJECT_ROOT, path)
+            if os.path.isdir(folder) and self.isLocal(folder):
+                folders.append(os.path.abspath(folder))
+        return list(dict.fromkeys(folders))
+
+    def WatchedFiles(self) -> list:
+        """
+        The main patch and its local abstractions.
+        """
+        files = [os.path.abspath(self.Pd4Web.Patch)]
+        for patch in self.Pd4Web.processedAbs:
+            if self.isLocal(patch):
+                files.append(os.path.abspath(patch))
+        return list(dict.fromkeys(files))
+
+    def Snapshot(self) -> dict:
+        """
+        {file: (mtime, size)} of all watched files, used by the polling fallback.
+        """
+        snapshot = {}
+        files = self.WatchedFiles()
+        for folder in self.WatchedFolders():
+            for root, dirs, names in os.walk(folder):
+                dirs[:] = [d for d in dirs if not d.startswith(".")]
+                files += [os.path.join(root, name) for name in names]
+        for file in files:
+            try:
+                stat = os.stat(file)
+                snapshot[file] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                snapshot[file] = None
+        return snapshot
+
+    def isWatched(self, path: str) -> bool:
+        path = os.path.abspath(path)
+        if path in self.WatchedFiles():
+            return True
+        return any(path.startswith(folder + os.sep) for folder in self.WatchedFolders())
+
+    def AddChange(self, path: str):
+        if os.path.basename(path).startswith(".") or path.endswith("~"):
+            return
+        with self.lock:
+            self.changed.add(os.path.abspath(path))
+            self.lastEvent = time.monotonic()
+
+    def TakeChanges(self) -> set:
+        """
+        Return the changed files once no new event arrived for DEBOUNCE seconds.
+        """
+        with self.lock:
+            if len(self.changed) == 0 or time.monotonic() - self.lastEvent < self.DEBOUNCE:
+                return set()
+            changed = self.changed
+            self.changed = set()
+            return changed
+
+    def startObserver(self) -> bool:
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return False
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    return
+                for path in [event.src_path, getattr(event, "dest_path", "")]:
+                    if path != "" and watcher.isWatched(path):
+                        watcher.AddChange(path)
+
+        self.observer = Observer()
+        # abstractions can be anywhere in the project, the handler filters the events
+        self.observer.schedule(Handler(), self.PROJECT_ROOT, recursive=True)
+        self.observer.start()
+        return True
+
+    def Watch(self):
+        usingEvents = self.startObserver()
+        method = "file system events" if usingEvents else "polling (install watchdog to use file system events)"
+        self.Pd4Web.print(
+            f"Watching {len(self.WatchedFiles())} patches and {len(self.WatchedFolders())} folders using {method}, "
+            "press Ctrl+C to stop",
+            color="blue",
+            silence=self.Pd4Web.SILENCE,
+            pd4web=self.Pd4Web.PD_EXTERNAL,
+        )
+        snapshot = self.Snapshot()
+        try:
+            while not self.stop:
+                time.sleep(self.DEBOUNCE / 3 if usingEvents else self.POLL_INTERVAL)
+                if not usingEvents:
+                    newSnapshot = self.Snapshot()
+                    for file in set(snapshot) | set(newSnapshot):
+                        if snapshot.get(file) != newSnapshot.get(file):
+                            self.AddChange(file)
+                    snapshot = newSnapshot
+                changed = self.TakeChanges()
+                if len(changed) > 0:
+                    self.Rebuild(changed)
+                    snapshot = self.Snapshot()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self.observer is not None:
+                self.observer.stop()
+                self.observer.join()
+
+    def usedObjectsKey(self) -> list:
+        return sorted((obj["Lib"], obj["Obj"]) for obj in self.Pd4Web.usedObjects)
+
+    def Rebuild(self, changed: set):
+        """
+        Run again the stages affected by the `changed` files.
+        """
+        from .Patch import Patch
+        from .Builder import GetAndBuildExternals
+
+        names = ", ".join(sorted(os.path.relpath(file, self.PROJECT_ROOT) for file in changed))
+        self.Pd4Web.print(
+            f"Changed: {names}",
+            color="blue",
+            silence=self.Pd4Web.SILENCE,
+            pd4web=self.Pd4Web.PD_EXTERNAL,
+        )
+        start = time.perf_counter()
+        patchChanged = any(file.endswith(".pd") for file in changed)
+        try:
+            with self.Pd4Web.Tracer.Span("Rebuild", changed=names):
+                if patchChanged:
+                    usedObjects = self.usedObjectsKey()
+                    # filled by GetAndBuildExternals.Generate, kept when the same objects are used
+                    generated = {name: getattr(self.Pd4Web, name) for name in self.GENERATED}
+                    self.Pd4Web.InitPatchVariables()
+                    self.Pd4Web.ProcessedPatch = Patch(self.Pd4Web)
+                    if self.usedObjectsKey() != usedObjects:
+                        self.Pd4Web.ExternalsBuilder = GetAndBuildExternals(self.Pd4Web)
+                    else:
+                        for name, value in generated.items():
+                            setattr(self.Pd4Web, name, value)
+                        self.Pd4Web.ExternalsBuilder.Patch = self.Pd4Web.ProcessedPatch
+                        self.Pd4Web.ExternalsBuilder.Build()
+                else:
+                    self.Pd4Web.ExternalsBuilder.Build()
+        except Exception as e:
+            self.Pd4Web.print(str(e), color="red", silence=False, pd4web=self.Pd4Web.PD_EXTERNAL)
+            return
+        finally:
+            self.Pd4Web.Tracer.Save()
+        self.Rebuilds += 1
+        self.Pd4Web.print(
+            f"Rebuilt in {time.perf_counter() - start:.2f}s, waiting for changes...",
+            color="green",
+            silence=self.Pd4Web.SILENCE,
+            pd4web=self.Pd4Web.PD_EXTERNAL,
+        )
@@ -0,0 +1,66 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Sources"))
+
+from pd4web.Pd4Web import Pd4Web
+from pd4web.Archives import ArchiveCache
+
+LIBRARIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Sources", "Libraries")
+
+
+class ArchiveCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="pd4web-archives-")
+        self.project = os.path.join(self.root, "project")
+        os.makedirs(os.path.join(self.project, "build", "archives"))
+        self.pd4web = Pd4Web(Patch=os.path.join(self.project, "main.pd"))
+        self.pd4web.SILENCE = True
+        self.pd4web.PROJECT_ROOT = self.project
+        self.pd4web.PD4WEB_LIBRARIES = LIBRARIES
+        self.pd4web.APPDATA = os.path.join(self.root, "appdata")
+        self.pd4web.Version = {"externals": {"else": "0" * 40}}
+        self.archives = ArchiveCache(self.pd4web)
+        self.elseCmake = os.path.join(LIBRARIES, "else.cmake")
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_can_cache(self):
+        self.assertTrue(self.archives.CanCache(self.elseCmake, ["knob", "giga.rev_tilde"]))
+        # sfont~ links libfluidsynth
+        self.assertFalse(self.archives.CanCache(self.elseCmake, ["knob", "sfont_tilde"]))
+        # defined in a subdirectory
+        self.assertFalse(self.archives.CanCache(os.path.join(LIBRARIES, "o.scofo~.cmake"), ["o.scofo_tilde"]))
+        # LINK_LIBRARIES fftw3
+        self.assertFalse(self.archives.CanCache(os.path.join(LIBRARIES, "timbreIDLib.cmake"), ["attackTime"]))
+
+    def test_harvest_and_reuse(self):
+        targets = ["knob"]
+        self.assertIsNone(self.archives.CachedTargets("else", self.elseCmake, targets))
+        lines = self.archives.ManifestTargets("else", self.elseCmake, targets)
+        self.assertIn("$<TARGET_FILE:knob>", lines[0])
+
+        # what file(GENERATE) writes after the build
+        archive = os.path.join(self.project, "build", "libknob.a")
+        with open(archive, "w") as f:
+            f.write("archive")
+        with open(os.path.join(self.project, "build", "archives", "else.txt"), "w") as f:
+            f.write(f"knob={archive}\n")
+        self.archives.Harvest()
+
+        cached = self.archives.CachedTargets("else", self.elseCmake, targets)
+        self.assertEqual(list(cached), ["knob"])
+        self.assertTrue(cached["knob"].startswith(self.archives.CACHE_ROOT))
+        self.assertIsNone(self.archives.CachedTargets("else", self.elseCmake, ["knob", "giga.rev_tilde"]))
+
+        # another build type is another entry
+        self.pd4web.DEBUG = True
+        self.assertIsNone(self.archives.CachedTargets("else", self.elseCmake, targets))
+
+
+if __name__ == "__main__":
+    unittest.main()
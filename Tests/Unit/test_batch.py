@@ -0,0 +1,79 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Sources"))
+
+from pd4web.Pd4Web import Pd4Web
+from pd4web.Batch import BatchBuilder
+
+
+class BatchBuilderTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="pd4web-batch-")
+        files = {
+            "abs/abs.pd": "#N canvas 0 0 450 300 12;\n#X obj 10 10 Libs/myabs;\n",
+            "abs/Libs/myabs.pd": "#N canvas 0 0 450 300 12;\n#X obj 10 10 osc~ 440;\n",
+            "vu/vu.pd": "#N canvas 0 0 450 300 12;\n#X obj 10 10 vu 15 160 empty empty -1 -8 0 10 -66577 -1 1 0;\n",
+            "vu/Pd4Web/Externals/else/Abstractions/x.pd": "#N canvas 0 0 450 300 12;\n",
+            "else/a.pd": "#N canvas 0 0 450 300 12;\n",
+            "else/b.pd": "#N canvas 0 0 450 300 12;\n",
+        }
+        for path, content in files.items():
+            os.makedirs(os.path.dirname(os.path.join(self.root, path)), exist_ok=True)
+            with open(os.path.join(self.root, path), "w") as f:
+                f.write(content)
+        pd4web = Pd4Web()
+        pd4web.SILENCE = True
+        self.batch = BatchBuilder(pd4web)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_find_patches(self):
+        patches = self.batch.FindPatches([self.root])
+        names = sorted(os.path.relpath(patch, self.root) for patch in patches)
+        self.assertEqual(names, sorted(["abs/abs.pd", "vu/vu.pd", "else/a.pd", "else/b.pd"]))
+        patches = self.batch.FindPatches([os.path.join(self.root, "else", "*.pd")])
+        self.assertEqual([os.path.basename(patch) for patch in patches], ["a.pd", "b.pd"])
+
+    def test_waves(self):
+        projects = {}
+        used = {"p1": ["else"], "p2": ["else", "cyclone"], "p3": ["cyclone"], "p4": []}
+        for root, libraries in used.items():
+            patch = os.path.join(root, "main.pd")
+            projects[root] = [SimpleNamespace(Patch=patch)]
+            self.batch.Results[patch] = {"libraries": libraries}
+        firstWave, secondWave = self.batch.waves(projects)
+        self.assertEqual(firstWave, ["p2"])
+        self.assertEqual(secondWave, ["p1", "p3", "p4"])
+
+    def test_same_folder_outputs(self):
+        folder = os.path.join(self.root, "else")
+
+        def project(name):
+            def run():
+                os.makedirs(os.path.join(folder, "WebPatch"), exist_ok=True)
+                with open(os.path.join(folder, "WebPatch", "index.pd"), "w") as f:
+                    f.write(name)
+
+            patch = os.path.join(folder, f"{name}.pd")
+            self.batch.Results[patch] = {"status": "waiting", "time": 0.0, "error": "", "output": ""}
+            return SimpleNamespace(Patch=patch, PROJECT_ROOT=folder, Run=run)
+
+        self.batch.Pd4Web.CWD = self.root
+        self.batch.buildGroup([project("a"), project("b")])
+        for name in ["a", "b"]:
+            result = self.batch.Results[os.path.join(folder, f"{name}.pd")]
+            self.assertEqual(result["status"], "ok")
+            self.assertEqual(result["output"], os.path.join(folder, "WebPatch", name))
+            with open(os.path.join(result["output"], "index.pd")) as f:
+                self.assertEqual(f.read(), name)
+        self.assertFalse(os.path.exists(os.path.join(folder, "WebPatch", "b", "a")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Sources"))
+
+from pd4web.CMake import PruneExternals, ParseCMakeCommands, NO_TARGET_COMMANDS
+
+LIBRARIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Sources", "Libraries")
+
+LIBRARY = """pd_add_external(knob Code_source/knob.c)
+pd_add_external(sfont~ Code_source/sfont~.c LINK_LIBRARIES fluidsynth)
+pd_add_external(fluidsynth Code_source/fluid.c)
+pd_add_external(circuit~ Code_source/circuit~.c)
+target_link_libraries(circuit_tilde PRIVATE simulator)
+pd_add_external(simulator Code_source/simulator.c)
+pd_add_external(unused Code_source/unused.c)
+if(WIN32)
+    target_compile_definitions(unused PRIVATE WIN)
+endif()
+set_target_properties(unused PROPERTIES CXX_STANDARD 17)
+"""
+
+
+class PruneExternalsTest(unittest.TestCase):
+    def test_linked_externals(self):
+        text, kept, removed = PruneExternals(LIBRARY, ["knob", "sfont_tilde", "circuit_tilde"])
+        self.assertEqual(kept, ["circuit_tilde", "fluidsynth", "knob", "sfont_tilde", "simulator"])
+        self.assertEqual(removed, ["unused"])
+        self.assertNotIn("unused", text)
+        self.assertIn("if(WIN32)\nendif()\n", text)
+        self.assertIn("target_link_libraries(circuit_tilde PRIVATE simulator)", text)
+
+    def test_nothing_removed(self):
+        targets = ["knob", "sfont_tilde", "fluidsynth", "circuit_tilde", "simulator", "unused"]
+        text, kept, removed = PruneExternals(LIBRARY, targets)
+        self.assertIs(text, LIBRARY)
+        self.assertEqual(removed, [])
+
+    def test_targets_used_by_other_commands(self):
+        library = LIBRARY + "include(GenerateExportHeader)\ngenerate_export_header(unused)\n"
+        library += "set_property(TARGET fluidsynth PROPERTY C_STANDARD 99)\n"
+        text, kept, removed = PruneExternals(library, ["knob"])
+        self.assertIn("unused", kept)
+        self.assertIn("fluidsynth", kept)
+        self.assertIn("pd_add_external(unused Code_source/unused.c)", text)
+
+    def test_libraries(self):
+        # pruned to a single external, no command can still name a removed target
+        for file in sorted(os.listdir(LIBRARIES)):
+            if not file.endswith(".cmake") or not os.path.isfile(os.path.join(LIBRARIES, file)):
+                continue
+            with open(os.path.join(LIBRARIES, file)) as f:
+                library = f.read()
+            externals = [c for c in ParseCMakeCommands(library) if c.name.lower() == "pd_add_external"]
+            keep = [externals[0].args[0].replace("~", "_tilde")] if len(externals) > 0 else []
+            text, kept, removed = PruneExternals(library, keep)
+            for command in ParseCMakeCommands(text):
+                if command.name.lower() in NO_TARGET_COMMANDS:
+                    continue
+                for arg in command.args:
+                    self.assertNotIn(arg, removed, f"{file}: {command} uses a removed target")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,254 @@
+import os
+import sys
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+import unittest
+
+import pygit2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Sources"))
+
+from pd4web.Pd4Web import Pd4Web
+from pd4web.Libraries import ExternalLibraries
+
+
+def git(cwd, *args):
+    env = os.environ.copy()
+    env.update(
+        {
+            "GIT_AUTHOR_NAME": "pd4web",
+            "GIT_AUTHOR_EMAIL": "pd4web@localhost",
+            "GIT_COMMITTER_NAME": "pd4web",
+            "GIT_COMMITTER_EMAIL": "pd4web@localhost",
+        }
+    )
+    result = subprocess.run(["git", *args], cwd=cwd, env=env, capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+
+class LocalRemotesTest(unittest.TestCase):
+    """
+    Local bare repositories stand in for GitHub, every library has a `v1` tag followed by one more commit.
+    """
+
+    LIBRARIES = ["liba", "libb", "libc"]
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="pd4web-fetch-")
+        self.remotes = os.path.join(self.root, "remotes")
+        self.tags = {}
+        self.branches = {}
+        for lib in self.LIBRARIES:
+            work = os.path.join(self.root, "work", lib)
+            os.makedirs(work)
+            git(work, "init", "-q")
+            with open(os.path.join(work, f"{lib}.c"), "w") as f:
+                f.write(f'void {lib}_setup(void) {{ class_new(gensym("{lib}"), 0); }}\n')
+            git(work, "add", "-A")
+            git(work, "commit", "-qm", "v1")
+            git(work, "tag", "v1")
+            self.tags[lib] = git(work, "rev-parse", "HEAD")
+            self.branches[lib] = git(work, "rev-parse", "--abbrev-ref", "HEAD")
+            with open(os.path.join(work, "NEWS"), "w") as f:
+                f.write("unreleased\n")
+            git(work, "add", "-A")
+            git(work, "commit", "-qm", "after v1")
+            git(self.root, "clone", "-q", "--bare", work, os.path.join(self.remotes, "dev", f"{lib}.git"))
+
+        # tag, full commit id and short commit id
+        self.pins = {"liba": "v1", "libb": self.tags["libb"], "libc": self.tags["libc"][:7]}
+        self.libraries = os.path.join(self.root, "Libraries")
+        os.makedirs(self.libraries)
+        with open(os.path.join(self.libraries, "Libraries.yaml"), "w") as f:
+            f.write("Sources:\n  GITHUB: https://github.com/{}/{}\nLibraries:\n")
+            for lib in self.LIBRARIES:
+                f.write(f"  - Name: {lib}\n    Source: GITHUB\n    Developer: dev\n    Repository: {lib}\n")
+                f.write(f"    Version: {self.pins[lib]}\n")
+
+        self.project = os.path.join(self.root, "project")
+        os.makedirs(os.path.join(self.project, "Abs"))
+        self.patch = os.path.join(self.project, "main.pd")
+        with open(self.patch, "w") as f:
+            f.write("#N canvas 0 0 450 300 12;\n")
+            f.write("#X declare -path Abs;\n")
+            f.write("#X obj 10 10 liba/liba 1;\n")
+            f.write("#X obj 10 40 sub;\n")
+        with open(os.path.join(self.project, "Abs", "sub.pd"), "w") as f:
+            f.write("#N canvas 0 0 450 300 12;\n")
+            f.write("#X obj 10 10 declare -lib libb;\n")
+            f.write("#X obj 10 40 osc~ 440;\n")
+
+        self.remoteOrig = ExternalLibraries.GetLibraryRemote
+        remotes = self.remotes
+        ExternalLibraries.GetLibraryRemote = lambda _, libData: f"file://{remotes}/{libData.dev}/{libData.repo}.git"
+
+        self.pd4web = Pd4Web(Patch=self.patch)
+        self.pd4web.PD4WEB_LIBRARIES = self.libraries
+        self.pd4web.SILENCE = True
+        self.pd4web.getMainPaths()
+        self.pd4web.APPDATA = os.path.join(self.root, "appdata")
+        self.pd4web.InitVariables()
+
+    def tearDown(self):
+        ExternalLibraries.GetLibraryRemote = self.remoteOrig
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_find_patch_libraries(self):
+        libraries = self.pd4web.Libraries.FindPatchLibraries(self.patch)
+        self.assertEqual(libraries, ["liba", "libb"])
+
+    def test_library_data(self):
+        libraries = self.pd4web.Libraries
+        self.assertIs(libraries.GetLibraryData("liba"), libraries.GetLibraryData("liba"))
+        self.assertEqual(libraries.GetLibraryData("liba").version, "v1")
+        self.assertFalse(libraries.GetLibraryData("nolib").valid)
+        self.assertTrue(libraries.isSupportedLibrary("libc"))
+        self.assertFalse(libraries.isSupportedLibrary("nolib"))
+
+    def test_numeric_pins(self):
+        libraries = os.path.join(self.root, "NumericLibraries")
+        os.makedirs(libraries)
+        with open(os.path.join(libraries, "Libraries.yaml"), "w") as f:
+            f.write("Sources:\n  GITHUB: https://github.com/{}/{}\nLibraries:\n")
+            for lib, pin in [("liba", "0123456"), ("libb", "1234e10"), ("libc", "")]:
+                f.write(f"  - Name: {lib}\n    Source: GITHUB\n    Developer: dev\n    Repository: {lib}\n")
+                f.write(f"    Version: {pin}\n")
+        self.pd4web.PD4WEB_LIBRARIES = libraries
+        externals = ExternalLibraries(self.pd4web)
+        self.assertEqual(externals.GetLibraryData("liba").version, "0123456")
+        self.assertEqual(externals.GetLibraryData("libb").version, "1234e10")
+        self.assertIsNone(externals.GetLibraryData("libc").version)
+
+    def test_fetch_libraries(self):
+        self.pd4web.Libraries.FetchLibraries(self.LIBRARIES)
+        for lib in self.LIBRARIES:
+            checkout = os.path.join(self.pd4web.APPDATA, "Externals", lib)
+            self.assertTrue(os.path.isfile(os.path.join(checkout, f"{lib}.c")))
+            self.assertFalse(os.path.exists(os.path.join(checkout, "NEWS")))
+            self.assertEqual(self.pd4web.Version["externals"][lib], self.tags[lib])
+        self.assertEqual(self.pd4web.Libraries.fetchedLibraries, set(self.LIBRARIES))
+
+        # the local transport refuses shallow fetches, so all of them fall back to a full fetch
+        report = {fetch["Name"]: fetch for fetch in self.pd4web.Fetcher.Report}
+        self.assertEqual(sorted(report), self.LIBRARIES)
+        for fetch in report.values():
+            self.assertEqual(fetch["Mode"], "full")
+            self.assertGreater(fetch["Bytes"], 0)
+
+    def test_update_to_new_pin(self):
+        self.pd4web.Libraries.FetchLibraries(["liba"])
+        checkout = os.path.join(self.pd4web.APPDATA, "Externals", "liba")
+        remote = f"file://{self.remotes}/dev/liba.git"
+        commit = self.pd4web.Fetcher.Update("liba", remote, checkout, self.branches["liba"])
+        self.assertNotEqual(str(commit.id), self.tags["liba"])
+        self.assertTrue(os.path.isfile(os.path.join(checkout, "NEWS")))
+
+        commit = self.pd4web.Fetcher.Update("liba", remote, checkout, "v1")
+        self.assertEqual(str(commit.id), self.tags["liba"])
+        self.assertFalse(os.path.exists(os.path.join(checkout, "NEWS")))
+
+    def makeMirror(self, name: str, libraries: list) -> str:
+        mirror = os.path.join(self.root, name)
+        for lib in libraries:
+            src = os.path.join(self.remotes, "dev", f"{lib}.git")
+            shutil.copytree(src, os.path.join(mirror, "github.com", "dev", f"{lib}.git"))
+        return mirror
+
+    def test_mirror_sources(self):
+        mirror = self.makeMirror("mirror", ["liba"])
+        self.pd4web.MIRROR = f"/nonexistent, file://{mirror}, https://mirror.example/git/"
+        sources = self.pd4web.Fetcher.Sources("https://github.com/dev/liba")
+        self.assertEqual(
+            sources,
+            [
+                (f"file://{mirror}", os.path.join(mirror, "github.com", "dev", "liba.git")),
+                ("https://mirror.example/git/", "https://mirror.example/git/github.com/dev/liba.git"),
+                ("github.com", "https://github.com/dev/liba"),
+            ],
+        )
+        self.pd4web.MIRROR = mirror
+        self.pd4web.MIRROR_ONLY = True
+        self.assertEqual(self.pd4web.Fetcher.Sources("https://github.com/dev/libb"), [])
+
+        # without mirror roots --mirror-only is an error, not a fetch from upstream
+        self.pd4web.MIRROR = ""
+        with self.assertRaises(Exception):
+            self.pd4web.Fetcher.Sources("https://github.com/dev/liba")
+
+    def test_fetch_from_mirror(self):
+        # the upstream urls of Libraries.yaml (github.com) are only reachable through the mirrors
+        ExternalLibraries.GetLibraryRemote = self.remoteOrig
+        empty = os.path.join(self.root, "empty", "github.com", "dev", "liba.git")
+        git(self.root, "init", "-q", "--bare", empty)
+        mirror = self.makeMirror("mirror", self.LIBRARIES)
+        self.pd4web.MIRROR = f"{os.path.join(self.root, 'empty')},{mirror}"
+        self.pd4web.MIRROR_ONLY = True
+
+        self.pd4web.Libraries.FetchLibraries(self.LIBRARIES)
+        for lib in self.LIBRARIES:
+            self.assertEqual(self.pd4web.Version["externals"][lib], self.tags[lib])
+        self.assertEqual({fetch["Source"] for fetch in self.pd4web.Fetcher.Report}, {mirror})
+
+        # liba is not in the first mirror, it falls back to the second one
+        stats = self.pd4web.Fetcher.SourceStats
+        self.assertEqual(stats[os.path.join(self.root, "empty")]["Failures"], 1)
+        self.assertEqual(stats[mirror]["Fetches"], 3)
+        self.assertEqual(stats[mirror]["Failures"], 0)
+
+    def test_fetch_error_is_raised(self):
+        shutil.rmtree(os.path.join(self.remotes, "dev", "libc.git"))
+        with self.assertRaises(Exception):
+            self.pd4web.Libraries.FetchLibraries(self.LIBRARIES)
+        # the failed fetch doesn't leave an empty repository that would be taken as fetched by the next run
+        externals = os.path.join(self.pd4web.APPDATA, "Externals")
+        self.assertEqual([f for f in os.listdir(externals) if f.startswith("libc")], [])
+
+    def gitDaemon(self) -> str:
+        """
+        Serve the remotes with `git daemon`, the git protocol allows the shallow fetches refused by file://.
+        """
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        for lib in self.LIBRARIES:
+            remote = os.path.join(self.remotes, "dev", f"{lib}.git")
+            git(remote, "config", "uploadpack.allowReachableSHA1InWant", "true")
+        try:
+            daemon = subprocess.Popen(
+                ["git", "daemon", "--export-all", f"--base-path={self.remotes}", "--listen=127.0.0.1"]
+                + [f"--port={port}"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        except OSError:
+            self.skipTest("git daemon is not available")
+        self.addCleanup(daemon.wait)
+        self.addCleanup(daemon.terminate)
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                return f"git://127.0.0.1:{port}"
+            except OSError:
+                if daemon.poll() is not None:
+                    self.skipTest("git daemon is not available")
+                time.sleep(0.05)
+        self.skipTest("git daemon is not available")
+
+    def test_shallow_fetch(self):
+        server = self.gitDaemon()
+        ExternalLibraries.GetLibraryRemote = lambda _, libData: f"{server}/{libData.dev}/{libData.repo}.git"
+        self.pd4web.Libraries.FetchLibraries(self.LIBRARIES)
+        for lib in self.LIBRARIES:
+            self.assertEqual(self.pd4web.Version["externals"][lib], self.tags[lib])
+
+        # tags and full commit ids are fetched with depth 1, the short commit id needs all the history
+        report = {fetch["Name"]: fetch["Mode"] for fetch in self.pd4web.Fetcher.Report}
+        self.assertEqual(report, {"liba": "shallow", "libb": "shallow", "libc": "full"})
+        self.assertTrue(pygit2.Repository(os.path.join(self.pd4web.APPDATA, "Externals", "liba")).is_shallow)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Sources"))
+
+from pd4web.Pd4Web import Pd4Web
+from pd4web.Graph import PatchGraph
+
+
+class PatchGraphTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="pd4web-graph-")
+        files = {
+            "main.pd": (
+                "#N canvas 0 0 450 300 12;\n#X declare -path Libs;\n#X obj 10 10 abs1;\n#X obj 10 40 clone abs3 4;\n"
+            ),
+            "Libs/abs1.pd": "#N canvas 0 0 450 300 12;\n#X obj 10 10 Libs/abs2;\n",
+            "Libs/abs2.pd": "#N canvas 0 0 450 300 12;\n#X obj 10 10 osc~;\n",
+            "abs3.pd": "#N canvas 0 0 450 300 12;\n#X obj 10 40 Libs/abs1;\n",
+        }
+        for path, content in files.items():
+            os.makedirs(os.path.dirname(os.path.join(self.root, path)), exist_ok=True)
+            with open(os.path.join(self.root, path), "w") as f:
+                f.write(content)
+        pd4web = Pd4Web(Patch=os.path.join(self.root, "main.pd"))
+        pd4web.SILENCE = True
+        pd4web.PROJECT_ROOT = self.root
+        self.graph = PatchGraph(pd4web)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def path(self, relPath):
+        return os.path.join(self.root, relPath)
+
+    def test_discover(self):
+        self.graph.Discover(self.path("main.pd"))
+        self.assertEqual(self.graph.discovered[self.path("main.pd")], [self.path("Libs/abs1.pd"), self.path("abs3.pd")])
+        self.assertEqual(self.graph.discovered[self.path("Libs/abs1.pd")], [self.path("Libs/abs2.pd")])
+        self.assertEqual(len(self.graph.discovered), 4)
+
+        # the records read by Discover are given to the patch once, without reading the file again
+        os.remove(self.path("Libs/abs2.pd"))
+        records = list(self.graph.PatchRecords(self.path("Libs/abs2.pd")))
+        self.assertEqual(records[0], ("#N canvas 0 0 450 300 12;\n", None))
+        self.assertEqual(records[1], ("#X obj 10 10 osc~;\n", ["#X", "obj", "10", "10", "osc~"]))
+        self.assertNotIn(self.path("Libs/abs2.pd"), self.graph.parsed)
+        self.assertEqual(list(self.graph.PatchRecords(self.path("abs3.pd")))[1][1][4], "Libs/abs1")
+
+        # the main patch and the big abstractions are streamed from the file by Patch
+        self.assertNotIn(self.path("main.pd"), self.graph.parsed)
+        self.graph.CACHE_SIZE = 10
+        self.graph.Discover(self.path("main.pd"))
+        self.assertEqual(self.graph.parsed, {})
+
+    def test_dump(self):
+        self.graph.Enter(self.path("main.pd"), False)
+        self.graph.Enter(self.path("abs3.pd"), True)
+        self.graph.AddEdge(self.path("Libs/abs1.pd"))
+        self.graph.Leave()
+        self.graph.AddEdge(self.path("Libs/abs1.pd"))
+        self.graph.Leave()
+        dotFile = self.path("build/patch-graph.dot")
+        self.graph.Dump(dotFile)
+        with open(dotFile) as f:
+            dot = f.read()
+        self.assertIn('"main.pd" -> "abs3.pd";', dot)
+        self.assertIn('"abs3.pd" -> "Libs/abs1.pd";', dot)
+        self.assertIn('"main.pd" -> "Libs/abs1.pd";', dot)
+
+
+if __name__ == "__main__":
+    unittest.main()
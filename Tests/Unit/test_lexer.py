@@ -0,0 +1,98 @@
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Sources"))
+
+from pd4web.Lexer import ATOM, Records, Atoms, Tokens
+
+
+def randomAtom(rnd):
+    kind = rnd.random()
+    if kind < 0.1:
+        return ","
+    elif kind < 0.2:
+        return rnd.choice(["\\;", "\\,", "\\$0", "\\$1-x", "a\\;b", "\\\\"])
+    elif kind < 0.4:
+        return str(round(rnd.uniform(-1000, 1000), rnd.randint(0, 4)))
+    return "".join(rnd.choice("abcdefghijklmnopqrstuvwxyz~/#-_.") for _ in range(rnd.randint(1, 8)))
+
+
+def savePatch(records, rnd):
+    """
+    Save the records as Pd does, long records are broken in more than one line.
+    """
+    text = []
+    for atoms in records:
+        line = ""
+        for atom in atoms:
+            separator = "" if atom == "," or line == "" else " "
+            if len(line) > 20 and rnd.random() < 0.3:
+                separator = "\n"
+            line += separator + atom
+        text.append(line + ";" + rnd.choice(["\n", "\n", "\r\n"]))
+    return "".join(text)
+
+
+class LexerTest(unittest.TestCase):
+    def test_fuzz(self):
+        rnd = random.Random(4)
+        for _ in range(300):
+            records = [["#X"] + [randomAtom(rnd) for _ in range(rnd.randint(1, 30))] for _ in range(rnd.randint(1, 10))]
+            text = savePatch(records, rnd)
+            lines = text.splitlines(keepends=True)
+            found = list(Records(lines))
+            self.assertEqual("".join(found), text)
+            self.assertEqual([Atoms(record) for record in found], records)
+            self.assertEqual([Tokens(record) for record in found], [[a for a in r if a != ","] for r in records])
+
+    def test_random_text(self):
+        rnd = random.Random(11)
+        for _ in range(1000):
+            text = "".join(rnd.choice("ab \\;\n,") for _ in range(rnd.randint(0, 60)))
+            # reference: one regex pass over the whole text
+            expected, start = [], 0
+            for match in ATOM.finditer(text):
+                if match.group() == ";":
+                    end = match.end() + (1 if text.startswith("\n", match.end()) else 0)
+                    expected.append(text[start:end])
+                    start = end
+            if start < len(text):
+                expected.append(text[start:])
+            self.assertEqual(list(Records(text.splitlines(keepends=True))), expected, repr(text))
+
+    def test_fast_path(self):
+        rnd = random.Random(7)
+        for _ in range(1000):
+            record = "".join(rnd.choice("ab1 ,;\n\t") for _ in range(rnd.randint(0, 40)))
+            self.assertEqual(Atoms(record), [atom for atom in ATOM.findall(record) if atom != ";"])
+
+    def test_records(self):
+        lines = [
+            "#X obj 10 10 else/knob 50 0 127 0 0 empty empty\n",
+            "#dcdcdc 0, f 8;\n",
+            "#X msg 10 10 \\; pd dsp 1;\n",
+            "#A 0 0.1 0.2; #X coords 0 1;\n",
+            "#X text 10 10 no end",
+        ]
+        records = list(Records(lines))
+        self.assertEqual(
+            records,
+            [
+                "#X obj 10 10 else/knob 50 0 127 0 0 empty empty\n#dcdcdc 0, f 8;\n",
+                "#X msg 10 10 \\; pd dsp 1;\n",
+                "#A 0 0.1 0.2;",
+                " #X coords 0 1;\n",
+                "#X text 10 10 no end",
+            ],
+        )
+        self.assertEqual(
+            Tokens(records[0])[4:],
+            ["else/knob", "50", "0", "127", "0", "0", "empty", "empty", "#dcdcdc", "0", "f", "8"],
+        )
+        self.assertEqual(Atoms(records[1]), ["#X", "msg", "10", "10", "\\;", "pd", "dsp", "1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
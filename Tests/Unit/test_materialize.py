@@ -0,0 +1,153 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Sources"))
+
+from pd4web.Pd4Web import Pd4Web
+from pd4web.Materialize import SourceMaterializer
+from pd4web.CMake import ParseCMakeCommands, CMakeVariables, ExpandVariables
+
+LIB_CMAKE = """cmake_minimum_required(VERSION 3.25)
+project(mylib)
+set(LIB_DIR ${PD4WEB_EXTERNAL_DIR}/${PROJECT_NAME})
+
+function(ReplaceLine file line new_line) # rewrites the file
+    file(READ ${file} FILE_CONTENTS)
+    string(REPLACE "${line}" "${new_line}" FILE_CONTENTS "${FILE_CONTENTS}")
+    file(WRITE ${file} "${FILE_CONTENTS}")
+endfunction()
+
+replaceline("${LIB_DIR}/shared/shared.h" "#if defined(__linux__)" "#if 1")
+
+set(SHARED "${LIB_DIR}/shared/shared.c")
+file(GLOB DSP_SRC "${LIB_DIR}/dsp/*.c")
+pd_add_external(used "${LIB_DIR}/src/used.c;${SHARED}")
+pd_add_external(dsp~ "${DSP_SRC}")
+"""
+
+
+class SourceMaterializerTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="pd4web-materialize-")
+        self.store = os.path.join(self.root, "appdata", "Externals", "mylib")
+        files = {
+            "src/used.c": '#include "inline.c"\nvoid used_setup(void) {}\n',
+            "src/inline.c": "static int x;\n",
+            "src/unused.c": "void unused_setup(void) {}\n",
+            "dsp/osc.c": "void osc_tilde_setup(void) {}\n",
+            "shared/shared.c": "int shared;\n",
+            "shared/shared.h": "#if defined(__linux__)\n#endif\n",
+            "abs/myabs.pd": "#N canvas 0 0 450 300 12;\n",
+            ".git/config": "",
+        }
+        for path, content in files.items():
+            os.makedirs(os.path.dirname(os.path.join(self.store, path)), exist_ok=True)
+            with open(os.path.join(self.store, path), "w") as f:
+                f.write(content)
+
+        self.project = os.path.join(self.root, "project")
+        os.makedirs(self.project)
+        self.cmakeFile = os.path.join(self.root, "mylib.cmake")
+        with open(self.cmakeFile, "w") as f:
+            f.write(LIB_CMAKE)
+        self.dst = os.path.join(self.project, "Pd4Web", "Externals", "mylib")
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def materializer(self, mode, usedOnly=False):
+        pd4web = Pd4Web(Patch=os.path.join(self.project, "main.pd"))
+        pd4web.SILENCE = True
+        pd4web.PROJECT_ROOT = self.project
+        pd4web.MATERIALIZE = mode
+        pd4web.MATERIALIZE_USED_ONLY = usedOnly
+        return SourceMaterializer(pd4web)
+
+    def test_cmake_references(self):
+        materializer = self.materializer("copy")
+        referenced, mutable = materializer.CMakeReferences("mylib", self.cmakeFile, self.store, self.dst)
+        self.assertEqual(mutable, {os.path.join("shared", "shared.h")})
+        expected = {"src/used.c", "shared/shared.c", "dsp/osc.c", "shared/shared.h"}
+        self.assertEqual(referenced, {os.path.normpath(path) for path in expected})
+
+    def test_functions_of_other_files(self):
+        # functions defined by the CMake of another library, used through a function of this one
+        with open(os.path.join(self.root, "other.cmake"), "w") as f:
+            f.write('function(AppendLine file line)\n    file(APPEND ${file} "${line}")\nendfunction()\n')
+        cmakeFile = os.path.join(self.root, "lib2.cmake")
+        with open(cmakeFile, "w") as f:
+            f.write("set(LIB_DIR ${PD4WEB_EXTERNAL_DIR}/${PROJECT_NAME})\n")
+            f.write("function(Patch file)\n    appendline(${file} \"#define X\")\nendfunction()\n")
+            f.write('patch("${LIB_DIR}/src/used.c")\n')
+            f.write('file(WRITE "${LIB_DIR}/dsp/osc.c" "")\n')
+            f.write('file(READ "${LIB_DIR}/shared/shared.c" SHARED)\n')
+        materializer = self.materializer("copy")
+        _, mutable = materializer.CMakeReferences("mylib", cmakeFile, self.store, self.dst)
+        self.assertEqual(mutable, {os.path.normpath("src/used.c"), os.path.normpath("dsp/osc.c")})
+
+    def test_copy(self):
+        self.materializer("copy").Materialize("mylib", self.store, self.dst, self.cmakeFile)
+        self.assertTrue(os.path.isfile(os.path.join(self.dst, "src", "unused.c")))
+        self.assertFalse(os.path.exists(os.path.join(self.dst, ".git")))
+        used = os.path.join(self.dst, "src", "used.c")
+        self.assertNotEqual(os.stat(used).st_ino, os.stat(os.path.join(self.store, "src", "used.c")).st_ino)
+
+    def test_hardlink_copies_rewritten_files(self):
+        materializer = self.materializer("hardlink")
+        materializer.Materialize("mylib", self.store, self.dst, self.cmakeFile)
+        used = os.path.join("src", "used.c")
+        header = os.path.join("shared", "shared.h")
+        self.assertEqual(os.stat(os.path.join(self.dst, used)).st_ino, os.stat(os.path.join(self.store, used)).st_ino)
+        self.assertNotEqual(
+            os.stat(os.path.join(self.dst, header)).st_ino, os.stat(os.path.join(self.store, header)).st_ino
+        )
+        self.assertEqual(materializer.Report["mylib"], {"hardlink": 6, "copy": 1})
+
+    def test_symlink(self):
+        self.materializer("symlink").Materialize("mylib", self.store, self.dst, self.cmakeFile)
+        self.assertTrue(os.path.islink(os.path.join(self.dst, "abs", "myabs.pd")))
+        self.assertFalse(os.path.islink(os.path.join(self.dst, "shared", "shared.h")))
+
+    def test_auto_falls_back(self):
+        materializer = self.materializer("auto")
+        materializer.Materialize("mylib", self.store, self.dst, self.cmakeFile)
+        for path in ["src/used.c", "shared/shared.h", "abs/myabs.pd"]:
+            self.assertTrue(os.path.isfile(os.path.join(self.dst, path)))
+        self.assertEqual(sum(materializer.Report["mylib"].values()), 7)
+
+    def test_used_only(self):
+        materializer = self.materializer("copy", usedOnly=True)
+        materializer.Materialize("mylib", self.store, self.dst, self.cmakeFile)
+        self.assertTrue(os.path.isfile(os.path.join(self.dst, "abs", "myabs.pd")))
+        self.assertTrue(os.path.isfile(os.path.join(self.dst, "shared", "shared.h")))
+        self.assertFalse(os.path.exists(os.path.join(self.dst, "src", "used.c")))
+
+        materializer.MaterializeReferenced("mylib", self.store, self.dst, self.cmakeFile)
+        for path in ["src/used.c", "src/inline.c", "dsp/osc.c", "shared/shared.c"]:
+            self.assertTrue(os.path.isfile(os.path.join(self.dst, path)), path)
+        self.assertFalse(os.path.exists(os.path.join(self.dst, "src", "unused.c")))
+
+
+class CMakeParserTest(unittest.TestCase):
+    def test_commands(self):
+        commands = ParseCMakeCommands(LIB_CMAKE)
+        names = [command.name for command in commands]
+        self.assertEqual(names[:4], ["cmake_minimum_required", "project", "set", "function"])
+        replace = [command for command in commands if command.name == "replaceline"][0]
+        self.assertEqual(replace.args, ["${LIB_DIR}/shared/shared.h", "#if defined(__linux__)", "#if 1"])
+        self.assertEqual(LIB_CMAKE[replace.start : replace.end].count("("), 2)
+
+    def test_variables(self):
+        commands = ParseCMakeCommands(LIB_CMAKE)
+        variables = CMakeVariables(commands, {"PD4WEB_EXTERNAL_DIR": "/p/Externals"})
+        self.assertEqual(variables["LIB_DIR"], "/p/Externals/mylib")
+        self.assertEqual(
+            ExpandVariables("${SHARED};${UNKNOWN}", variables), "/p/Externals/mylib/shared/shared.c;${UNKNOWN}"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
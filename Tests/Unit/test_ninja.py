@@ -0,0 +1,91 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Sources"))
+
+from pd4web.Pd4Web import Pd4Web
+from pd4web.Ninja import NinjaProgress, NinjaLog
+
+BUILD_OUTPUT = """[1/4] Building C object CMakeFiles/knob.dir/Pd4Web/Externals/else/Code_source/knob.c.o
+[2/4] Building C object CMakeFiles/sig.dir/Pd4Web/Externals/else/Code_source/sig.c.o
+FAILED: CMakeFiles/sig.dir/Pd4Web/Externals/else/Code_source/sig.c.o
+emcc -O3 -c Pd4Web/Externals/else/Code_source/sig.c -o CMakeFiles/sig.dir/Pd4Web/Externals/else/Code_source/sig.c.o
+sig.c:3:1: error: unknown type name 't_sig'
+1 error generated.
+[3/4] Building C object CMakeFiles/osc.dir/Pd4Web/Externals/else/Code_source/osc.c.o
+ninja: build stopped: subcommand failed.
+"""
+
+
+class NinjaTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="pd4web-ninja-")
+        self.pd4web = Pd4Web()
+        self.pd4web.SILENCE = True
+        self.lines = []
+        self.pd4web.print = lambda text, **kwargs: self.lines.append(text)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_progress_and_failure(self):
+        progress = NinjaProgress(self.pd4web)
+        for line in BUILD_OUTPUT.splitlines():
+            progress.Line(line)
+        self.assertEqual((progress.done, progress.total), (3, 4))
+        self.assertIsNotNone(progress.ETA())
+        self.assertEqual(
+            progress.ErrorOutput().splitlines(),
+            BUILD_OUTPUT.splitlines()[2:6],
+        )
+
+        # errors of cmake itself are not in a FAILED block
+        progress = NinjaProgress(self.pd4web, "Configuring")
+        progress.Line("CMake Error at CMakeLists.txt:3 (include):")
+        self.assertEqual(progress.ErrorOutput(), "CMake Error at CMakeLists.txt:3 (include):")
+
+    def test_ninja_log(self):
+        buildDir = os.path.join(self.root, "build")
+        os.makedirs(buildDir)
+        logFile = os.path.join(buildDir, ".ninja_log")
+        with open(logFile, "w") as file:
+            file.write("# ninja log v5\n")
+            file.write("0\t9000\t1\tCMakeFiles/old.dir/Pd4Web/Externals/else/old.c.o\taaa\n")
+
+        ninjaLog = NinjaLog(self.pd4web, buildDir)
+        with open(logFile, "a") as file:
+            file.write("0\t1500\t1\tCMakeFiles/knob.dir/Pd4Web/Externals/else/Code_source/knob.c.o\tb1\n")
+            file.write("0\t300\t1\tCMakeFiles/libpd.dir/Pd4Web/pure-data/src/m_pd.c.o\tb2\n")
+            file.write("10\t2500\t1\tCMakeFiles/pd4web.dir/Pd4Web/externals.cpp.o\tb3\n")
+            file.write("1500\t1700\t1\tlibknob.a\tb4\n")
+            file.write("1700\t1800\t1\tlibpd.a\tb5\n")
+            file.write("2500\t4500\t1\tpd4web.js\tb6\n")
+            file.write("2500\t4500\t1\tpd4web.wasm\tb6\n")
+
+        steps = {step["Output"]: step for step in ninjaLog.Steps()}
+        self.assertNotIn("CMakeFiles/old.dir/Pd4Web/Externals/else/old.c.o", steps)
+        self.assertEqual(len(steps), 6)
+        self.assertEqual(steps["libknob.a"]["Library"], "else")
+        self.assertEqual(steps["libpd.a"]["Library"], "pure-data")
+        self.assertEqual(steps["pd4web.js"]["Library"], "pd4web")
+        self.assertEqual(steps["pd4web.js"]["Time"], 2.0)
+        self.assertEqual(steps["CMakeFiles/pd4web.dir/Pd4Web/externals.cpp.o"]["Kind"], "compile")
+
+        ninjaLog.PrintReport(count=1)
+        self.assertTrue(self.lines[0].startswith("Build steps: 3 compiled in 4.3s, 3 linked in 2.3s"))
+        self.assertTrue(self.lines[1].startswith("pd4web"))
+        self.assertTrue(self.lines[-1].endswith("pd4web           Pd4Web/externals.cpp.o"))
+
+    def test_stream(self):
+        lines = []
+        code = "import sys; print('[1/2] a'); print('err', file=sys.stderr); sys.exit(3)"
+        result = self.pd4web.Tracer.Stream([sys.executable, "-c", code], lines.append)
+        self.assertEqual(result, 3)
+        self.assertEqual(sorted(lines), ["[1/2] a", "err"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Sources"))
+
+from pd4web.Pd4Web import Pd4Web
+
+LIBRARIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Sources", "Libraries")
+
+
+class AbstractionIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="pd4web-objects-")
+        self.project = os.path.join(self.root, "project")
+        self.libFolder = os.path.join(self.project, "Pd4Web", "Externals", "else")
+        for path in ["Abstractions/mix.pd", "Abstractions/old/mix.pd", "Abstractions/mix-help.pd", "Extra/pan.pd"]:
+            os.makedirs(os.path.dirname(os.path.join(self.libFolder, path)), exist_ok=True)
+            with open(os.path.join(self.libFolder, path), "w") as f:
+                f.write("#N canvas 0 0 450 300 12;\n")
+
+        self.pd4web = Pd4Web(Patch=os.path.join(self.project, "main.pd"))
+        self.pd4web.SILENCE = True
+        self.pd4web.PROJECT_ROOT = self.project
+        self.pd4web.PD4WEB_LIBRARIES = LIBRARIES
+        self.pd4web.APPDATA = os.path.join(self.root, "appdata")
+        self.pd4web.InitVariables()
+        self.pd4web.Version["externals"]["else"] = "abc123"
+        self.messages = []
+        self.pd4web.print = lambda msg, **kwargs: self.messages.append(msg)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_abstraction_path(self):
+        objects = self.pd4web.Objects
+        mix = os.path.join(self.libFolder, "Abstractions", "mix.pd")
+        self.assertEqual(objects.GetAbstractionPath("else", "pan"), os.path.join(self.libFolder, "Extra", "pan.pd"))
+        self.assertEqual(objects.GetAbstractionPath("else", "mix"), mix)
+        self.assertEqual(objects.GetAbstractionPath("else", "mix"), mix)
+        self.assertEqual(objects.GetAbstractionPath("else", "mix-help"), "")
+        self.assertEqual(len([msg for msg in self.messages if "more than one folder" in msg]), 1)
+
+    def test_cached_index(self):
+        self.pd4web.Objects.GetAbstractionPaths("else")
+        cached = self.pd4web.SymbolCache.Get("else", "abc123", "abspaths")
+        self.assertEqual(cached, {"mix": ["Abstractions/mix.pd", "Abstractions/old/mix.pd"], "pan": ["Extra/pan.pd"]})
+
+        # another project with the same version uses the index without listing the folder
+        shutil.rmtree(os.path.join(self.libFolder, "Extra"))
+        self.pd4web.Objects.absPaths = {}
+        self.assertEqual(self.pd4web.Objects.GetAbstractionPaths("else")["pan"], ["Extra/pan.pd"])
+
+    def test_object_index(self):
+        index = self.pd4web.ObjectIndex
+        index.AddLibrary("mylib", ["knob", "osc2~"], ["mix"])
+        self.assertEqual(index.GetAll("mylib"), frozenset(["knob", "osc2~", "mix"]))
+        with self.assertRaises(AttributeError):
+            index.GetAll("mylib").add("other")
+
+        # the list of GetSupportedObjects is a copy, changing it doesn't change the index
+        objects = self.pd4web.Objects.GetSupportedObjects("mylib")
+        self.assertEqual(objects, ["knob", "osc2~", "mix"])
+        objects.append("other")
+        index.LibrariesWithObject("knob").append("other")
+        self.assertEqual(self.pd4web.Objects.GetSupportedObjects("mylib"), ["knob", "osc2~", "mix"])
+        self.assertEqual(index.LibrariesWithObject("knob"), ["mylib"])
+        self.assertTrue(self.pd4web.Objects.IsSupportedObject("mylib", "mix"))
+
+        index.Save()
+        externals = os.path.join(self.project, "Pd4Web", "Externals")
+        self.assertEqual(sorted(f for f in os.listdir(externals) if f.endswith((".json", ".tmp"))), ["Objects.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
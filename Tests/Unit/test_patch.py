@@ -0,0 +1,80 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Sources"))
+
+from pd4web.Pd4Web import Pd4Web
+from pd4web.Lexer import ObjectRecords
+from pd4web.Patch import Patch, PatchLine
+
+
+class PatchLinesTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="pd4web-patch-")
+        pd4web = Pd4Web(Patch=os.path.join(self.root, "main.pd"))
+        pd4web.SILENCE = True
+        pd4web.PROJECT_ROOT = self.root
+        pd4web.InitPatchVariables()
+        self.patch = Patch.__new__(Patch)
+        self.patch.Pd4Web = pd4web
+        self.patch.isAbstraction = False
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_raw_lines(self):
+        lines = [
+            "#N canvas 0 50 450 250 (subpatch) 0;\n",
+            "#X array a 4 float 2;\n",
+            "#A 0 0.1 0.2 0.3 0.4;\n",
+            "#X coords 0 1 4 -1 200 140 1 0 0;\n",
+            "#X text 10 10 obj declare, f 20;\n",
+            "#X restore 10 10 graph;\n",
+            "#X connect 0 0 1 0;\n",
+        ]
+        self.patch.patchRecords = ObjectRecords(lines)
+        self.assertEqual(list(self.patch.processPatch()), lines)
+        self.patch.patchRecords = ObjectRecords(lines)
+        self.patch.reConfigurePatch(self.patch.rewritePatch(self.patch.processPatch()))
+        with open(os.path.join(self.root, "WebPatch", "index.pd")) as f:
+            self.assertEqual(f.read(), "".join(lines))
+
+    def test_object_line(self):
+        line = PatchLine(3, "#X obj 10 10 else/knob 50, f 8;\n", ["#X", "obj", "10", "10", "else/knob", "50", "f", "8"])
+        line.isExternal = True
+        self.assertFalse(hasattr(line, "__dict__"))
+        self.patch.reConfigurePatch(self.patch.rewritePatch([line]))
+        with open(os.path.join(self.root, "WebPatch", "index.pd")) as f:
+            self.assertEqual(f.read(), "#X obj 10 10 knob 50, f 8;\n")
+
+    def test_used_objects(self):
+        used = [("else", "knob"), ("cyclone", "knob"), ("else", "knob"), ("pure-data", "osc~"), ("else", "f2s")]
+        for library, name in used:
+            line = PatchLine()
+            line.library, line.name = library, name
+            line.isExternal = library != "pure-data"
+            self.patch.addUsedObject(line)
+        used = [(obj["Lib"], obj["Obj"]) for obj in self.patch.Pd4Web.usedObjects]
+        self.assertEqual(used, [("else", "knob"), ("cyclone", "knob"), ("else", "f2s")])
+
+    def test_failed_write(self):
+        def lines():
+            yield "#N canvas 0 0 450 300 12;\n"
+            raise ValueError("object not found")
+
+        os.makedirs(os.path.join(self.root, "WebPatch"))
+        indexFile = os.path.join(self.root, "WebPatch", "index.pd")
+        with open(indexFile, "w") as f:
+            f.write("old")
+        with self.assertRaises(ValueError):
+            self.patch.reConfigurePatch(lines())
+        self.assertEqual(os.listdir(os.path.join(self.root, "WebPatch")), ["index.pd"])
+        with open(indexFile) as f:
+            self.assertEqual(f.read(), "old")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Sources"))
+
+from pd4web.Pd4Web import Pd4Web
+from pd4web.Server import CompileServer
+
+
+class CompileServerTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="pd4web-server-")
+        pd4web = Pd4Web()
+        pd4web.SILENCE = True
+        pd4web.APPDATA = self.root
+        self.server = CompileServer(pd4web, 0)
+        self.server.Listen()
+        self.server.SaveToken()
+        self.thread = threading.Thread(target=self.server.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.port}"
+
+    def tearDown(self):
+        self.server.httpd.shutdown()
+        self.server.httpd.server_close()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def request(self, path: str, body=None, headers=None):
+        headers = headers if headers is not None else {"X-Pd4Web-Token": self.server.token}
+        if body is not None:
+            headers.setdefault("Content-Type", "application/json")
+            body = json.dumps(body).encode()
+        request = urllib.request.Request(f"{self.url}{path}", data=body, headers=headers)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.read().decode()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode()
+
+    def test_version(self):
+        status, text = self.request("/version")
+        self.assertEqual(status, 200)
+        self.assertTrue(text.startswith("pd4web version"))
+
+    def test_token_file(self):
+        with open(self.server.tokenFile) as f:
+            self.assertEqual(f.read(), self.server.token)
+        if os.name == "posix":
+            self.assertEqual(os.stat(self.server.tokenFile).st_mode & 0o777, 0o600)
+
+    def test_refused_requests(self):
+        job = {"args": ["/tmp/patch.pd"]}
+        token = self.server.token
+        self.assertEqual(self.request("/version", headers={})[0], 403)
+        self.assertEqual(self.request("/stop", {}, headers={"X-Pd4Web-Token": "wrong"})[0], 403)
+        # a simple cross-origin POST from a web page
+        headers = {"X-Pd4Web-Token": token, "Content-Type": "text/plain"}
+        self.assertEqual(self.request("/compile", job, headers=headers)[0], 415)
+        headers = {"X-Pd4Web-Token": token, "Origin": "http://example.com"}
+        self.assertEqual(self.request("/compile", job, headers=headers)[0], 403)
+        headers = {"X-Pd4Web-Token": token, "Host": f"rebind.example.com:{self.server.port}"}
+        self.assertEqual(self.request("/compile", job, headers=headers)[0], 403)
+        self.assertEqual(self.server.jobs, 0)
+
+    def test_job_args(self):
+        check = self.server.CheckJobArgs
+        self.assertEqual(check(["--pd-external", "-m", "32", "--patch-zoom", "2", "--clear", "/tmp/a.pd"]), "")
+        self.assertIn("--serve", check(["--serve", "/tmp/a.pd"]))
+        self.assertIn("--watch", check(["--watch", "/tmp/a.pd"]))
+        self.assertIn("--add-lib-cmake", check(["--add-lib-cmake", "x", "/tmp/a.pd"]))
+        self.assertIn("build-many", check(["build-many", "/tmp"]))
+        self.assertNotEqual(check(["/tmp/a.pd", "/tmp/b.pd"]), "")
+        self.assertNotEqual(check(["-m"]), "")
+        status, text = self.request("/compile", {"args": ["--serve", "/tmp/a.pd"]})
+        self.assertEqual(status, 400)
+        self.assertEqual(self.server.jobs, 0)
+
+    def test_compile_streams_errors(self):
+        cwd = os.getcwd()
+        status, text = self.request("/compile", {"args": ["/this/patch/does/not/exist.pd"]})
+        lines = text.splitlines()
+        self.assertEqual(lines[-1], "PD4WEB_EXIT 1")
+        self.assertTrue(any("Patch file not found" in line for line in lines))
+        self.assertEqual(os.getcwd(), cwd)
+        self.assertEqual(self.server.jobs, 1)
+
+    def test_subprocess_output_is_streamed(self):
+        output = []
+
+        class Stream:
+            def write(self, text):
+                output.append(text)
+
+            def flush(self):
+                pass
+
+        stdout = sys.stdout
+        sys.stdout = Stream()
+        try:
+            result = self.server.Pd4Web.Tracer.Run([sys.executable, "-c", "print('from the subprocess')"])
+        finally:
+            sys.stdout = stdout
+        self.assertEqual(result.returncode, 0)
+        self.assertIn("from the subprocess", "".join(output))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Sources"))
+
+from pd4web.Pd4Web import Pd4Web
+
+
+class TracerTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="pd4web-trace-")
+        self.pd4web = Pd4Web(Patch=os.path.join(self.root, "main.pd"))
+        self.pd4web.SILENCE = True
+        self.pd4web.TRACE = os.path.join(self.root, "out", "trace.json")
+        self.tracer = self.pd4web.Tracer
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_spans(self):
+        with self.tracer.Span("Patch main.pd", "patch", bytesRead=10) as span:
+            with self.tracer.Span("fetch else", "fetch", cache="hit"):
+                pass
+            span["bytesWritten"] = 20
+        with self.assertRaises(ValueError):
+            with self.tracer.Span("GetLibraryObjects else", "library"):
+                raise ValueError()
+        self.tracer.Run([sys.executable, "-c", "import sys; sys.exit(3)"])
+        self.tracer.Save()
+
+        with open(self.pd4web.TRACE) as f:
+            trace = json.load(f)
+        events = {event["name"]: event for event in trace["traceEvents"] if event["ph"] == "X"}
+        patch, fetch = events["Patch main.pd"], events["fetch else"]
+        self.assertEqual(patch["args"], {"bytesRead": 10, "bytesWritten": 20})
+        self.assertEqual(fetch["args"], {"cache": "hit"})
+        self.assertTrue(patch["ts"] <= fetch["ts"] and fetch["ts"] + fetch["dur"] <= patch["ts"] + patch["dur"])
+        self.assertEqual(events["GetLibraryObjects else"]["args"], {"error": "ValueError"})
+        subprocessEvent = [event for event in events.values() if event["cat"] == "subprocess"][0]
+        self.assertEqual(subprocessEvent["args"]["returncode"], 3)
+        self.assertIn("thread_name", [event["name"] for event in trace["traceEvents"] if event["ph"] == "M"])
+
+    def test_disabled(self):
+        self.pd4web.TRACE = ""
+        with self.tracer.Span("Patch main.pd") as span:
+            span["bytesRead"] = 1
+        self.tracer.Save()
+        self.assertEqual(self.tracer.events, [])
+        self.assertFalse(os.path.exists(os.path.join(self.root, "out")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Sources"))
+
+from pd4web.Pd4Web import Pd4Web
+from pd4web.Version import VersionCheck, VersionKey
+
+SOURCES = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Sources"))
+
+
+class VersionTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="pd4web-version-")
+        self.pd4web = Pd4Web()
+        self.pd4web.APPDATA = self.root
+        self.check = VersionCheck(self.pd4web)
+        self.refreshes = []
+        self.check.Refresh = lambda cached: self.refreshes.append(cached)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def saveCache(self, cached):
+        os.makedirs(os.path.dirname(self.check.cacheFile), exist_ok=True)
+        with open(self.check.cacheFile, "w") as f:
+            json.dump(cached, f)
+
+    def test_version_key(self):
+        versions = ["1.9.9", "2.3.0.dev1", "2.3", "2.3.1", "2.10.0"]
+        self.assertEqual(sorted(versions, key=VersionKey), versions)
+        self.assertEqual(VersionKey("2.3.0"), VersionKey("2.3"))
+
+    def test_cached_latest(self):
+        self.assertIsNone(self.check.Latest())
+        self.assertEqual(len(self.refreshes), 1)
+
+        self.saveCache({"checked": time.time(), "latest": "99.0.0"})
+        self.assertEqual(self.check.Latest(), "99.0.0")
+        self.assertTrue(self.check.IsOutdated("99.0.0"))
+        self.assertEqual(len(self.refreshes), 1)
+
+        # expired, but a refresh was just started by another process
+        self.saveCache({"checked": 0, "started": time.time(), "latest": "99.0.0"})
+        self.assertEqual(self.check.Latest(), "99.0.0")
+        self.assertEqual(len(self.refreshes), 1)
+
+    def test_lazy_imports(self):
+        # modules already loaded by the interpreter (site hooks) are not counted
+        code = f"import sys; sys.path.insert(0, {SOURCES!r}); before = set(sys.modules); import pd4web.Pd4Web; "
+        code += "loaded = set(sys.modules) - before; "
+        code += "print(' '.join(m for m in ['requests', 'pygit2', 'certifi', 'yaml'] if m in loaded))"
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Sources"))
+
+from pd4web.Pd4Web import Pd4Web
+from pd4web.Wasm import ArchiveMembers, WasmSections, ExternalsSizeReport
+
+
+def wasmObject(code: int, data: int) -> bytes:
+    sections = b""
+    for sectionId, size in [(1, 3), (10, code), (11, data)]:
+        leb = bytearray()
+        value = size
+        while True:
+            byte = value & 0x7F
+            value >>= 7
+            leb.append(byte | (0x80 if value else 0))
+            if not value:
+                break
+        sections += bytes([sectionId]) + bytes(leb) + b"\0" * size
+    return b"\0asm\1\0\0\0" + sections
+
+
+def archive(members: dict) -> bytes:
+    data = b"!<arch>\n"
+    for name, content in members.items():
+        data += f"{name + '/':<16}{0:<12}{0:<6}{0:<6}{644:<8}{len(content):<10}`\n".encode() + content
+        if len(content) % 2:
+            data += b"\n"
+    return data
+
+
+class WasmTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="pd4web-wasm-")
+        os.makedirs(os.path.join(self.root, "build"))
+        os.makedirs(os.path.join(self.root, "WebPatch"))
+        self.pd4web = Pd4Web(Patch=os.path.join(self.root, "main.pd"))
+        self.pd4web.SILENCE = True
+        self.pd4web.PROJECT_ROOT = self.root
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_sections(self):
+        members = dict(ArchiveMembers(archive({"knob.c.o": wasmObject(200, 7), "x.o": b"text"})))
+        self.assertEqual(list(members), ["knob.c.o", "x.o"])
+        self.assertEqual(WasmSections(members["knob.c.o"]), {1: 3, 10: 200, 11: 7})
+        self.assertEqual(WasmSections(members["x.o"]), {})
+
+    def test_report(self):
+        with open(os.path.join(self.root, "build", "libknob.a"), "wb") as f:
+            f.write(archive({"knob.c.o": wasmObject(100, 10)}))
+        with open(os.path.join(self.root, "build", "libbig.a"), "wb") as f:
+            f.write(archive({"a.o": wasmObject(1000, 0), "b.o": wasmObject(300, 20)}))
+        with open(os.path.join(self.root, "WebPatch", "pd4web.wasm"), "wb") as f:
+            f.write(b"\0" * 4096)
+        report = ExternalsSizeReport(self.pd4web)
+        self.assertEqual(report.Collect(), [])
+        with open(report.targetsFile, "w") as f:
+            f.write(f"else/knob={self.root}/build/libknob.a\nelse/big={self.root}/build/libbig.a\n")
+        report.Save()
+        with open(report.reportFile) as f:
+            saved = json.load(f)
+        self.assertEqual(saved["wasm"], 4096)
+        self.assertEqual([e["target"] for e in saved["externals"]], ["big", "knob"])
+        self.assertEqual((saved["externals"][0]["code"], saved["externals"][0]["data"]), (1300, 20))
+
+
+if __name__ == "__main__":
+    unittest.main()
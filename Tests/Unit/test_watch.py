@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Sources"))
+
+from pd4web.Pd4Web import Pd4Web
+from pd4web.Watch import PatchWatcher
+
+
+class PatchWatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="pd4web-watch-")
+        for folder in ["Audios", "Libs", "WebPatch"]:
+            os.makedirs(os.path.join(self.root, folder))
+        self.patch = os.path.join(self.root, "main.pd")
+        files = [self.patch, os.path.join(self.root, "Libs", "myabs.pd"), os.path.join(self.root, "Audios", "a.wav")]
+        for file in files:
+            with open(file, "w") as f:
+                f.write("x")
+        pd4web = Pd4Web(Patch=self.patch)
+        pd4web.SILENCE = True
+        pd4web.PROJECT_ROOT = self.root
+        pd4web.InitPatchVariables()
+        pd4web.processedAbs = [os.path.join(self.root, "Libs", "myabs.pd"), "/elsewhere/Externals/else/abs.pd"]
+        pd4web.declaredPaths = ["Libs", "else"]
+        self.watcher = PatchWatcher(pd4web)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_watched(self):
+        self.assertEqual(self.watcher.WatchedFiles(), [self.patch, os.path.join(self.root, "Libs", "myabs.pd")])
+        self.assertIn(os.path.join(self.root, "Libs"), self.watcher.WatchedFolders())
+        self.assertTrue(self.watcher.isWatched(os.path.join(self.root, "Audios", "b.wav")))
+        self.assertFalse(self.watcher.isWatched(os.path.join(self.root, "WebPatch", "index.pd")))
+        self.assertEqual(len(self.watcher.Snapshot()), 3)
+
+    def test_debounce(self):
+        self.watcher.DEBOUNCE = 0.05
+        self.watcher.AddChange(self.patch)
+        self.watcher.AddChange(os.path.join(self.root, ".main.pd.swp"))
+        self.assertEqual(self.watcher.TakeChanges(), set())
+        time.sleep(0.1)
+        self.assertEqual(self.watcher.TakeChanges(), {self.patch})
+        self.assertEqual(self.watcher.TakeChanges(), set())
+
+
+if __name__ == "__main__":
+    unittest.main()